@@ -0,0 +1,279 @@
+import argparse
+import json
+import os
+import platform
+import sys
+import time
+
+import numpy as np
+
+from data_sources import CsvSource
+from params import ParamTable
+from report import N_DOSES, REPORT_MODELS, compute_model
+
+# 오프라인 벤치마크 + 수치 회귀 점검 (네트워크·Streamlit·pytest 없이).
+#   python benchmark.py                    # 골든 값 점검 + 속도 측정, 기준선보다 느려진 경우를 보고
+#   python benchmark.py --quick            # 약물 100개, 점 1000개까지만
+#   python benchmark.py --update-golden    # 의도한 수치 변경 후 골든 값 다시 저장
+#   python benchmark.py --update-baseline  # 이 기계에서 속도 기준선 다시 저장
+# 픽스처 테이블(data/benchmark_drugs.csv)에는 1-컴파트먼트·2-컴파트먼트·Michaelis–Menten 약물이 모두 있다.
+# 계산(곡선 + 지표)과 그림 렌더링을 따로 재고, 약물 수·격자 크기를 늘려 가며 잰다.
+# 종료 코드: 0 통과, 1 골든 값 불일치, 2 속도 회귀
+
+base_dir = os.path.dirname(os.path.abspath(__file__))
+FIXTURE_FILE = os.path.join(base_dir, 'data', 'benchmark_drugs.csv')
+GOLDEN_FILE = os.path.join(base_dir, 'data', 'benchmark_golden.json')
+BASELINE_FILE = os.path.join(base_dir, 'data', 'benchmark_baseline.json')
+
+# 모델 → 그 모델을 쓰는 페이지 함수 (출력 표시용)
+PAGE_FUNCTIONS = {
+    'oral_single': 'plot_drug_concentration_with_onset',
+    'oral_multi_dose': 'simulate_pk_multi_dose_simple',
+    'patch_zero_order': 'plot_patch_concentration (03_패치)',
+    'patch_washout': 'plot_patch_concentration (04_패치 워시아웃)',
+}
+DRUG_COUNTS = (1, 10, 100, 1000)
+GRID_SIZES = (300, 1000, 5000)
+QUICK_DRUG_COUNTS = (1, 10, 100)
+QUICK_GRID_SIZES = (300, 1000)
+RENDER_GRID_SIZES = (300, 5000)  # 그림 한 장 렌더링 시간
+REPEAT = 5  # 측정 반복 (가장 빠른 값을 씀)
+
+# 골든 값: 지표 함수 결과 + 페이지 격자에서 계산한 곡선의 최고 농도·시각·AUC(사다리꼴)
+GOLDEN_METRICS = {
+    'oral_single': ('cmax', 'tmax', 'auc_0_inf', 'effect_end'),
+    'oral_multi_dose': ('cmax', 'tmax', 'auc_0_t', 'css_max', 'css_min'),
+    'patch_zero_order': ('cmax', 'tmax', 'auc_0_inf', 'effect_end'),
+    'patch_washout': ('cmax', 'tmax', 'auc_0_inf', 'effect_end'),
+}
+TIME_KEYS = ('tmax', 'effect_end', 'curve_tmax')
+RTOL = 1e-4  # 농도·AUC 상대 허용오차
+TIME_ATOL = 1e-3  # 시각 절대 허용오차 (hr)
+SLOWDOWN = 1.5  # 기준선보다 50% 넘게 느리면 회귀 후보 → 다시 재서도 느리면 회귀 (같은 기계에서도 측정이 흔들림)
+CONFIRM_REPEAT = 3  # 회귀 후보를 다시 잴 때 반복 배수
+MIN_SECONDS = 5e-3  # 이보다 짧은 측정은 이 값으로 보고 비교 (잡음)
+SMALL_SECONDS = 50e-3  # 기준선이 이보다 짧은 케이스는 한 번의 흔들림이 배수로 크게 보이므로
+SMALL_SLOWDOWN = 2.5  # 이 배수를 넘어야 회귀 후보
+
+
+def load_fixture(path=FIXTURE_FILE):
+    return ParamTable.from_frame(CsvSource(path).load())
+
+
+def model_drugs(table, model):
+    spec = REPORT_MODELS[model]
+    return table.select(required=spec['required'], **spec['select'])
+
+
+def tile(drugs, n):
+    # 픽스처 약물을 반복해 n개로
+    return drugs.take(np.arange(n) % len(drugs))
+
+
+def _json_value(v):
+    v = float(v)
+    return v if np.isfinite(v) else None
+
+
+def golden_values(table, models):
+    # 모델 → 약물 이름 → {지표: 값}
+    out = {}
+    for model in models:
+        drugs = model_drugs(table, model)
+        metrics, time_, conc = compute_model(model, drugs)
+        peak = np.argmax(conc, axis=1)
+        rows = np.arange(len(drugs))
+        curve = {'curve_cmax': conc[rows, peak], 'curve_tmax': time_[rows, peak],
+                 'curve_auc': np.trapezoid(conc, time_, axis=1)}
+        out[model] = {
+            drugs.drug_name[i]: {**{k: _json_value(metrics[k][i]) for k in GOLDEN_METRICS[model]},
+                                 **{k: _json_value(v[i]) for k, v in curve.items()}}
+            for i in rows
+        }
+    return out
+
+
+def _close(key, value, expected):
+    if value is None or expected is None:
+        return value is None and expected is None
+    if key in TIME_KEYS:
+        return abs(value - expected) <= TIME_ATOL
+    return abs(value - expected) <= RTOL * max(abs(expected), 1e-12)
+
+
+def check_golden(current, golden):
+    failures = []
+    for model, drugs in golden.items():
+        if model not in current:
+            continue
+        for name, expected in drugs.items():
+            values = current[model].get(name)
+            if values is None:
+                failures.append(f"{model} / {name}: 픽스처에 없음")
+                continue
+            for key, exp in expected.items():
+                if not _close(key, values.get(key), exp):
+                    failures.append(f"{model} / {name} / {key}: {values.get(key)} (골든 {exp})")
+    return failures
+
+
+def _best(fn, repeat):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def compute_cases(table, models, drug_counts, grid_sizes):
+    # 케이스 이름 → 곡선 + 지표 계산 함수 (약물 수 × 격자 크기)
+    out = {}
+    for model in models:
+        drugs = model_drugs(table, model)
+        for n in drug_counts:
+            batch = tile(drugs, n)
+            for n_points in grid_sizes:
+                out[f'compute/{model}/{n}x{n_points}'] = \
+                    lambda model=model, batch=batch, n_points=n_points: compute_model(model, batch, n_points=n_points)
+    return out
+
+
+def _figure_job(model, drugs, metrics, time_, conc, i):
+    # 페이지와 같은 그림 함수와 인자
+    from figures import concentration_figure, multi_dose_figure
+
+    if model == 'oral_multi_dose':
+        dose_times = np.arange(N_DOSES) * drugs.tau[i]
+        return multi_dose_figure, (drugs.drug_name[i], time_[i], conc[i], dose_times, metrics['css_max'][i],
+                                   metrics['css_min'][i]), {}
+    effect_end = metrics['effect_end'][i]
+    return concentration_figure, (drugs.drug_name[i], time_[i], conc[i], drugs.onset_time_hour[i], metrics['tmax'][i],
+                                  metrics['cmax'][i], metrics['onset_concentration'][i], time_[i][-1],
+                                  effect_end if np.isfinite(effect_end) else None), {}
+
+
+def render_cases(table, models, grid_sizes):
+    # 케이스 이름 → 그림 한 장 (Figure 만들기 + PNG 저장, 캐시 없이). 곡선은 미리 계산해 둠
+    from rendering import DPI, _render, current_style
+
+    style = current_style()
+    out = {}
+    for model in models:
+        drugs = model_drugs(table, model)
+        for n_points in grid_sizes:
+            metrics, time_, conc = compute_model(model, drugs, n_points=n_points)
+            job = _figure_job(model, drugs, metrics, time_, conc, 0)
+            out[f'render/{model}/{n_points}'] = lambda job=job: _render(*job, style, 'png', DPI)
+    return out
+
+
+def _ratio(seconds, base):
+    return max(seconds, MIN_SECONDS) / max(base, MIN_SECONDS)
+
+
+def _allowed(base):
+    return SMALL_SLOWDOWN if base < SMALL_SECONDS else SLOWDOWN
+
+
+def compare_speed(results, baseline, cases, repeat):
+    # [(케이스, 지금, 기준선, 배수)] 중 허용 배수(_allowed)를 넘은 것. 후보는 더 많이 반복해 다시 재고 그래도 느린 것만
+    slow = []
+    for case, seconds in results.items():
+        base = baseline.get(case)
+        if base is None or _ratio(seconds, base) <= _allowed(base):
+            continue
+        seconds = min(seconds, _best(cases[case], repeat * CONFIRM_REPEAT))
+        results[case] = seconds
+        if _ratio(seconds, base) > _allowed(base):
+            slow.append((case, seconds, base, _ratio(seconds, base)))
+    return slow
+
+
+def machine_info():
+    return {'platform': platform.platform(), 'python': platform.python_version(), 'numpy': np.__version__,
+            'cpu_count': os.cpu_count()}
+
+
+def _read_json(path):
+    if not os.path.exists(path):
+        return None
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
+
+
+def _write_json(path, data):
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, ensure_ascii=False, indent=1, sort_keys=True)
+        f.write('\n')
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="PK 모델 벤치마크 + 골든 값 회귀 점검 (오프라인)")
+    parser.add_argument('--fixture', default=FIXTURE_FILE, help="픽스처 파라미터 테이블 (CSV)")
+    parser.add_argument('--models', nargs='+', choices=tuple(REPORT_MODELS), default=list(REPORT_MODELS))
+    parser.add_argument('--quick', action='store_true', help="작은 크기만 (약물 100개, 점 1000개까지)")
+    parser.add_argument('--repeat', type=int, default=REPEAT)
+    parser.add_argument('--no-speed', action='store_true', help="골든 값만 점검")
+    parser.add_argument('--no-render', action='store_true', help="렌더링 시간은 재지 않음")
+    parser.add_argument('--update-golden', action='store_true', help="지금 결과를 골든 값으로 저장")
+    parser.add_argument('--update-baseline', action='store_true', help="지금 속도를 기준선으로 저장")
+    parser.add_argument('--json', help="측정 결과를 JSON으로 저장할 경로")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    table = load_fixture(args.fixture)
+    status = 0
+
+    current = golden_values(table, args.models)
+    golden = _read_json(GOLDEN_FILE)
+    if args.update_golden or golden is None:
+        _write_json(GOLDEN_FILE, {**(golden or {}), **current})
+        print(f"골든 값 저장: {GOLDEN_FILE}")
+    else:
+        failures = check_golden(current, golden)
+        for line in failures:
+            print(f"❌ {line}")
+        n_checked = sum(len(v) for m, drugs in golden.items() if m in current for v in drugs.values())
+        print(f"골든 값 {n_checked}개 점검, 불일치 {len(failures)}개")
+        if failures:
+            status = 1
+
+    if args.no_speed:
+        return status
+
+    drug_counts = QUICK_DRUG_COUNTS if args.quick else DRUG_COUNTS
+    grid_sizes = QUICK_GRID_SIZES if args.quick else GRID_SIZES
+    cases = compute_cases(table, args.models, drug_counts, grid_sizes)
+    if not args.no_render:
+        cases.update(render_cases(table, args.models, RENDER_GRID_SIZES))
+    results = {case: _best(fn, args.repeat) for case, fn in cases.items()}
+    for case, seconds in results.items():
+        model = case.split('/')[1]
+        print(f"{case:<40} {seconds * 1e3:9.2f} ms  {PAGE_FUNCTIONS[model]}")
+
+    stored = _read_json(BASELINE_FILE)
+    if args.update_baseline or stored is None:
+        baseline = {**(stored or {}).get('cases', {}), **results}
+        _write_json(BASELINE_FILE, {'machine': machine_info(), 'cases': baseline})
+        print(f"속도 기준선 저장: {BASELINE_FILE}")
+    else:
+        if stored.get('machine') != machine_info():
+            print(f"⚠️ 기준선을 잰 환경이 다릅니다: {stored.get('machine')}")
+        slow = compare_speed(results, stored.get('cases', {}), cases, args.repeat)
+        for case, seconds, base, ratio in slow:
+            print(f"🐢 {case}: {seconds * 1e3:.2f} ms (기준선 {base * 1e3:.2f} ms, ×{ratio:.2f})")
+        print(f"속도 {len(results)}개 측정, 기준선 대비 {SLOWDOWN:.2f}배 (기준선 {SMALL_SECONDS * 1e3:.0f} ms 미만은 "
+              f"{SMALL_SLOWDOWN:.2f}배) 넘게 느려진 것 {len(slow)}개")
+        if slow and status == 0:
+            status = 2
+
+    if args.json:
+        _write_json(args.json, {'machine': machine_info(), 'cases': results})
+    return status
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,86 @@
+import functools
+import importlib
+import os
+import platform
+import sys
+import threading
+import time
+
+from perf import debug_panel, finish_page, start_page
+
+# 모든 페이지 공통 시작 코드.
+# - 한글 폰트 찾기는 프로세스당 한 번 (결과 캐시), 등록·rcParams 설정은 그림을 처음 그릴 때 한 번
+# - matplotlib는 페이지를 열 때가 아니라 그림을 처음 그릴 때 불러옴 (rendering.current_style, report)
+# - 무거운 모듈(matplotlib, altair)을 처음 불러오는 데 걸린 시간을 기록 (startup_times)
+# - 페이지 실행마다 단계별 시간을 모음 (perf.py): setup_page에서 시작, end_page에서 로그·디버그 패널
+# Streamlit 없이 도는 report.py도 폰트 설정을 같이 쓰므로 streamlit은 setup_page 안에서만 불러옴
+
+FONT_PATHS = {
+    'Windows': "C:/Windows/Fonts/malgun.ttf",
+    'Darwin': "/System/Library/Fonts/Supplemental/AppleGothic.ttf",  # macOS
+    'Linux': "/usr/share/fonts/truetype/nanum/NanumGothic.ttf",
+}
+
+_startup_times = {}  # 이름 → 초 (모듈 첫 import, 폰트 설정)
+_font_lock = threading.Lock()
+_font_style = None
+
+
+def timed_import(name):
+    # 이미 불러온 모듈이면 그대로, 처음이면 걸린 시간을 기록
+    module = sys.modules.get(name)
+    if module is None:
+        start = time.perf_counter()
+        module = importlib.import_module(name)
+        _startup_times.setdefault(f'import {name}', time.perf_counter() - start)
+    return module
+
+
+@functools.lru_cache(maxsize=None)
+def find_font():
+    # 이 OS의 한글 폰트 경로 (없으면 None)
+    path = FONT_PATHS.get(platform.system())
+    return path if path and os.path.exists(path) else None
+
+
+def setup_fonts():
+    # 한글 폰트를 matplotlib에 등록하고 rcParams 설정 (프로세스당 한 번). 반환: 적용한 rcParams
+    global _font_style
+    with _font_lock:
+        if _font_style is None:
+            mpl = timed_import('matplotlib')
+            fm = timed_import('matplotlib.font_manager')
+            start = time.perf_counter()
+            path = find_font()
+            style = {}
+            if path:
+                fm.fontManager.addfont(path)
+                style = {'font.family': fm.FontProperties(fname=path).get_name(), 'axes.unicode_minus': False}
+                mpl.rcParams.update(style)
+            else:
+                print(f"⚠️ 해당 OS({platform.system()})에서 폰트를 찾을 수 없습니다.")
+            _startup_times['font setup'] = time.perf_counter() - start
+            _font_style = style
+        return _font_style
+
+
+def setup_page(title, layout="centered"):
+    # Streamlit 설정 (페이지 맨 위에서)
+    import streamlit as st
+
+    start_page(title)
+    st.set_page_config(layout=layout)
+    st.title(title)
+
+
+def end_page():
+    # 페이지 맨 끝에서: 이번 실행의 단계별 시간을 JSON 로그로, 사이드바에서 켜면 디버그 패널
+    import streamlit as st
+
+    run = finish_page()
+    if run is not None and st.sidebar.toggle("성능 측정 보기 (개발자용)", value=False):
+        debug_panel(run, startup_times())
+
+
+def startup_times():
+    return dict(_startup_times)
@@ -0,0 +1,130 @@
+import numpy as np
+import pandas as pd
+
+from bootstrap import timed_import
+from figures import concentration_figure, multi_dose_figure
+
+# 브라우저에서 그리는 Vega-Lite(Altair) 그래프. figures.py와 같은 인자를 받아,
+# 곡선은 LTTB로 모양을 유지한 채 LTTB_POINTS개로 줄여 보내고 표시선(약효 시작·종료, Cmax 등)은 따로 얹는다.
+# 확대·이동·툴팁은 브라우저에서 처리되므로 서버 재실행이 없다.
+# altair는 인터랙티브 그래프를 처음 만들 때 불러옴 (chart_for)
+
+LTTB_POINTS = 400
+CHART_HEIGHT = 360
+TIME_TITLE = "시간 (hours)"
+
+
+def lttb(x, y, n_out=LTTB_POINTS):
+    # Largest-Triangle-Three-Buckets: 첫·마지막 점을 두고 나머지를 n_out - 2개 구간으로 나눠
+    # 구간마다 (직전 선택점, 다음 구간 평균)과 만드는 삼각형이 가장 큰 점을 고름. 피크·꺾이는 점이 남는다
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    n = len(x)
+    if n_out >= n or n_out < 3:
+        return x, y
+    edges = np.linspace(1, n - 1, n_out - 1).astype(int)  # n_out - 2개 구간 경계
+    nxt_lo = edges[1:]
+    nxt_hi = np.append(edges[2:], n)
+    csx, csy = np.r_[0.0, np.cumsum(x)], np.r_[0.0, np.cumsum(y)]
+    avg_x = (csx[nxt_hi] - csx[nxt_lo]) / (nxt_hi - nxt_lo)  # 다음 구간 평균 (누적합으로 한 번에)
+    avg_y = (csy[nxt_hi] - csy[nxt_lo]) / (nxt_hi - nxt_lo)
+
+    idx = np.empty(n_out, dtype=int)
+    idx[0], idx[-1] = 0, n - 1
+    a = 0
+    for i in range(n_out - 2):
+        lo, hi = edges[i], edges[i + 1]
+        area = np.abs((x[a] - avg_x[i]) * (y[lo:hi] - y[a]) - (x[a] - x[lo:hi]) * (avg_y[i] - y[a]))
+        a = lo + int(np.argmax(area))
+        idx[i + 1] = a
+    return x[idx], y[idx]
+
+
+def _markers(vertical=(), horizontal=(), points=()):
+    # (라벨, 값…, 색) 목록 → 공통 색 범례를 쓰는 표시선 레이어들. 세로선은 (라벨, 시각, 선 모양, 색)
+    import altair as alt
+
+    labels = [m[0] for m in (*vertical, *horizontal, *points)]
+    colors = [m[-1] for m in (*vertical, *horizontal, *points)]
+    color = alt.Color('label:N', scale=alt.Scale(domain=labels, range=colors), legend=alt.Legend(title=None, orient='bottom'))
+    layers = []
+    if vertical:
+        df = pd.DataFrame({'label': [m[0] for m in vertical], 'time': [m[1] for m in vertical],
+                           'dash': [m[2] for m in vertical]})
+        layers.append(alt.Chart(df).mark_rule(strokeWidth=1.5).encode(
+            x='time:Q', color=color, strokeDash=alt.StrokeDash('dash:N', legend=None,
+                                                               scale=alt.Scale(domain=['--', ':'], range=[[6, 4], [2, 2]])),
+            tooltip=['label:N', alt.Tooltip('time:Q', format='.1f', title='시간 (h)')]))
+    if horizontal:
+        df = pd.DataFrame({'label': [m[0] for m in horizontal], 'concentration': [m[1] for m in horizontal]})
+        layers.append(alt.Chart(df).mark_rule(strokeDash=[6, 4], strokeWidth=2).encode(
+            y='concentration:Q', color=color,
+            tooltip=['label:N', alt.Tooltip('concentration:Q', format='.2f', title='농도')]))
+    if points:
+        df = pd.DataFrame({'label': [m[0] for m in points], 'time': [m[1] for m in points],
+                           'concentration': [m[2] for m in points]})
+        layers.append(alt.Chart(df).mark_point(shape='triangle-down', filled=True, size=120).encode(
+            x='time:Q', y='concentration:Q', color=color,
+            tooltip=['label:N', alt.Tooltip('time:Q', format='.2f', title='시간 (h)'),
+                     alt.Tooltip('concentration:Q', format='.2f', title='농도')]))
+    return layers
+
+
+def _curve_layers(time, concentration, x_domain, unit, n_out):
+    import altair as alt
+
+    t, c = lttb(time, concentration, n_out)
+    df = pd.DataFrame({'time': t, 'concentration': c})
+    x = alt.X('time:Q', title=TIME_TITLE, scale=alt.Scale(domain=x_domain))
+    y = alt.Y('concentration:Q', title=f"혈중 농도 ({unit})", scale=alt.Scale(zero=True))
+    tooltip = [alt.Tooltip('time:Q', format='.2f', title='시간 (h)'),
+               alt.Tooltip('concentration:Q', format='.2f', title=f'농도 ({unit})')]
+    line = alt.Chart(df).mark_line(color='blue', strokeWidth=2).encode(x=x, y=y)
+    hover = alt.Chart(df).mark_circle(size=30, opacity=0).encode(x=x, y=y, tooltip=tooltip)  # 곡선 위 툴팁
+    return [line, hover]
+
+
+def concentration_chart(drug_name, time, concentration, onset_time_hour, t_max_time, c_max_value,
+                        onset_concentration, plot_end_time, falling_time=None, line_label='혈중 농도', linewidth=None,
+                        colored=True, unit='ng/mL', n_out=LTTB_POINTS):
+    # figures.concentration_figure와 같은 인자 (line_label, linewidth, colored는 matplotlib 전용이라 무시)
+    import altair as alt
+
+    vertical = [(f'약효 시작: {onset_time_hour:.1f}h', onset_time_hour, '--', 'green'),
+                (f'그래프 종료: {plot_end_time:.1f}h', plot_end_time, ':', 'gray')]
+    if falling_time is not None:
+        vertical.append((f'약효 종료 시간: {falling_time:.1f}h', falling_time, '--', 'orange'))
+    horizontal = [(f'약효 기준 농도: {onset_concentration:.2f} {unit}', onset_concentration, 'blue')]
+    points = [(f'Cmax: {c_max_value:.2f} {unit}', t_max_time, c_max_value, 'black')]
+    layers = _curve_layers(time, concentration, [0, plot_end_time], unit, n_out) + _markers(vertical, horizontal, points)
+    return alt.layer(*layers).properties(title=f'{drug_name} - 혈중 농도 및 약효 시간', height=CHART_HEIGHT) \
+        .interactive(bind_y=False)
+
+
+def multi_dose_chart(drug_name, time, concentration, dose_times, css_max, css_min, unit='ng/mL', n_out=LTTB_POINTS):
+    # figures.multi_dose_figure와 같은 인자
+    import altair as alt
+
+    time = np.asarray(time, dtype=np.float64)
+    horizontal = [(f'Css,max: {css_max:.2f} {unit}', css_max, 'red'), (f'Css,min: {css_min:.2f} {unit}', css_min, 'green')]
+    layers = _curve_layers(time, concentration, [float(time[0]), float(time[-1])], unit, n_out)
+    layers += _markers(horizontal=horizontal)
+    if len(dose_times):  # 투여 시점 (범례 없음)
+        doses = pd.DataFrame({'time': np.asarray(dose_times, dtype=np.float64)})
+        layers.append(alt.Chart(doses).mark_rule(color='gray', strokeDash=[2, 2], strokeWidth=0.6).encode(x='time:Q'))
+    return alt.layer(*layers).properties(title=f'{drug_name} - 혈중 농도 및 약효 시간', height=CHART_HEIGHT) \
+        .interactive(bind_y=False)
+
+
+# figures.py 그림 함수 → 같은 인자를 받는 Vega-Lite 그래프 함수
+CHART_BUILDERS = {
+    concentration_figure: concentration_chart,
+    multi_dose_figure: multi_dose_chart,
+}
+
+
+def chart_for(job):
+    # rendering.figure_job으로 만든 (builder, args, kwargs)를 Altair 그래프로
+    timed_import('altair')
+    builder, args, kwargs = job
+    return CHART_BUILDERS[builder](*args, **kwargs)
@@ -0,0 +1,232 @@
+import functools
+import hashlib
+import sys
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+# 프로세스 전역 계산 캐시 (모든 Streamlit 세션이 공유).
+# - 키는 인자 내용의 해시 (배열은 바이트, dict/리스트는 재귀, ParamTable 등은 content_key())
+# - LRU + TTL + 전체 바이트 상한으로 내보냄
+# - single-flight: 같은 키를 여러 세션이 동시에 요청하면 한 번만 계산하고 나머지는 그 결과를 기다림
+# 캐시된 값은 여러 세션이 같이 쓰므로 배열은 읽기 전용으로 바꿔 저장한다 (호출하는 쪽에서 수정 금지).
+
+CURVE_CACHE_BYTES = 256 * 1024 * 1024  # 시뮬레이션 곡선·지표
+CURVE_CACHE_TTL = 3600  # 초
+
+_MISSING = object()
+
+
+def _digest(h, value):
+    key = getattr(value, 'content_key', None)
+    if callable(key):  # ParamTable 등 스스로 내용 해시를 가진 객체
+        h.update(f'{type(value).__name__}:{key()}'.encode())
+    elif isinstance(value, np.ndarray) or (hasattr(value, 'to_numpy') and not isinstance(value, dict)):
+        arr = np.ascontiguousarray(np.asarray(value))
+        h.update(f'{arr.dtype}{arr.shape}'.encode())
+        h.update(arr.tobytes() if arr.dtype != object else repr(arr.tolist()).encode())
+    elif isinstance(value, dict):
+        for k in sorted(value, key=str):
+            h.update(repr(k).encode())
+            _digest(h, value[k])
+    elif isinstance(value, (list, tuple)):
+        h.update(f'{type(value).__name__}{len(value)}'.encode())
+        for v in value:
+            _digest(h, v)
+    elif callable(value):
+        h.update(f'{getattr(value, "__module__", "")}.{getattr(value, "__qualname__", repr(value))}'.encode())
+    else:
+        h.update(repr(value).encode())
+    h.update(b'|')
+
+
+def content_key(*parts):
+    h = hashlib.sha1()
+    for part in parts:
+        _digest(h, part)
+    return h.hexdigest()
+
+
+def nbytes(value):
+    # 캐시 메모리 상한용 대략적인 크기
+    if isinstance(value, np.ndarray):
+        return value.nbytes
+    if isinstance(value, (bytes, bytearray)):
+        return len(value)
+    if hasattr(value, 'memory_usage'):  # DataFrame
+        return int(np.sum(value.memory_usage(deep=True)))
+    if isinstance(value, dict):
+        return sys.getsizeof(value) + sum(nbytes(v) for v in value.values())
+    if isinstance(value, (list, tuple)):
+        return sys.getsizeof(value) + sum(nbytes(v) for v in value)
+    return sys.getsizeof(value)
+
+
+def freeze(value):
+    # 공유되는 결과의 배열을 읽기 전용으로 (제자리에서 바꾸면 다른 세션 결과가 망가지므로)
+    if isinstance(value, np.ndarray):
+        value.setflags(write=False)
+    elif isinstance(value, dict):
+        for v in value.values():
+            freeze(v)
+    elif isinstance(value, (list, tuple)):
+        for v in value:
+            freeze(v)
+    return value
+
+
+class _Flight:
+    __slots__ = ('done', 'value', 'error')
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+        self.error = None
+
+    def wait(self):
+        self.done.wait()
+        if self.error is not None:
+            raise self.error
+        return self.value
+
+
+class SingleFlight:
+    # 같은 키의 동시 호출을 하나로 합침: 먼저 온 호출이 계산하고 나머지는 결과(또는 예외)를 받음
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._flights = {}
+
+    def do(self, key, fn):
+        with self._lock:
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = _Flight()
+        if not leader:
+            return flight.wait()
+        try:
+            flight.value = fn()
+            return flight.value
+        except BaseException as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._flights[key]
+            flight.done.set()
+
+
+class ComputeCache:
+    # 내용 해시 키 → 값. LRU + TTL + 바이트 상한, 캐시에 없는 키는 single-flight로 계산
+    def __init__(self, name, max_bytes, ttl=None, size=nbytes):
+        self.name = name
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._size = size
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # 키 → (값, 크기, 저장 시각)
+        self._bytes = 0
+        self._flights = {}
+        self.hits = self.misses = self.coalesced = 0
+
+    def _expired(self, stored_at, now):
+        return self.ttl is not None and now - stored_at > self.ttl
+
+    def _lookup(self, key, now):
+        # _lock 안에서 호출
+        entry = self._entries.get(key)
+        if entry is None:
+            return _MISSING
+        if self._expired(entry[2], now):
+            del self._entries[key]
+            self._bytes -= entry[1]
+            return _MISSING
+        self._entries.move_to_end(key)
+        return entry[0]
+
+    def get(self, key, default=None):
+        with self._lock:
+            value = self._lookup(key, time.monotonic())
+        return default if value is _MISSING else value
+
+    def put(self, key, value):
+        size = self._size(value)
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._bytes -= old[1]
+            self._entries[key] = (value, size, time.monotonic())
+            self._bytes += size
+            while self._bytes > self.max_bytes and len(self._entries) > 1:
+                _, (_, old_size, _) = self._entries.popitem(last=False)
+                self._bytes -= old_size
+
+    def get_many(self, keys, compute):
+        # keys: 키 목록, compute(인덱스 목록) → 같은 순서의 값 목록. 캐시에도 없고 다른 세션이 계산 중도 아닌 것만 계산
+        out = [_MISSING] * len(keys)
+        mine, theirs = [], []
+        now = time.monotonic()
+        with self._lock:
+            for i, key in enumerate(keys):
+                value = self._lookup(key, now)
+                if value is not _MISSING:
+                    out[i] = value
+                    self.hits += 1
+                elif key in self._flights:  # 다른 세션(또는 이 호출의 앞쪽)이 계산 중 → 결과를 기다림
+                    theirs.append((i, self._flights[key]))
+                    self.coalesced += 1
+                else:
+                    flight = _Flight()
+                    self._flights[key] = flight
+                    mine.append((i, flight))
+                    self.misses += 1
+        if mine:
+            try:
+                values = compute([i for i, _ in mine])
+                for (i, flight), value in zip(mine, values):
+                    flight.value = out[i] = value
+                    self.put(keys[i], value)
+            except BaseException as e:
+                for _, flight in mine:
+                    flight.error = e
+                raise
+            finally:
+                with self._lock:
+                    for i, flight in mine:
+                        if self._flights.get(keys[i]) is flight:
+                            del self._flights[keys[i]]
+                for _, flight in mine:
+                    flight.done.set()
+        for i, flight in theirs:
+            out[i] = flight.wait()
+        return out
+
+    def get_or_compute(self, key, fn):
+        return self.get_many([key], lambda _: [fn()])[0]
+
+    def info(self):
+        with self._lock:
+            return {'name': self.name, 'entries': len(self._entries), 'bytes': self._bytes, 'budget': self.max_bytes,
+                    'ttl': self.ttl, 'hits': self.hits, 'misses': self.misses, 'coalesced': self.coalesced}
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+
+curve_cache = ComputeCache('curves', CURVE_CACHE_BYTES, ttl=CURVE_CACHE_TTL)
+
+
+def shared(cache=curve_cache):
+    # 함수 결과를 세션 간에 공유: @shared() 또는 shared()(fn). 원래 함수는 .uncached
+    def decorate(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            key = content_key(fn, args, kwargs)
+            return cache.get_or_compute(key, lambda: freeze(fn(*args, **kwargs)))
+        wrapper.uncached = fn
+        return wrapper
+    return decorate
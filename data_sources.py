@@ -0,0 +1,192 @@
+import abc
+import hashlib
+import os
+import sqlite3
+import threading
+
+import pandas as pd
+
+from perf import stage
+
+base_dir = os.path.dirname(os.path.abspath(__file__))
+SERVICE_ACCOUNT_FILE = os.path.join(base_dir, 'creds', 'dauntless-water-409404-a2aaae9a477f.json')
+SAMPLE_DATA_FILE = os.path.join(base_dir, 'data', 'sample_drugs.csv')
+
+SPREADSHEET_NAME = "마약성 진통제 PK 정리본"
+WORKSHEET_NAME = "그래프데이터2"
+SCOPES = [
+    "https://www.googleapis.com/auth/spreadsheets",
+    "https://www.googleapis.com/auth/drive"  # ← 추가
+]
+
+# 데이터 소스 선택: google(기본) | sample | csv:<경로> | sqlite:<경로>[#테이블] | parquet:<경로>
+DATA_SOURCE_ENV = "ABCGRAPH_DATA_SOURCE"
+DEFAULT_SQLITE_TABLE = "drugs"
+
+# 인증된 gspread 클라이언트 (프로세스 전역)
+_client = None
+_client_lock = threading.Lock()
+
+
+def safe_decode_unicode(text):
+    if isinstance(text, str) and r'\u' in text:
+        try:
+            return text.encode().decode('unicode_escape')
+        except:
+            return text
+    return text
+
+
+def get_client():
+    # 인증된 gspread 클라이언트는 프로세스당 한 번만 생성해서 재사용
+    global _client
+    with _client_lock:
+        if _client is None:
+            # 오프라인 소스만 쓰는 환경에서는 Google 라이브러리를 불러오지 않음
+            with stage('sheet.auth'):
+                import gspread
+                from google.oauth2.service_account import Credentials
+
+                creds = Credentials.from_service_account_file(SERVICE_ACCOUNT_FILE, scopes=SCOPES)
+                _client = gspread.authorize(creds)
+        return _client
+
+
+def to_sheet_frame(df):
+    # 모든 소스가 Google Sheet의 get_all_values()와 같은 모양(문자열 DataFrame)을 돌려주도록 맞춤
+    df = df.copy()
+    df.columns = [str(c) for c in df.columns]
+    for col in df.columns:
+        if df[col].dtype != object:
+            df[col] = df[col].astype(object)
+        df[col] = df[col].where(df[col].notna(), '').astype(str)
+    if 'drug_name' in df.columns:
+        df['drug_name'] = df['drug_name'].apply(safe_decode_unicode)
+    return df.reset_index(drop=True)
+
+
+class DataSource(abc.ABC):
+    # 약물 파라미터 소스의 공통 인터페이스
+    #   fingerprint(): 데이터가 바뀌었는지 판단하는 가벼운 값 (수정 시각 또는 내용 해시)
+    #   load(): 전체 데이터를 문자열 DataFrame으로 읽어옴
+    key = "base"
+
+    @abc.abstractmethod
+    def fingerprint(self):
+        ...
+
+    @abc.abstractmethod
+    def load(self):
+        ...
+
+    def __repr__(self):
+        return f"{type(self).__name__}({self.key})"
+
+
+class GoogleSheetSource(DataSource):
+
+    def __init__(self, spreadsheet_name=SPREADSHEET_NAME, worksheet_name=WORKSHEET_NAME):
+        self.spreadsheet_name = spreadsheet_name
+        self.worksheet_name = worksheet_name
+        self.key = f"google:{spreadsheet_name}/{worksheet_name}"
+        self._spreadsheet = None
+
+    def _open(self):
+        if self._spreadsheet is None:
+            self._spreadsheet = get_client().open(self.spreadsheet_name)
+        return self._spreadsheet
+
+    def fingerprint(self):
+        # Drive 메타데이터의 수정 시각만 조회 (시트 전체를 받지 않음)
+        return self._open().get_lastUpdateTime()
+
+    def load(self):
+        worksheet = self._open().worksheet(self.worksheet_name)
+        data = worksheet.get_all_values()
+        df = pd.DataFrame(data[1:], columns=data[0])  # 첫 줄은 컬럼명으로
+        df['drug_name'] = df['drug_name'].apply(safe_decode_unicode)
+        return df
+
+
+class FileSource(DataSource):
+    # 로컬 파일 기반 소스: (mtime, size)가 바뀔 때만 내용 해시를 다시 계산
+    scheme = "file"
+
+    def __init__(self, path):
+        self.path = os.path.abspath(path)
+        self.key = f"{self.scheme}:{self.path}"
+        self._stat = None
+        self._digest = None
+
+    def fingerprint(self):
+        st = os.stat(self.path)
+        stat = (st.st_mtime_ns, st.st_size)
+        if stat != self._stat:
+            h = hashlib.sha256()
+            with open(self.path, 'rb') as f:
+                for block in iter(lambda: f.read(1 << 20), b''):
+                    h.update(block)
+            self._stat = stat
+            self._digest = h.hexdigest()
+        return self._digest
+
+
+class CsvSource(FileSource):
+    scheme = "csv"
+
+    def load(self):
+        df = pd.read_csv(self.path, dtype=str, keep_default_na=False, encoding='utf-8-sig')
+        return to_sheet_frame(df)
+
+
+class ParquetSource(FileSource):
+    scheme = "parquet"
+
+    def load(self):
+        return to_sheet_frame(pd.read_parquet(self.path))
+
+
+class SqliteSource(FileSource):
+    scheme = "sqlite"
+
+    def __init__(self, path, table=DEFAULT_SQLITE_TABLE):
+        super().__init__(path)
+        self.table = table
+        self.key = f"{self.scheme}:{self.path}#{table}"
+
+    def load(self):
+        con = sqlite3.connect(f"file:{self.path}?mode=ro", uri=True)
+        try:
+            df = pd.read_sql_query(f'SELECT * FROM "{self.table}"', con)
+        finally:
+            con.close()
+        return to_sheet_frame(df)
+
+
+class SampleSource(CsvSource):
+    # 네트워크/인증 없이 페이지, 벤치마크를 돌리기 위한 내장 예시 데이터
+    scheme = "sample"
+
+    def __init__(self, path=SAMPLE_DATA_FILE):
+        super().__init__(path)
+
+
+def get_data_source(spec=None):
+    # spec이 없으면 환경변수, 그것도 없으면 Google Sheet
+    if spec is None:
+        spec = os.environ.get(DATA_SOURCE_ENV, "google")
+    scheme, _, rest = spec.partition(':')
+    scheme = scheme.strip().lower()
+
+    if scheme == "google":
+        return GoogleSheetSource()
+    if scheme == "sample":
+        return SampleSource(rest) if rest else SampleSource()
+    if scheme == "csv":
+        return CsvSource(rest)
+    if scheme == "parquet":
+        return ParquetSource(rest)
+    if scheme == "sqlite":
+        path, _, table = rest.partition('#')
+        return SqliteSource(path, table or DEFAULT_SQLITE_TABLE)
+    raise ValueError(f"알 수 없는 데이터 소스: {spec}")
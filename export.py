@@ -0,0 +1,105 @@
+import io
+
+import numpy as np
+
+from perf import stage
+
+# 페이지 공통: 시뮬레이션 곡선·지표를 Parquet / Arrow(IPC 파일) / CSV로 내려받기.
+# 곡선은 report.py와 같은 긴 형식 (drug_name, time_hour, concentration, ...) 한 표로, 계산 결과 배열을
+# 그대로 ravel/concatenate 해서 만든다 (행마다 파이썬 변환 없음). 약물 이름은 사전(dictionary) 인코딩이라
+# 약물 수백 개 × 점 수천 개여도 이름을 점마다 저장하지 않는다.
+# pyarrow는 내보내기 형식을 고른 뒤에만 불러옴 (고르기 전에는 파일을 만들지 않음)
+
+EXPORT_FORMATS = {  # 이름 → (확장자, MIME)
+    'Parquet': ('parquet', 'application/vnd.apache.parquet'),
+    'Arrow': ('arrow', 'application/vnd.apache.arrow.file'),
+    'CSV': ('csv', 'text/csv'),
+}
+NO_EXPORT = "안 함"
+PARQUET_COMPRESSION = 'zstd'
+CSV_BOM = b'\xef\xbb\xbf'  # 엑셀에서 한글 약물 이름이 깨지지 않도록
+
+
+def _drug_column(names, lengths):
+    import pyarrow as pa
+
+    indices = np.repeat(np.arange(len(names), dtype=np.int32), lengths)
+    return pa.DictionaryArray.from_arrays(indices, pa.array([str(n) for n in names], pa.string()))
+
+
+def curves_table(names, time, columns):
+    # names: 약물 n개. time: (n, m) 또는 공통 (m,) 배열, 또는 약물마다 길이가 다른 1차원 배열 목록
+    # columns: 컬럼 이름 → time과 같은 모양 (약물별 농도 등). 반환: 긴 형식 pyarrow Table
+    import pyarrow as pa
+
+    if isinstance(time, (list, tuple)):
+        lengths = np.array([len(t) for t in time], dtype=np.int64)
+        flat_time = np.concatenate(time) if len(time) else np.empty(0)
+        flat = {k: np.concatenate(v) if len(v) else np.empty(0) for k, v in columns.items()}
+    else:
+        shape = (len(names), np.shape(time)[-1])
+        lengths = np.full(shape[0], shape[1], dtype=np.int64)
+        flat_time = np.broadcast_to(time, shape).ravel()
+        flat = {k: np.broadcast_to(v, shape).ravel() for k, v in columns.items()}
+    return pa.table({'drug_name': _drug_column(names, lengths),
+                     'time_hour': np.asarray(flat_time, dtype=np.float64),
+                     **{k: np.asarray(v, dtype=np.float64) for k, v in flat.items()}})
+
+
+def metrics_table(names, metrics):
+    # 약물별 지표 배열 dict → 약물당 한 행
+    import pyarrow as pa
+
+    return pa.table({'drug_name': pa.array([str(n) for n in names], pa.string()),
+                     **{k: np.broadcast_to(np.asarray(v, dtype=np.float64), (len(names),)) for k, v in metrics.items()}})
+
+
+def to_table(data):
+    # pyarrow Table 또는 DataFrame (TDM 추정 결과 등)
+    import pyarrow as pa
+
+    return data if isinstance(data, pa.Table) else pa.Table.from_pandas(data, preserve_index=False)
+
+
+def to_bytes(data, fmt):
+    # fmt: EXPORT_FORMATS의 이름
+    import pyarrow as pa
+
+    table = to_table(data)
+    buf = io.BytesIO()
+    ext = EXPORT_FORMATS[fmt][0]
+    if ext == 'parquet':
+        import pyarrow.parquet as pq
+
+        pq.write_table(table, buf, compression=PARQUET_COMPRESSION)
+    elif ext == 'arrow':
+        with pa.ipc.new_file(buf, table.schema) as writer:
+            writer.write_table(table)
+    else:
+        import pyarrow.csv as pcsv
+
+        # CSV 쓰기는 사전 인코딩 컬럼을 받지 않으므로 문자열로 풀어서
+        table = pa.table({name: col.cast(col.type.value_type) if pa.types.is_dictionary(col.type) else col
+                          for name, col in zip(table.column_names, table.columns)})
+        buf.write(CSV_BOM)
+        pcsv.write_csv(table, buf)
+    return buf.getvalue()
+
+
+def download_section(file_stem, tables):
+    # 페이지 맨 아래 내려받기: tables = 표시 이름 → pyarrow Table 또는 DataFrame을 만드는 함수 (형식을 고른 뒤에만 호출)
+    import streamlit as st
+
+    with st.expander("📥 데이터 내보내기 (곡선·지표)"):
+        fmt = st.radio("형식", (NO_EXPORT, *EXPORT_FORMATS), horizontal=True, key=f'export_format_{file_stem}')
+        if fmt == NO_EXPORT:
+            return
+        ext, mime = EXPORT_FORMATS[fmt]
+        for col, (label, build) in zip(st.columns(len(tables)), tables.items()):
+            with stage('export', table=label, format=ext) as s:
+                data = build()
+                payload = to_bytes(data, fmt)
+                s['rows'] = len(data)
+                s['bytes'] = len(payload)
+            col.download_button(f"{label} ({fmt})", payload, file_name=f'{file_stem}_{label}.{ext}', mime=mime,
+                                on_click='ignore')
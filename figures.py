@@ -0,0 +1,56 @@
+# 페이지 그래프를 만드는 순수 함수들 (Streamlit·pyplot 상태를 쓰지 않음).
+# 모듈 최상위 함수라 rendering.py의 작업 프로세스로 넘길 수 있고, 같은 인자면 같은 그림이 나온다.
+# matplotlib는 그림을 실제로 그릴 때 불러옴 (페이지를 여는 것만으로는 불러오지 않음)
+
+
+def concentration_figure(drug_name, time, concentration, onset_time_hour, t_max_time, c_max_value,
+                         onset_concentration, plot_end_time, falling_time=None, line_label='혈중 농도', linewidth=None,
+                         colored=True):
+    # 페이지 1/3/4의 약물별 그래프: 농도 곡선, 약효 시작·종료, Cmax, 약효 기준 농도, 그래프 종료
+    # colored=False면 색을 지정하지 않음 (페이지 4)
+    from matplotlib.figure import Figure
+
+    def color(c):
+        return {'color': c} if colored else {}
+
+    fig = Figure(figsize=(10, 6))
+    ax = fig.subplots()
+    ax.plot(time, concentration, label=line_label, linewidth=linewidth, **color('blue'))
+    ax.axvline(x=onset_time_hour, linestyle='--', label=f'약효 시작: {onset_time_hour:.1f}h', **color('green'))
+    ax.plot(t_max_time, c_max_value, 'kv' if colored else 'v', markersize=8 if colored else None,
+            label=f'Cmax: {c_max_value:.2f} ng/mL')
+    ax.axhline(y=onset_concentration, xmin=0, xmax=1, linestyle='--', linewidth=2 if colored else None,
+               label=f'약효 기준 농도: {onset_concentration:.2f} ng/mL', **color('blue'))
+    ax.axvline(x=plot_end_time, linestyle=':', label=f'그래프 종료: {plot_end_time:.1f}h', **color('gray'))
+    if falling_time is not None:
+        ax.axvline(x=falling_time, linestyle='--', label=f'약효 종료 시간: {falling_time:.1f}h', **color('orange'))
+
+    ax.set_title(f'{drug_name} - 혈중 농도 및 약효 시간')
+    ax.set_xlabel("시간 (hours)")
+    ax.set_ylabel("혈중 농도 (ng/mL)")
+    ax.grid(True, linestyle=':')
+    ax.legend()
+    ax.set_xlim(0, plot_end_time)
+    ax.set_ylim(0)
+    return fig
+
+
+def multi_dose_figure(drug_name, time, concentration, dose_times, css_max, css_min):
+    # 페이지 2의 약물별 그래프: 연속 복용 농도, 투여 시점, 정상상태 최고/최저
+    from matplotlib.figure import Figure
+
+    fig = Figure(figsize=(10, 6))
+    ax = fig.subplots()
+    ax.plot(time, concentration, lw=2, label='혈중 농도 (C)')
+    for t_dose in dose_times:
+        ax.axvline(t_dose, linestyle="--", linewidth=0.6, color='gray')
+    ax.axhline(css_max, linestyle=':', color='red', label=f"Css,max: {css_max:.2f} ng/mL")
+    ax.axhline(css_min, linestyle=':', color='green', label=f"Css,min: {css_min:.2f} ng/mL")
+
+    ax.set_title(f'{drug_name} - 혈중 농도 및 약효 시간')
+    ax.set_xlabel("시간 (hours)")
+    ax.set_ylabel("혈중 농도 (ng/mL)")
+    ax.grid(True, linestyle=':')
+    ax.legend()
+    ax.set_ylim(0)
+    return fig
@@ -1,36 +1,151 @@
 import pandas as pd
-import gspread
-from google.oauth2.service_account import Credentials
+import json
 import os
+import threading
+import time
+
+from compute_cache import SingleFlight
+from data_sources import get_data_source
+from params import ParamTable
+from perf import stage
 
 base_dir = os.path.dirname(os.path.abspath(__file__))
-SERVICE_ACCOUNT_FILE = os.path.join(base_dir, 'creds', 'dauntless-water-409404-a2aaae9a477f.json')
 
-def safe_decode_unicode(text):
-    if isinstance(text, str) and r'\u' in text:
+# 시트 캐시 설정
+SHEET_CACHE_TTL = 300  # 초, 이 시간이 지나면 백그라운드에서 변경 여부를 확인
+SNAPSHOT_DIR = os.path.join(base_dir, 'cache')
+SNAPSHOT_FILE = os.path.join(SNAPSHOT_DIR, 'sheet_snapshot.parquet')
+SNAPSHOT_META_FILE = os.path.join(SNAPSHOT_DIR, 'sheet_snapshot.json')
+
+# 프로세스 전역 캐시 (모든 Streamlit 세션이 공유)
+_source = None
+_sheet_cache = {"df": None, "loaded_at": 0.0, "fingerprint": None}
+_sheet_lock = threading.Lock()
+_table_cache = {"df": None, "table": None}
+_refresh_lock = threading.Lock()
+_refresh_flight = SingleFlight()  # 동시에 들어온 갱신 요청은 한 번의 API 호출로 합침
+
+
+def get_source():
+    global _source
+    if _source is None:
+        _source = get_data_source()
+    return _source
+
+
+def set_source(source):
+    # 데이터 소스 교체 (예: 오프라인 실행). 기존 캐시는 버림
+    global _source
+    with _sheet_lock:
+        _source = source
+        _sheet_cache.update(df=None, loaded_at=0.0, fingerprint=None)
+
+
+def fetch_google_sheet():
+    # 캐시를 거치지 않고 소스에서 직접 읽어옴 (네트워크 호출)
+    return get_source().load()
+
+
+def _save_snapshot(df, fingerprint):
+    try:
+        os.makedirs(SNAPSHOT_DIR, exist_ok=True)
+        tmp_path = SNAPSHOT_FILE + '.tmp'
+        df.to_parquet(tmp_path, index=False)
+        os.replace(tmp_path, SNAPSHOT_FILE)  # 읽는 쪽이 반쯤 쓰인 파일을 보지 않도록
+        with open(SNAPSHOT_META_FILE, 'w', encoding='utf-8') as f:
+            json.dump({"source": get_source().key, "fingerprint": fingerprint}, f, ensure_ascii=False)
+    except Exception as e:
+        print(f"⚠️ 시트 스냅샷 저장 실패: {e}")
+
+
+def _load_snapshot():
+    if not (os.path.exists(SNAPSHOT_FILE) and os.path.exists(SNAPSHOT_META_FILE)):
+        return None, 0.0, None
+    try:
+        with open(SNAPSHOT_META_FILE, encoding='utf-8') as f:
+            meta = json.load(f)
+        if meta.get("source") != get_source().key:  # 다른 소스의 스냅샷은 쓰지 않음
+            return None, 0.0, None
+        return pd.read_parquet(SNAPSHOT_FILE), os.path.getmtime(SNAPSHOT_FILE), meta.get("fingerprint")
+    except Exception as e:
+        print(f"⚠️ 시트 스냅샷 읽기 실패: {e}")
+        return None, 0.0, None
+
+
+def refresh_google_sheet():
+    # 소스가 실제로 바뀌었을 때만 전체를 다시 받아 캐시와 스냅샷을 갱신. 실패하면 기존 캐시를 그대로 둔다.
+    # 여러 세션이 동시에 부르면(콜드 스타트) 한 세션만 소스를 조회하고 나머지는 그 결과를 받음
+    return _refresh_flight.do(get_source().key, _refresh_sheet)
+
+
+def _refresh_sheet():
+    with _refresh_lock:
+        source = get_source()
         try:
-            return text.encode().decode('unicode_escape')
-        except:
-            return text
-    return text
-
-
-def get_google_sheet():
-    #SERVICE_ACCOUNT_FILE = 'dauntless-water-409404-a2aaae9a477f.json'
-    SCOPES = [
-        "https://www.googleapis.com/auth/spreadsheets",
-        "https://www.googleapis.com/auth/drive"  # ← 추가
-    ]
-    creds = Credentials.from_service_account_file(SERVICE_ACCOUNT_FILE, scopes=SCOPES)
-    client = gspread.authorize(creds)
-    spreadsheet = client.open("마약성 진통제 PK 정리본")
-    worksheet = spreadsheet.worksheet("그래프데이터2")
-    data = worksheet.get_all_values()
-    df = pd.DataFrame(data[1:], columns=data[0])  # 첫 줄은 컬럼명으로
-    df['drug_name'] = df['drug_name'].apply(safe_decode_unicode)
+            with stage('sheet.fingerprint', source=source.key):
+                fingerprint = source.fingerprint()
+            with _sheet_lock:
+                unchanged = _sheet_cache["df"] is not None and fingerprint == _sheet_cache["fingerprint"]
+                if unchanged:
+                    _sheet_cache["loaded_at"] = time.time()
+                    return _sheet_cache["df"]
+            with stage('sheet.download', source=source.key) as s:
+                df = source.load()
+                s['rows'] = len(df)
+        except Exception as e:
+            print(f"⚠️ {source} 갱신 실패, 캐시된 데이터를 사용합니다: {e}")
+            return None
+        with _sheet_lock:
+            _sheet_cache.update(df=df, loaded_at=time.time(), fingerprint=fingerprint)
+        _save_snapshot(df, fingerprint)
+        return df
+
+
+def _refresh_in_background():
+    # 이미 갱신 중이면 새 스레드를 띄우지 않음
+    if _refresh_lock.locked():
+        return
+    threading.Thread(target=refresh_google_sheet, daemon=True).start()
+
+
+def _get_shared_sheet(max_age):
+    # 캐시된 DataFrame 자체를 돌려줌 (복사하지 않음, 호출하는 쪽에서 수정 금지)
+    with _sheet_lock:
+        df = _sheet_cache["df"]
+        loaded_at = _sheet_cache["loaded_at"]
+
+    # 콜드 스타트: 디스크 스냅샷이 있으면 바로 사용하고 갱신은 백그라운드로
+    if df is None:
+        with stage('sheet.snapshot'):
+            df, loaded_at, fingerprint = _load_snapshot()
+        if df is not None:
+            with _sheet_lock:
+                if _sheet_cache["df"] is None:
+                    _sheet_cache.update(df=df, loaded_at=loaded_at, fingerprint=fingerprint)
+
+    # 스냅샷도 없으면 한 번은 기다려서 받아와야 함
+    if df is None:
+        df = refresh_google_sheet()
+        if df is None:
+            raise RuntimeError("약물 데이터를 불러올 수 없고 로컬 스냅샷도 없습니다.")
+        return df
+
+    if time.time() - loaded_at > max_age:
+        _refresh_in_background()
 
     return df
 
 
+def get_google_sheet(max_age=SHEET_CACHE_TTL):
+    return _get_shared_sheet(max_age).copy()
 
 
+def get_param_table(max_age=SHEET_CACHE_TTL):
+    # 시트가 바뀔 때만 다시 파싱하는 타입 지정 파라미터 테이블
+    df = _get_shared_sheet(max_age)
+    with _sheet_lock:
+        if _table_cache["df"] is not df:
+            with stage('sheet.parse', rows=len(df)):
+                _table_cache["table"] = ParamTable.from_frame(df)
+            _table_cache["df"] = df
+        return _table_cache["table"]
@@ -17,12 +17,15 @@ st.markdown("""
     - [📈 경구 연속 투여 시뮬레이션 (속효성, 단기지속성)](/oral_multiple)
     - [📉 패치 투여 시뮬레이션 (제로오더모델: 패치를 떼자마자 투여량이 0으로 종료됨)](/patch)
     - [📉 패치 투여 시뮬레이션 (패치제거후 피부에 남은 약제가 지속적으로 흡수됨)](/patch_w)
+    - [🔄 약물 전환 시뮬레이션 (패치 제거 후 경구 시작 등, 합산 효과의 공백·중첩 확인)](/약물전환)
+    - [🩸 TDM 파라미터 추정 (측정 혈중 농도로 환자별 t½·Tmax·Vd 추정 후 다시 그리기)](/TDM)
     - Google Spreadsheet: https://docs.google.com/spreadsheets/d/1BXE4oJEHYxY-65O7P4ZDQOlXIBBbdJQzAigmDeTniUc/edit?gid=1824505919#gid=1824505919
     
     ---
     
     ### 📝 기능 설명
     - Google Sheet에서 약물 데이터 자동 불러오기
+    - 오프라인 실행: 환경변수 `ABCGRAPH_DATA_SOURCE` = `sample` | `csv:경로` | `sqlite:경로#테이블` | `parquet:경로`
     - Tmax, F, Vd 등 PK 파라미터 기반 시뮬레이션
     - Onset 및 약효 소실 시점 표시
     - 그래프 Width (X-scale)는 t_half(반감기) * 7
@@ -41,7 +44,29 @@ st.markdown("""
     
     ### 패치약제 설명
     제로오더모델: 패치제거후 흡수가 멈춤
-    워시아웃 적용: tau_off(워시아웃 시간상수, 기본 6h) 패치 제거후 피부에 남은 잔여약제가 6시간동안 흡수됨
+    워시아웃 적용: tau_off(워시아웃 시간상수, 시트의 tau_off 컬럼, 비어 있으면 6h) 패치 제거후 피부에 남은 잔여약제가 tau_off 시간상수로 서서히 흡수됨
+
+    ### 약물 전환 설명
+    약물별 효과 = 농도 / 약효 기준 농도 × 등가 가중치(시트의 equianalgesic_factor 컬럼, 비어 있으면 1). 합산 효과가 1 미만이면 공백, 두 약물이 함께 작용하며 2 초과면 과다 중첩
+    교차 감량: 사이드바의 용량 단계(시각 h:용량 mg, 예: 48:5, 60:2.5)를 넣으면 약물마다 그 시각부터 그 용량으로 투여 (0이면 그 뒤 투여 없음)
+
+    ### 약동학 모델 선택 (시트의 model 컬럼, 경구 단일복용·패치 페이지)
+    연속복용·패치(부드러운그래프) 페이지는 1-컴파트먼트만 계산하므로 2cmt·mm 약물은 제외, 약물 전환은 1-컴파트먼트로 계산
+    비어 있거나 `1cmt`: 1-컴파트먼트 (기본)
+    `2cmt`: 2-컴파트먼트, k12·k21 컬럼 (1/hr) 필요. V_d는 중심구획, t_half는 말기 반감기
+    `mm`: Michaelis–Menten 비선형 소실, Vmax (mg/hr/kg)·Km (mg/L) 컬럼 필요. 용량이 Km에 비해 작으면 1-컴파트먼트와 같아짐
+
+    ### 배치 리포트 (Streamlit 없이)
+    `python report.py --source sample --out reports --format parquet csv --figures png`
+    모든 약물 × 경구 단일·연속, 패치(제로오더·워시아웃) 모델의 지표(metrics)와 곡선(curves)을 파일로 저장. 매일 다시 만들어 diff로 비교
+
+    ### 벤치마크·수치 회귀 점검 (오프라인)
+    `python benchmark.py` (빠르게: `--quick`)
+    픽스처 약물(data/benchmark_drugs.csv)의 Cmax·Tmax·AUC·약효 종료를 골든 값과 비교하고, 약물 수·격자 크기별 계산·렌더링 시간을 기준선과 비교. 수치를 의도적으로 바꿨으면 `--update-golden`, 기준 기계에서 `--update-baseline`
+
+    ### TDM 추정 설명
+    CSV 한 파일에 측정 행(patient_id, time, concentration)과 투여 행(patient_id, time, dose)을 함께 넣음. body_weight 컬럼은 선택
+    1-컴파트먼트(경구: k·ka·Vd, 패치: k·Vd)를 비례 오차로 모든 환자 한꺼번에 추정. 사전분포를 켜면 시트 값이 평균 (측정값이 적을 때 안정적)
     """
 )
 
@@ -0,0 +1,166 @@
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+from pk_metrics import oral_multi_dose_metrics, oral_single_metrics, patch_metrics, variant_metrics
+from pk_models import MODELS, model_groups, time_grid
+
+# 슬라이더용 빠른 계산.
+# 1-컴파트먼트 모델은 농도가 F·D/(Vd·체중)에 정비례하므로, 곡선 모양은 속도 관련 파라미터
+# (t½, Tmax, 패치 부착 시간, tau 등)만으로 정해진다. 단위 용량(F·D/V = 1) 곡선과 지표를 약물별로 캐시하고
+# 용량·체중·F가 바뀌면 곱하기만 한다. 모양 파라미터가 바뀐 약물만 다시 계산.
+# 2-컴파트먼트도 선형이라 같은 방식이 성립한다. 비선형(Michaelis–Menten) 약물은 배율이 성립하지 않아 매번 계산.
+
+# 모델별로 곡선 모양을 정하는 파라미터 (D, F, V_d, 체중은 배율에만 들어감)
+SHAPE_PARAMS = {
+    'oral_single': ('t_half', 't_max', 'onset_time_hour'),
+    'oral_multi_dose': ('t_half', 't_max', 'tau'),
+    'patch_zero_order': ('t_half', 'patch_duration_hour', 'onset_time_hour'),
+    'patch_washout': ('t_half', 'patch_duration_hour', 'onset_time_hour', 'tau_off'),
+    'oral_2cmt': ('t_half', 't_max', 'k12', 'k21', 'onset_time_hour'),
+    'patch_2cmt': ('t_half', 'patch_duration_hour', 'k12', 'k21', 'onset_time_hour'),
+}
+# 배율을 곱해야 하는 지표 (나머지 tmax, effect_end 등 시각은 배율과 무관)
+CONCENTRATION_KEYS = ('cmax', 'onset_concentration', 'auc_0_inf', 'auc_0_t', 'css_avg')
+SHAPE_CACHE_SIZE = 1024  # 약물 × 모양 조합 수
+
+_shape_cache = OrderedDict()  # (모델, 점 수, 옵션, 모양 파라미터) → (time, shape, 지표 dict)
+_shape_lock = threading.Lock()
+
+
+def _unit_metrics(model, p, options):
+    one = np.ones_like(p['t_half'])
+    if model == 'oral_single':
+        return oral_single_metrics(one, one, one, p['t_half'], p['t_max'], 1.0, p['onset_time_hour'])
+    if model == 'oral_multi_dose':
+        return oral_multi_dose_metrics(one, one, one, p['t_half'], p['t_max'], p['tau'], options['n_doses'], 1.0)
+    if model in ('oral_2cmt', 'patch_2cmt'):
+        return variant_metrics(model, p | {'D': one, 'F': one, 'V_d': one}, 1.0)
+    tau_off = p['tau_off'] if model == 'patch_washout' else None
+    return patch_metrics(one, one, one, p['t_half'], p['patch_duration_hour'], 1.0, p['onset_time_hour'], tau_off)
+
+
+def _unit_curves(model, params, n_points, options):
+    spec = MODELS[model]
+    one = np.ones_like(params['t_half'])
+    p = {c: params[c] if c in params else one for c in spec['params']}
+    p.update(D=one, F=one, V_d=one)
+    time = time_grid(spec['horizon'](p, options), n_points)
+    return time, spec['func'](time, body_weight=1.0, **p, **options)
+
+
+def _compute_shapes(model, params, n_points, options):
+    # 단위 용량 곡선을 약물 여러 개에 대해 한 번에 계산
+    time, shape = _unit_curves(model, params, n_points, options)
+    return time, shape, _unit_metrics(model, params, options)
+
+
+def unit_shapes(params, model, n_points, **options):
+    # params: 컬럼 이름 → 약물별 배열 (ParamTable.columns 또는 슬라이더로 바꾼 dict)
+    # 반환: time, shape (약물 수, n_points), 단위 용량 지표 dict
+    names = SHAPE_PARAMS[model]
+    values = np.column_stack([np.asarray(params[c], dtype=np.float64) for c in names])
+    opts = tuple(sorted(options.items()))
+    keys = [(model, n_points, opts, tuple(row)) for row in values.tolist()]
+
+    with _shape_lock:
+        hits = [_shape_cache.get(key) for key in keys]
+        for key, hit in zip(keys, hits):
+            if hit is not None:
+                _shape_cache.move_to_end(key)
+    miss = [i for i, hit in enumerate(hits) if hit is None]
+    if miss:
+        p = {c: values[miss, j] for j, c in enumerate(names)}
+        time, shape, metrics = _compute_shapes(model, p, n_points, options)
+        with _shape_lock:
+            for j, i in enumerate(miss):
+                hits[i] = (time[j], shape[j], {key: float(v[j]) for key, v in metrics.items()})
+                _shape_cache[keys[i]] = hits[i]
+            while len(_shape_cache) > SHAPE_CACHE_SIZE:
+                _shape_cache.popitem(last=False)
+
+    if not hits:
+        return np.zeros((0, n_points)), np.zeros((0, n_points)), {}
+    time = np.stack([h[0] for h in hits])
+    shape = np.stack([h[1] for h in hits])
+    metrics = {key: np.array([h[2][key] for h in hits]) for key in hits[0][2]}
+    return time, shape, metrics
+
+
+def _direct_batch(params, model, n_points, D, F, V_d, body_weight, options):
+    # 배율이 성립하지 않는 비선형 모델: 바꾼 용량·F·체중으로 바로 계산
+    spec = MODELS[model]
+    p = {c: np.asarray(params[c], dtype=np.float64) for c in spec['params'] if c not in ('D', 'F', 'V_d')}
+    p.update(D=D, F=F, V_d=V_d)
+    time = time_grid(spec['horizon'](p, options), n_points)
+    concentration = spec['func'](time, body_weight=body_weight, **p, **options)
+    metrics = variant_metrics(model, p | {'onset_time_hour': params['onset_time_hour']}, body_weight)  # 페이지와 같은 지표
+    return time, concentration, metrics
+
+
+def _scaled_group(params, model, n_points, D, F, V_d, body_weight, options):
+    if model not in SHAPE_PARAMS:
+        return _direct_batch(params, model, n_points, D, F, V_d, body_weight, options)
+    time, shape, metrics = unit_shapes(params, model, n_points, **options)
+    scale = F * D / (V_d * body_weight)
+    concentration = shape * scale[:, None]
+    metrics = {key: v * scale if key in CONCENTRATION_KEYS else v for key, v in metrics.items()}
+    return time, concentration, metrics
+
+
+def scaled_batch(params, model, n_points, D, F, V_d, body_weight, kinds=None, **options):
+    # 캐시된 모양 × F·D/(Vd·체중). 반환은 simulate_batch + 지표 함수와 같은 값
+    # kinds: 약물별 시트 model 값 (ParamTable.kinds). 주면 약물마다 그 모델로 계산
+    n = len(np.asarray(params['t_half']))
+    D, F, V_d = (np.broadcast_to(np.asarray(x, dtype=np.float64), (n,)) for x in (D, F, V_d))
+    groups = model_groups(kinds, model) if kinds is not None else [(model, np.arange(n))]
+    if len(groups) == 1:
+        return _scaled_group(params, groups[0][0], n_points, D, F, V_d, body_weight, options)
+
+    time, concentration, metrics = np.empty((n, n_points)), np.empty((n, n_points)), {}
+    for name, rows in groups:
+        sub = {c: np.asarray(v)[rows] for c, v in params.items()}
+        t, c, m = _scaled_group(sub, name, n_points, D[rows], F[rows], V_d[rows], body_weight, options)
+        time[rows], concentration[rows] = t, c
+        for key, v in m.items():
+            metrics.setdefault(key, np.full(n, np.nan))[rows] = v
+    return time, concentration, metrics
+
+
+def clear_shape_cache():
+    with _shape_lock:
+        _shape_cache.clear()
+
+
+def curve_frame(drug_name, time, concentration, unit='ng/mL'):
+    # (약물 수, 점 수) 배열을 차트용 long 형식 DataFrame으로 (행별 변환 없이 한 번에)
+    import pandas as pd
+
+    m = time.shape[1]
+    return pd.DataFrame({
+        '시간 (hours)': time.ravel(),
+        f'혈중 농도 ({unit})': concentration.ravel(),
+        '약물': np.repeat(np.asarray(drug_name, dtype=object), m),
+    })
+
+
+def interactive_view(drugs, model, n_points, dose_pct, f_pct, body_weight, keys, params=None, **options):
+    # 빠른 조정 모드 화면 (페이지 01~04 공통): 슬라이더 값만 바뀌면 캐시된 단위 용량 곡선에 F·D/(Vd·체중)만 곱해서
+    # 전체 약물 그래프 한 장 + 지표 표 + 내려받기. keys: 표에 보일 지표, params: 슬라이더로 바꾼 컬럼 (기본은 시트 값)
+    import streamlit as st
+
+    from export import curves_table, download_section, metrics_table
+    from selection import summary_frame
+
+    F = np.minimum(drugs.F * f_pct / 100, 1.0)
+    time, concentration, metrics = scaled_batch(drugs.columns if params is None else params, model, n_points,
+                                                drugs.D * dose_pct / 100, F, drugs.V_d, body_weight, kinds=drugs.kinds,
+                                                **options)
+    st.line_chart(curve_frame(drugs.drug_name, time, concentration, 'ng/mL'),
+                  x='시간 (hours)', y='혈중 농도 (ng/mL)', color='약물')
+    st.dataframe(summary_frame(drugs, metrics, keys), hide_index=True)
+    download_section(f'{model}_adjusted', {
+        '곡선': lambda: curves_table(drugs.drug_name, time, {'concentration': concentration}),
+        '지표': lambda: metrics_table(drugs.drug_name, metrics),
+    })
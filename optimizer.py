@@ -0,0 +1,64 @@
+import numpy as np
+
+from regimen import ROUTE_ORAL, ROUTE_PATCH
+from steady_state import oral_steady_state, oral_steady_state_curve, patch_steady_state, patch_steady_state_curve
+
+# 복용 일정 최적화: 허용된 용량 × 투여 간격 조합을 모두 만들어 정상상태에서 한 번에 평가.
+#   조건 1) 한 투여 간격 중 약효 기준 농도 이상인 시간 비율 >= min_coverage
+#   조건 2) Css,max <= max_concentration
+# 조건을 만족하는 일정 중 하루 총 용량이 적고, 같으면 투여 횟수가 적은(간격이 긴) 일정을 앞에 둔다.
+
+N_GRID = 257  # 한 투여 간격을 나누는 점 수 (기준선 교차는 선형 보간)
+
+
+def time_above(time, concentration, threshold):
+    # 각 행에서 농도가 threshold 이상인 시간 (격자 구간마다 선형 보간으로 교차점을 잡음)
+    threshold = np.asarray(threshold, dtype=np.float64)[..., None]
+    c0, c1 = concentration[..., :-1], concentration[..., 1:]
+    lo, hi = np.minimum(c0, c1), np.maximum(c0, c1)
+    span = hi - lo
+    frac = np.where(span > 0, (hi - threshold) / np.where(span > 0, span, 1.0), (hi >= threshold).astype(float))
+    return np.sum(np.clip(frac, 0.0, 1.0) * np.diff(time, axis=-1), axis=-1)
+
+
+def evaluate_regimens(doses, taus, F, V_d, t_half, body_weight, onset_concentration, route=ROUTE_ORAL,
+                      t_max=None, patch_duration_hour=None, tau_off=None, n_grid=N_GRID):
+    # 후보 (용량, 간격) 쌍 배열을 한 번에 평가. 반환: 후보별 지표 배열 dict
+    doses = np.asarray(doses, dtype=np.float64)
+    taus = np.asarray(taus, dtype=np.float64)
+    s = np.multiply.outer(taus, np.linspace(0.0, 1.0, n_grid))
+    if route == ROUTE_ORAL:
+        steady = oral_steady_state(doses, F, V_d, t_half, t_max, taus, body_weight)
+        curve = oral_steady_state_curve(s, doses, F, V_d, t_half, t_max, taus, body_weight)
+    elif route == ROUTE_PATCH:
+        steady = patch_steady_state(doses, F, V_d, t_half, patch_duration_hour, taus, body_weight, tau_off)
+        curve = patch_steady_state_curve(s, doses, F, V_d, t_half, patch_duration_hour, taus, body_weight, tau_off)
+    else:
+        raise ValueError(f"최적화를 지원하지 않는 투여 경로: {route}")
+    return {
+        'dose': doses,
+        'tau': taus,
+        'daily_dose': doses * 24.0 / taus,
+        'doses_per_day': 24.0 / taus,
+        'coverage': time_above(s, curve, onset_concentration) / taus,
+        'css_max': steady['css_max'],
+        'css_min': steady['css_min'],
+        'css_avg': steady['css_avg'],
+    }
+
+
+def optimize_regimen(dose_options, tau_options, F, V_d, t_half, body_weight, onset_concentration,
+                     min_coverage=0.9, max_concentration=None, top=5, route=ROUTE_ORAL, **model):
+    # dose_options × tau_options 격자 전체를 evaluate_regimens 한 번으로 평가하고 조건을 만족하는 상위 top개를 반환
+    # model: t_max (경구) 또는 patch_duration_hour, tau_off (패치)
+    D, tau = np.meshgrid(np.asarray(dose_options, dtype=np.float64), np.asarray(tau_options, dtype=np.float64))
+    result = evaluate_regimens(D.ravel(), tau.ravel(), F, V_d, t_half, body_weight, onset_concentration,
+                               route=route, **model)
+    feasible = result['coverage'] >= min_coverage
+    if max_concentration is not None:
+        feasible &= result['css_max'] <= max_concentration
+
+    # 정렬: 조건 만족 → 하루 총 용량 ↑ → 하루 투여 횟수 ↑ → 기준 이상 비율 ↓
+    order = np.lexsort((-result['coverage'], result['doses_per_day'], result['daily_dose'], ~feasible))
+    order = order[feasible[order]][:top]
+    return {key: v[order] for key, v in result.items()}
@@ -1,86 +1,56 @@
 import streamlit as st
 import numpy as np
-import platform
-import math
-import matplotlib.pyplot as plt
-import matplotlib.font_manager as fm
-import os
-import sys
-import matplotlib.ticker as ticker
-
-
-from functions import get_google_sheet
+from bootstrap import end_page, setup_page
+from perf import stage
+from functions import get_param_table
+from interactive import interactive_view
+from pk_metrics import numeric_rows, oral_single_metrics, shared_model_metrics
+from pk_models import clip_curve, model_name, oral_single, row_model, shared_batch
+from population import population_figure, shared_population
+from figures import concentration_figure
+from charts import chart_for
+from selection import NUMERIC_NOTE, pick_drugs, summary_frame
+from export import curves_table, download_section, metrics_table
+from rendering import figure_job, render, render_many
+from params import ORAL_ROUTES, REQUIRED_COLUMNS
 
 BODY_WEIGHT = 70
+REQUIRED = REQUIRED_COLUMNS  # 계산에 필요한 시트 컬럼
 
 # Streamlit 설정
-st.set_page_config(layout="centered")
-st.title("💊 경구약물 단일복용 농도")
-
-system = platform.system()
-if system == "Windows":
-    font_path = "C:/Windows/Fonts/malgun.ttf"
-elif system == "Darwin":  # macOS
-    font_path = "/System/Library/Fonts/Supplemental/AppleGothic.ttf"
-elif system == "Linux":
-    font_path = "/usr/share/fonts/truetype/nanum/NanumGothic.ttf"
-else:
-    font_path = None
-
-if font_path and os.path.exists(font_path):
-    font_prop = fm.FontProperties(fname=font_path)
-    plt.rcParams["font.family"] = font_prop.get_name()
-    plt.rcParams["axes.unicode_minus"] = False
-else:
-    print(f"⚠️ 해당 OS({system})에서 폰트를 찾을 수 없습니다.")
+setup_page("💊 경구약물 단일복용 농도")
+
+N_POINTS = 300  # 그래프용 점 수 (Tmax, 약효 종료 등 수치는 격자와 무관하게 계산)
 
-# 약동학 모델 함수
-def plot_drug_concentration_with_onset(drug_name, D, F, V_d, t_half, t_max, body_weight, onset_time_hour, t_last):
-    import numpy as np
-    import matplotlib.pyplot as plt
-    import streamlit as st
-    import math
 
+# 약동학 모델 함수
+def plot_drug_concentration_with_onset(drug_name, D, F, V_d, t_half, t_max, body_weight, onset_time_hour, t_last,
+                                       time=None, concentration=None, metrics=None, model_fn=None):
     # 파라미터 계산
     Vd_total = V_d * body_weight
-    k = math.log(2) / t_half
-    ka = (math.log(2) / t_max) + k
-    total_time = t_half * 7
-    time = np.linspace(0, total_time, 1000)
-
-    # 혈중 농도 계산
-    C1_mg_per_L = (ka * F * D) / (Vd_total * (ka - k)) * (np.exp(-k * time) - np.exp(-ka * time))
-    C1_mg_per_L[C1_mg_per_L < 0] = 0
-    concentration = C1_mg_per_L * 1000
-
-    # Tmax 계산
-    t_max_index = np.argmax(concentration)
-    t_max_time = time[t_max_index]
-    c_max_value = concentration[t_max_index]
-
-    # onset 농도 계산
-    onset_concentration = (ka * F * D) / (Vd_total * (ka - k)) * \
-                          (math.exp(-k * onset_time_hour) - math.exp(-ka * onset_time_hour)) * 1000  # ng/mL
-
-
-    # Tmax 이후에 onset_concentration 으로 감소하는 지점 찾기
-    time_after_peak = time[t_max_index:]
-    conc_after_peak = concentration[t_max_index:]
-
-    try:
-        fall_index = np.where(conc_after_peak < onset_concentration)[0][0]
-        falling_time = time_after_peak[fall_index]
-        falling_onset_concentration = concentration[t_max_index + fall_index]
-    except IndexError:
-        falling_time = None
-        falling_onset_concentration = None
+
+    # 혈중 농도 계산 (main에서 여러 약물을 한 번에 계산해 넘겨주지 않은 경우)
+    if time is None:
+        time = np.linspace(0, t_half * 7, N_POINTS)
+        concentration = oral_single(time, D, F, V_d, t_half, t_max, body_weight)
+
+    # Tmax, Cmax, onset 농도, 약효 종료 시점 (해석식/구간 근 찾기)
+    if metrics is None:
+        metrics = oral_single_metrics(D, F, V_d, t_half, t_max, body_weight, onset_time_hour)
+    t_max_time = metrics['tmax']
+    c_max_value = metrics['cmax']
+    onset_concentration = metrics['onset_concentration']
+    falling_time = metrics['effect_end'] if np.isfinite(metrics['effect_end']) else None
+
+    # model_fn: 시트 model 컬럼에 맞는 농도 함수 t -> C (기본은 1-컴파트먼트)
+    if model_fn is None:
+        model_fn = lambda t: oral_single(t, D, F, V_d, t_half, t_max, body_weight)
 
     # ✅ time과 농도 배열을 falling_time + t_end까지 자르기
     if falling_time is not None:
         plot_end_time = falling_time + t_last
-        mask = time <= plot_end_time
-        time = time[mask]
-        concentration = concentration[mask]
+        time, concentration = clip_curve(time, concentration, plot_end_time,
+                                         model_fn, extra_times=(t_max_time,))
     else:
         plot_end_time = time[-1]  # fallback
 
@@ -95,53 +65,91 @@ def plot_drug_concentration_with_onset(drug_name, D, F, V_d, t_half, t_max, body
     | 약효 시작 | {onset_time_hour} hr |
     """)
 
-    # ✅ 그래프
-    fig, ax = plt.subplots(figsize=(10, 6))
-    ax.plot(time, concentration, label='혈중 농도 (C₁)', color='blue', linewidth=2)
-    ax.axvline(x=onset_time_hour, color='green', linestyle='--', label=f'약효 시작: {onset_time_hour:.1f}h')
-    ax.plot(t_max_time, c_max_value, 'kv', markersize=8, label=f'Cmax: {c_max_value:.2f} ng/mL')
-    ax.axhline(y=onset_concentration,
-               xmin=0, xmax=1,
-               color='blue', linestyle='--', linewidth=2,
-               label=f'약효 기준 농도: {onset_concentration:.2f} ng/mL')
-    ax.axvline(x=plot_end_time, color='gray', linestyle=':',
-               label=f'그래프 종료: {plot_end_time:.1f}h')
-
-    if falling_time is not None:
-        ax.axvline(x=falling_time, color='orange', linestyle='--',
-                   label=f'약효 종료 시간: {falling_time:.1f}h')
+    # ✅ 그래프: 자리만 잡아 두고 main에서 모든 약물을 한꺼번에 렌더링 (rendering.render_many)
+    return st.empty(), figure_job(concentration_figure, drug_name, time, concentration, onset_time_hour, t_max_time,
+                                  c_max_value, onset_concentration, plot_end_time, falling_time,
+                                  line_label='혈중 농도 (C₁)', linewidth=2)
 
 
-    ax.set_title(f'{drug_name} - 혈중 농도 및 약효 시간')
-    ax.set_xlabel("시간 (hours)")
-    ax.set_ylabel("혈중 농도 (ng/mL)")
-    ax.grid(True, linestyle=':')
-    ax.legend()
-    ax.set_xlim(0, plot_end_time)
-    ax.set_ylim(0)
-
-    st.pyplot(fig)
 # === 데이터 불러오기 및 필터링 ===
 def main():
 
-    df = get_google_sheet()
-    filtered_df = df[(df['Use'] == 'Y') & (df['route_of_administration'].isin(['경구일반', '경구서방']))]
+    table = get_param_table()
+    drugs = table.select(routes=ORAL_ROUTES, required=REQUIRED)
+    for name, cols in table.problems(routes=ORAL_ROUTES, required=REQUIRED):
+        st.warning(f"{name}: {', '.join(cols)} 값이 비어 있거나 잘못되어 제외했습니다.")
+    # 빠른 조정 모드: 용량·체중·F 슬라이더. 곡선 모양은 캐시, 배율만 다시 계산
+    st.sidebar.header("빠른 조정")
+    if st.sidebar.toggle("빠른 조정 모드 (전체 약물 그래프 한 장)", value=False):
+        dose_pct = st.sidebar.slider("용량 (%)", 25, 300, 100, 5)
+        f_pct = st.sidebar.slider("생체이용률 F (%)", 25, 200, 100, 5)
+        body_weight = st.sidebar.slider("체중 (kg)", 30, 150, BODY_WEIGHT)
+        interactive_view(drugs, 'oral_single', N_POINTS, dose_pct, f_pct, body_weight,
+                         ('cmax', 'tmax', 'onset_concentration', 'effect_end'))
+        return
+    n_patients = int(st.sidebar.number_input("인구집단 시뮬레이션 (가상 환자 수, 0 = 끄기)",
+                                             min_value=0, max_value=100000, value=0, step=500))
+    interactive_charts = st.sidebar.toggle("인터랙티브 그래프 (브라우저에서 확대·툴팁)", value=False)
+
+    # 전체 약물 요약(해석식 지표)을 먼저, 곡선 계산·그래프는 고른 약물만
+    metrics = shared_model_metrics(drugs, 'oral_single', BODY_WEIGHT, numeric=False)  # 약물별 model 컬럼(1cmt/2cmt)에 맞게
+    st.dataframe(summary_frame(drugs, metrics, ('cmax', 'tmax', 'onset_concentration', 'effect_end', 'effect_duration')),
+                 hide_index=True)
+    if len(numeric_rows(drugs, 'oral_single')):
+        st.caption(NUMERIC_NOTE)
+    picked = pick_drugs(drugs)
+    drugs = drugs.take(picked)
+    metrics = shared_model_metrics(drugs, 'oral_single', BODY_WEIGHT)  # 고른 약물은 비선형 소실(ODE)까지
     st.markdown("---")
 
-    for _, row in filtered_df.iterrows():
+    # 고른 약물을 한 번에 계산: (약물 수, N_POINTS)
+    with stage('simulate', model='oral_single', drugs=len(drugs), points=N_POINTS):
+        times, concentrations = shared_batch(drugs, 'oral_single', N_POINTS, BODY_WEIGHT)
+
+    slots, jobs = [], []
+    for i in range(len(drugs)):
+        row = drugs.row(i)
         st.subheader(f"🧪 {row['drug_name']}")
-        plot_drug_concentration_with_onset(
+        slot, job = plot_drug_concentration_with_onset(
             drug_name=row['drug_name'],
-            D=float(row['D']),
-            F=float(row['F']) * 0.01,
-            V_d=float(row['V_d']),
-            t_half=float(row['t_half']),
-            t_max=float(row['t_max']),
+            D=row['D'],
+            F=row['F'],
+            V_d=row['V_d'],
+            t_half=row['t_half'],
+            t_max=row['t_max'],
             body_weight=BODY_WEIGHT,
-            onset_time_hour=float(row['onset_time_hour']),
-            t_last = float(row['t_last'])
+            onset_time_hour=row['onset_time_hour'],
+            t_last = row['t_last'],
+            time=times[i],
+            concentration=concentrations[i],
+            metrics={key: float(v[i]) for key, v in metrics.items()},
+            model_fn=row_model('oral_single', row, BODY_WEIGHT)
         )
+        slots.append(slot)
+        jobs.append(job)
+        if n_patients > 0:
+            # 체중·Vd·CL·F·흡수속도가 환자마다 다를 때의 중앙값과 5–95% 구간
+            pop = shared_population(model_name('oral_single', row['model']), times[i], row, n_patients, BODY_WEIGHT,
+                                      onset_concentration=float(metrics['onset_concentration'][i]))
+            st.image(render(population_figure, pop, row['drug_name']))
         st.markdown("---")
 
+    if interactive_charts:
+        # 브라우저에서 그리는 그래프: 곡선은 LTTB로 줄여 보내고 확대·툴팁은 재실행 없이
+        with stage('chart', charts=len(jobs)):
+            for slot, job in zip(slots, jobs):
+                slot.altair_chart(chart_for(job))
+    else:
+        # 약물별 그래프를 작업 프로세스에서 한꺼번에 그려 (캐시에 없는 것만) 자리에 채움
+        for slot, image in zip(slots, render_many(jobs)):
+            slot.image(image)
+
+    # 고른 약물의 곡선(그래프로 자르기 전 전체 격자)·지표 내려받기
+    download_section('oral_single', {
+        '곡선': lambda: curves_table(drugs.drug_name, times, {'concentration': concentrations}),
+        '지표': lambda: metrics_table(drugs.drug_name, metrics),
+    })
+
 if __name__ == "__main__":
     main()
+    end_page()
@@ -1,80 +1,50 @@
 import streamlit as st
 import numpy as np
-import platform
-import math
-import matplotlib.pyplot as plt
-import matplotlib.font_manager as fm
-import os
-eps = 1e-9
+import pandas as pd
 
-from functions import get_google_sheet
+from bootstrap import end_page, setup_page
+from perf import stage
+from functions import get_param_table
+from interactive import interactive_view
+from optimizer import optimize_regimen
+from pk_metrics import oral_single_metrics
+from pk_models import oral_multi_dose, shared_batch
+from population import population_figure, shared_population
+from figures import multi_dose_figure
+from charts import chart_for
+from selection import one_compartment_only, pick_drugs, summary_frame, take_metrics
+from export import curves_table, download_section, metrics_table
+from rendering import figure_job, render, render_many
+from regimen import ROUTE_ORAL, regular_regimen, simulate_regimen
+from steady_state import oral_steady_state
+from streaming import daily_envelope_figure, periodic_events, stream_regimen, summarize_stream
+from params import ORAL_ROUTES
 
 BODY_WEIGHT = 70
+N_DOSES = 4
+DT = 0.05
+INTERACTIVE_POINTS = 800  # 빠른 조정 모드 그래프 점 수
+MAX_DAYS = 365  # 장기 복용 시뮬레이션 최대 (일)
+MAX_HOUR = MAX_DAYS * 24.0  # PRN 복용 시각·허용 간격 상한 (h). 넘으면 격자가 지나치게 커짐
+DOSE_MULTIPLIERS = (0.5, 1.0, 1.5, 2.0)  # 최적화 기본 후보 용량 (시트 용량의 배수)
+REQUIRED = ('D', 'F', 'V_d', 't_half', 't_max', 'tau')  # 계산에 필요한 시트 컬럼
 
 # Streamlit 설정
-st.set_page_config(layout="centered")
-st.title("💊 경구약물 연속복용 농도")
-
-system = platform.system()
-if system == "Windows":
-    font_path = "C:/Windows/Fonts/malgun.ttf"
-elif system == "Darwin":  # macOS
-    font_path = "/System/Library/Fonts/Supplemental/AppleGothic.ttf"
-elif system == "Linux":
-    font_path = "/usr/share/fonts/truetype/nanum/NanumGothic.ttf"
-else:
-    font_path = None
-
-if font_path and os.path.exists(font_path):
-    font_prop = fm.FontProperties(fname=font_path)
-    plt.rcParams["font.family"] = font_prop.get_name()
-    plt.rcParams["axes.unicode_minus"] = False
-else:
-    print(f"⚠️ 해당 OS({system})에서 폰트를 찾을 수 없습니다.")
+setup_page("💊 경구약물 연속복용 농도")
 
 # 약동학 모델 함수
-def simulate_pk_multi_dose_simple(drug_name, t_max, t_half, V_d, F, D, tau, n_doses, dt, body_weight):
+def simulate_pk_multi_dose_simple(drug_name, t_max, t_half, V_d, F, D, tau, n_doses, dt, body_weight,
+                                  time=None, concentration=None, dose_times=None, steady=None):
     Vd_total = V_d * body_weight
 
-    # --- k, ka 계산 ---
-    k = math.log(2) / t_half
-    ka = (math.log(2) / t_max) + k
-    if abs(ka - k) < eps:
-        ka = k + eps
-
-    # --- 시간축 구성 ---
-    total_time = n_doses * tau
-    time = np.arange(0.0, total_time + dt, dt)
-
-    # 각 시점의 투여 횟수 및 마지막 투여 후 경과시간
-    n = np.floor(time / tau).astype(int) + 1
-    n = np.clip(n, 0, n_doses)
-    t_since_last = time - (n - 1) * tau
-    t_since_last = np.where(n == 0, 0.0, t_since_last)
-
-    # 누적계수
-    def accum(r, n_):
-        den = 1.0 - np.exp(-r * tau)
-        den = np.where(np.abs(den) < eps, eps, den)
-        return (1.0 - np.exp(-n_ * r * tau)) / den
-
-    A_k  = accum(k,  n)
-    A_ka = accum(ka, n)
-
-    # ---- 농도 계산 (mg/L) -> ng/mL 변환 ----
-    coef_mg_per_L = (ka * F * D) / (Vd_total * (ka - k))  # mg/L 계수
-    C_mg_per_L = np.zeros_like(time)
-    mask = n > 0
-    C_mg_per_L[mask] = coef_mg_per_L * (
-        A_k[mask]  * np.exp(-k  * t_since_last[mask]) -
-        A_ka[mask] * np.exp(-ka * t_since_last[mask])
-    )
-
-    # 단일투여식 참고하신 로직과 동일하게 후처리:
-    # 1) 음수 절삭
-    C_mg_per_L[C_mg_per_L < 0] = 0
-    # 2) mg/L -> ng/mL (×1000)
-    concentration = C_mg_per_L * 1000.0
+    # 혈중 농도 계산 (main에서 여러 약물을 한 번에 계산해 넘겨주지 않은 경우)
+    if time is None:
+        time = np.arange(0.0, n_doses * tau + dt, dt)
+        concentration = oral_multi_dose(time, D, F, V_d, t_half, t_max, tau, n_doses, body_weight)
+
+    # 정상상태 (투여를 반복해서 계산하지 않고 해석식으로)
+    if steady is None:
+        steady = oral_steady_state(D, F, V_d, t_half, t_max, tau, body_weight)
 
     # 그래프
     st.markdown(f"""
@@ -86,48 +56,207 @@ def simulate_pk_multi_dose_simple(drug_name, t_max, t_half, V_d, F, D, tau, n_do
         | 반감기 (t½) | {t_half} hr |
         | 투여간격 | {tau} hr |
         | 복용횟수 | {n_doses} |
+        | 정상상태 Css (최고 / 최저 / 평균) | {steady['css_max']:.2f} / {steady['css_min']:.2f} / {steady['css_avg']:.2f} ng/mL |
+        | 축적비 1/(1−e^(−kτ)) | {steady['accumulation_ratio']:.2f} |
+        | 정상상태 도달 (90% / 95%) | {steady['t_ss_90']:.1f} / {steady['t_ss_95']:.1f} hr |
         """)
-    fig, ax = plt.subplots(figsize=(10, 6))
-    ax.plot(time, concentration, lw=2, label='혈중 농도 (C)')
-    # 투여 시점 표시(선택)
-    for i in range(n_doses):
-        ax.axvline(i * tau, linestyle="--", linewidth=0.6, color='gray')
+    # 그래프: 자리만 잡아 두고 main에서 모든 약물을 한꺼번에 렌더링 (rendering.render_many)
+    if dose_times is None:
+        dose_times = [i * tau for i in range(n_doses)]
+    return st.empty(), figure_job(multi_dose_figure, drug_name, time, concentration, dose_times,
+                                  steady['css_max'], steady['css_min'])
 
-    ax.set_title(f'{drug_name} - 혈중 농도 및 약효 시간')
-    ax.set_xlabel("시간 (hours)")
-    ax.set_ylabel("혈중 농도 (ng/mL)")   # ★ 단위 수정
-    ax.grid(True, linestyle=':')
-    ax.legend()
-    ax.set_ylim(0)
+    #return t, concentration, ka, k
+
+
+def _parse_numbers(text, valid):
+    # "3, 5" → ([3.0, 5.0], 버린 항목). 숫자가 아니거나 inf/nan이거나 valid(값)이 거짓인 항목은 버림
+    kept, dropped = [], []
+    for part in text.replace(';', ',').split(','):
+        part = part.strip()
+        if not part:
+            continue
+        try:
+            value = float(part)
+        except ValueError:
+            value = np.nan
+        if np.isfinite(value) and valid(value):
+            kept.append(value)
+        else:
+            dropped.append(part)
+    return kept, dropped
+
+
+def number_list_input(label, default, valid, rule):
+    # 사이드바 숫자 목록 입력. 범위를 벗어난 항목은 경고를 띄우고 빼고 씀
+    values, dropped = _parse_numbers(st.sidebar.text_input(label, default), valid)
+    if dropped:
+        st.warning(f"{label}: {', '.join(dropped)} — {rule}만 쓸 수 있어 제외했습니다.")
+    return values
+
+
+def recommend_regimens(row, onset_concentration, dose_options, tau_options, min_coverage, max_ratio):
+    # 정상상태에서 약효 기준 농도 이상 비율과 최고 농도 조건을 만족하는 일정 (하루 총 용량이 적은 순)
+    doses = dose_options or [row['D'] * m for m in DOSE_MULTIPLIERS]
+    best = optimize_regimen(doses, tau_options, row['F'], row['V_d'], row['t_half'], BODY_WEIGHT,
+                            onset_concentration, min_coverage=min_coverage,
+                            max_concentration=max_ratio * onset_concentration, t_max=row['t_max'])
+    st.markdown(f"**추천 복용 일정** (약효 기준 농도 {onset_concentration:.2f} ng/mL, 정상상태)")
+    if len(best['dose']) == 0:
+        st.info("조건을 만족하는 일정이 없습니다. 허용 용량·간격이나 조건을 바꿔 보세요.")
+        return
+    st.dataframe(pd.DataFrame({
+        '용량 (mg)': best['dose'],
+        '간격 (h)': best['tau'],
+        '하루 총 용량 (mg)': best['daily_dose'],
+        '기준 이상 시간 (%)': best['coverage'] * 100,
+        'Css,max (ng/mL)': best['css_max'],
+        'Css,min (ng/mL)': best['css_min'],
+    }).round(2), hide_index=True)
+
+
+def regimen_events(D, tau, n_doses, missed, prn_times):
+    # 사이드바 입력으로 실제 투여 일정 구성: 정규 투여 - 빠뜨린 회차 + PRN 추가 투여
+    events = regular_regimen(D, tau, n_doses, missed={int(m) - 1 for m in missed})
+    events += [(t, D, ROUTE_ORAL) for t in prn_times]
+    return sorted(events)
 
-    st.pyplot(fig)
 
-    #return t, concentration, ka, k
 # === 데이터 불러오기 및 필터링 ===
 def main():
 
-    df = get_google_sheet()
-    filtered_df = df[(df['Use'] == 'Y') & (df['route_of_administration'].isin(['경구일반', '경구서방']))]
+    table = get_param_table()
+    drugs = table.select(routes=ORAL_ROUTES, required=REQUIRED)
+    for name, cols in table.problems(routes=ORAL_ROUTES, required=REQUIRED):
+        st.warning(f"{name}: {', '.join(cols)} 값이 비어 있거나 잘못되어 제외했습니다.")
+    drugs = one_compartment_only(drugs, "경구 단일복용 페이지")
+    # 빠른 조정 모드: 용량·체중·F·복용 간격 슬라이더. 곡선 모양은 캐시, 배율만 다시 계산
+    st.sidebar.header("빠른 조정")
+    if st.sidebar.toggle("빠른 조정 모드 (전체 약물 그래프 한 장)", value=False):
+        dose_pct = st.sidebar.slider("용량 (%)", 25, 300, 100, 5)
+        f_pct = st.sidebar.slider("생체이용률 F (%)", 25, 200, 100, 5)
+        body_weight = st.sidebar.slider("체중 (kg)", 30, 150, BODY_WEIGHT)
+        tau_pct = st.sidebar.slider("복용 간격 (%)", 25, 300, 100, 5)
+        # 간격이 바뀐 약물만 모양을 다시 계산
+        interactive_view(drugs, 'oral_multi_dose', INTERACTIVE_POINTS, dose_pct, f_pct, body_weight,
+                         ('cmax', 'tmax', 'css_avg'), params=drugs.columns | {'tau': drugs.tau * tau_pct / 100},
+                         n_doses=N_DOSES)
+        return
+    interactive_charts = st.sidebar.toggle("인터랙티브 그래프 (브라우저에서 확대·툴팁)", value=False)
+
+    # 투여 일정 (기본값이면 기존처럼 같은 간격·같은 용량)
+    st.sidebar.header("투여 일정")
+    n_doses = int(st.sidebar.number_input("복용 횟수", min_value=1, max_value=500, value=N_DOSES))
+    missed = number_list_input("빠뜨린 복용 회차 (예: 2, 3)", "", lambda m: m.is_integer() and 1 <= m <= n_doses,
+                               f"1~{n_doses} 사이의 정수")
+    prn_times = number_list_input("추가(PRN) 복용 시각 h (예: 5, 17.5)", "", lambda t: 0 <= t <= MAX_HOUR,
+                                  f"0~{MAX_HOUR:.0f} h 사이의 시각")
+    custom = bool(missed or prn_times)
+    long_days = int(st.sidebar.number_input("장기 복용 시뮬레이션 (일, 0 = 끄기)", min_value=0, max_value=MAX_DAYS, value=0))
+    n_patients = int(st.sidebar.number_input("인구집단 시뮬레이션 (가상 환자 수, 0 = 끄기)",
+                                             min_value=0, max_value=100000, value=0, step=500))
+
+    # 전체 약물 요약(정상상태 해석식)을 먼저, 곡선 계산·그래프는 고른 약물만
+    steady = oral_steady_state(drugs.D, drugs.F, drugs.V_d, drugs.t_half, drugs.t_max, drugs.tau, BODY_WEIGHT)
+    st.dataframe(summary_frame(drugs, steady, ('css_max', 'css_min', 'css_avg', 't_ss_90')), hide_index=True)
+    picked = pick_drugs(drugs)
+    drugs, steady = drugs.take(picked), take_metrics(steady, picked)
     st.markdown("---")
 
+    # 복용 일정 최적화: 허용 용량 × 간격 조합을 정상상태에서 한 번에 평가
+    st.sidebar.header("복용 일정 최적화")
+    optimize = st.sidebar.toggle("추천 일정 보기", value=False)
+    if optimize:
+        dose_options = number_list_input("허용 용량 mg (비우면 시트 용량의 0.5~2배)", "", lambda d: d > 0, "양수")
+        tau_options = number_list_input("허용 간격 h", "4, 6, 8, 12, 24", lambda t: 0 < t <= MAX_HOUR,
+                                        f"0 초과 {MAX_HOUR:.0f} h 이하의 간격")
+        min_coverage = st.sidebar.slider("약효 기준 농도 이상 시간 (%)", 50, 100, 90, 5) / 100
+        max_ratio = st.sidebar.number_input("최대 농도 (약효 기준 농도의 배수)", min_value=1.0, value=3.0, step=0.5)
+        # 기준선은 페이지 1과 같은 값: 시트 용량 1회 복용 시 약효 시작 시점의 농도 (onset_time_hour가 없으면 NaN)
+        onset = oral_single_metrics(drugs.D, drugs.F, drugs.V_d, drugs.t_half, drugs.t_max, BODY_WEIGHT,
+                                    drugs.onset_time_hour)['onset_concentration']
+
     #변수설명
     #tau: 복약간격
     #dt: 그래프 해상도 (dt=0.05h (≈ 3분) → 0 ~ 48시간을 0.05 간격으로 계산 → 총 961포인트)
-    for _, row in filtered_df.iterrows():
+    # 모든 약물을 한 번에 계산: (약물 수, 점 수)
+    # 약물마다 그래프 길이(N_DOSES * tau)가 달라서, 가장 긴 약물의 간격이 DT가 되도록 점 수를 정함
+    if not custom:
+        n_points = int(np.ceil(n_doses * np.max(drugs.tau, initial=0.0) / DT)) + 1
+        with stage('simulate', model='oral_multi_dose', drugs=len(drugs), points=n_points):
+            times, concentrations = shared_batch(drugs, 'oral_multi_dose', n_points, BODY_WEIGHT, n_doses=n_doses)
+
+    slots, jobs = [], []
+    curve_times, curve_concentrations = [], []  # 내보내기용 (불규칙한 일정이면 약물마다 길이가 다름)
+    for i in range(len(drugs)):
+        row = drugs.row(i)
         st.subheader(f"🧪 {row['drug_name']}")
-        simulate_pk_multi_dose_simple(
+        if custom:
+            # 불규칙한 일정: 이벤트별 중첩으로 약물마다 계산
+            events = regimen_events(row['D'], row['tau'], n_doses, missed, prn_times)
+            dose_times = [t for t, _, _ in events]
+            time = np.arange(0.0, max(n_doses * row['tau'], dose_times[-1] + row['tau']) + DT, DT) \
+                if dose_times else np.arange(0.0, n_doses * row['tau'] + DT, DT)
+            with stage('simulate', model='regimen', drugs=1, points=len(time)):
+                concentration = simulate_regimen(time, events, row['F'], row['V_d'], row['t_half'], row['t_max'],
+                                                 BODY_WEIGHT)
+        else:
+            time, concentration, dose_times = times[i], concentrations[i], None
+        curve_times.append(time)
+        curve_concentrations.append(concentration)
+        slot, job = simulate_pk_multi_dose_simple(
             drug_name=row['drug_name'],
-            D=float(row['D']),
-            F=float(row['F']) * 0.01,
-            V_d=float(row['V_d']),
-            t_half=float(row['t_half']),
-            t_max=float(row['t_max']),
+            D=row['D'],
+            F=row['F'],
+            V_d=row['V_d'],
+            t_half=row['t_half'],
+            t_max=row['t_max'],
             body_weight=BODY_WEIGHT,
-            tau = float(row['tau']),
-            n_doses = 4,
-            dt = 0.05
+            tau = row['tau'],
+            n_doses = n_doses,
+            dt = DT,
+            time=time,
+            concentration=concentration,
+            dose_times=dose_times,
+            steady={key: float(v[i]) for key, v in steady.items()}
         )
+        slots.append(slot)
+        jobs.append(job)
+        if long_days > 0:
+            # 같은 간격으로 long_days일 동안 복용: 블록 단위로 계산하며 일별 최저/최고/평균만 남김
+            # (1-컴파트먼트 엔진, 2cmt·mm 약물은 one_compartment_only에서 이미 제외되어 위 곡선과 같은 모델)
+            horizon = long_days * 24.0
+            blocks = stream_regimen(periodic_events(row['D'], row['tau'], horizon), row['F'], row['V_d'],
+                                    row['t_half'], row['t_max'], BODY_WEIGHT, horizon, DT)
+            summary = summarize_stream(blocks)
+            st.image(render(daily_envelope_figure, summary, f"{row['drug_name']} - {long_days}일 복용 시 일별 농도 범위"))
+        if n_patients > 0:
+            # 정규 일정(같은 간격·같은 용량)에서 환자 간 변동
+            pop = shared_population('oral_multi_dose', time, row, n_patients, BODY_WEIGHT, n_doses=n_doses)
+            st.image(render(population_figure, pop, row['drug_name']))
+        if optimize and tau_options:
+            if np.isfinite(onset[i]) and onset[i] > 0:
+                recommend_regimens(row, float(onset[i]), dose_options, tau_options, min_coverage, max_ratio)
+            else:
+                st.info("약효 시작 시간(onset_time_hour)이 없어 추천 일정을 계산할 수 없습니다.")
         st.markdown("---")
 
+    if interactive_charts:
+        # 브라우저에서 그리는 그래프: 곡선은 LTTB로 줄여 보내고 확대·툴팁은 재실행 없이
+        with stage('chart', charts=len(jobs)):
+            for slot, job in zip(slots, jobs):
+                slot.altair_chart(chart_for(job))
+    else:
+        # 약물별 그래프를 작업 프로세스에서 한꺼번에 그려 (캐시에 없는 것만) 자리에 채움
+        for slot, image in zip(slots, render_many(jobs)):
+            slot.image(image)
+
+    # 고른 약물의 곡선·정상상태 지표 내려받기
+    download_section('oral_multi_dose', {
+        '곡선': lambda: curves_table(drugs.drug_name, curve_times, {'concentration': curve_concentrations}),
+        '지표': lambda: metrics_table(drugs.drug_name, steady),
+    })
+
 if __name__ == "__main__":
     main()
+    end_page()
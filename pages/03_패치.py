@@ -1,92 +1,71 @@
 import streamlit as st
 import numpy as np
-import platform
-import math
-import matplotlib.pyplot as plt
-import matplotlib.font_manager as fm
-import os
-import matplotlib.ticker as ticker
-from functions import get_google_sheet
+from bootstrap import end_page, setup_page
+from perf import stage
+from functions import get_param_table
+from interactive import interactive_view
+from pk_metrics import numeric_rows, patch_metrics, shared_model_metrics
+from pk_models import (PATCH_SCALE, clip_curve, model_name, patch_time_grid, patch_zero_order, row_model,
+                       shared_batch)
+from population import population_figure, shared_population
+from figures import concentration_figure
+from charts import chart_for
+from selection import NUMERIC_NOTE, pick_drugs, summary_frame, take_metrics
+from export import curves_table, download_section, metrics_table
+from rendering import figure_job, render, render_many
+from regimen import ROUTE_PATCH
+from steady_state import patch_steady_state_table
+from streaming import daily_envelope_figure, periodic_events, stream_regimen, summarize_stream
+from params import DEFAULT_MODEL, PATCH_ROUTES, REQUIRED_COLUMNS
 
 BODY_WEIGHT = 70
+REQUIRED = REQUIRED_COLUMNS + ('patch_duration_hour',)  # 계산에 필요한 시트 컬럼
 
 # Streamlit 설정
-st.set_page_config(layout="centered")
-st.title("💊 패치 약물 농도 시뮬레이션")
-
-# 폰트 설정
-system = platform.system()
-if system == "Windows":
-    font_path = "C:/Windows/Fonts/malgun.ttf"
-elif system == "Darwin":
-    font_path = "/System/Library/Fonts/Supplemental/AppleGothic.ttf"
-elif system == "Linux":
-    font_path = "/usr/share/fonts/truetype/nanum/NanumGothic.ttf"
-else:
-    font_path = None
-
-if font_path and os.path.exists(font_path):
-    font_prop = fm.FontProperties(fname=font_path)
-    plt.rcParams["font.family"] = font_prop.get_name()
-    plt.rcParams["axes.unicode_minus"] = False
-else:
-    print(f"⚠️ 해당 OS({system})에서 폰트를 찾을 수 없습니다.")
+setup_page("💊 패치 약물 농도 시뮬레이션")
+
+LONG_DT = 0.1  # 장기 부착 시뮬레이션 간격 (hr)
+N_POINTS = 500  # 그래프용 점 수 (Tmax, 약효 종료 등 수치는 격자와 무관하게 계산)
+
+
+def steady_rows(tau, steady):
+    # tau마다 새 패치로 바꿔 붙일 때의 정상상태 (표 마지막 행들, tau가 없으면 빈 문자열)
+    if steady is None or not np.isfinite(steady['css_avg']):
+        return ""
+    return (f"| 반복 부착 정상상태 Css (최고 / 최저 / 평균, {tau:g} h마다 교체) | "
+            f"{steady['css_max']:.2f} / {steady['css_min']:.2f} / {steady['css_avg']:.2f} |\n"
+            f"    | 정상상태 도달 (90% / 95%) | {steady['t_ss_90']:.1f} / {steady['t_ss_95']:.1f} hr |")
+
 
 # 패치 약물 농도 계산 함수
-def plot_patch_concentration(drug_name, D, F, V_d, t_half, t_max, body_weight, onset_time_hour, patch_duration_hour, t_last):
+def plot_patch_concentration(drug_name, D, F, V_d, t_half, t_max, body_weight, onset_time_hour, patch_duration_hour, t_last,
+                             time=None, concentration=None, metrics=None, model_fn=None, tau=None, steady=None):
 
     #파라미터 계산
-    D_ng = D * 1e6 #패치형 약물은 천천히 일정 속도로 투입되므로, 정확한 농도 계산을 위해 용량 단위를 ng로 변환한 후 누적/소실 계산에 직접 사용
-    k = np.log(2) / t_half
-    R0 = (D_ng * F) / patch_duration_hour  # ng/hr
     Vd_total = V_d * body_weight  # L
-    total_time = max(patch_duration_hour * 2, t_half * 7)# 패치의 경우 속효성 약품보다 길게 그림
-
-    time = np.linspace(0, total_time, 10000)
-
-    #혈중농도 계산
-    concentration = []
-    for t in time:
-        if t <= patch_duration_hour:
-            c = (R0 / (k * Vd_total)) * (1 - np.exp(-k * t))
-        else:
-            C_end = (R0 / (k * Vd_total) * (1 - np.exp(-k * patch_duration_hour)))
-            c = C_end * np.exp(-k * (t - patch_duration_hour))
-        concentration.append(c)
-    concentration = np.array(concentration)
-
-    #tmax 계산
-    t_max_index = np.argmax(concentration)
-    t_max_time = time[t_max_index]
-    c_max_value = concentration[t_max_index]
-
-    # onset 농도 계산
-    if onset_time_hour <= patch_duration_hour: #onset 시간이 patch 붙히고 있는 시간보다 짧다 (거의 이 로직만 탐)
-        onset_concentration = (R0 / (k * Vd_total)) * (1 - np.exp(-k * onset_time_hour))
-    else:
-        C_end = (R0 / (k * Vd_total)) * (1 - np.exp(-k * patch_duration_hour))
-        onset_concentration = C_end * np.exp(-k * (onset_time_hour - patch_duration_hour))
-        print("어며 여길 탔네")
 
+    #혈중농도 계산 (main에서 여러 약물을 한 번에 계산해 넘겨주지 않은 경우)
+    if time is None:
+        time = patch_time_grid(t_half, patch_duration_hour, N_POINTS)
+        concentration = patch_zero_order(time, D, F, V_d, t_half, patch_duration_hour, body_weight)
 
-    # Tmax 이후에 onset_concentration 으로 감소하는 지점 찾기
-    time_after_peak = time[t_max_index:]
-    conc_after_peak = concentration[t_max_index:]
+    #tmax, onset 농도, 약효 종료 시점 (제로오더 모델은 패치 제거 시점이 Tmax)
+    if metrics is None:
+        metrics = patch_metrics(D, F, V_d, t_half, patch_duration_hour, body_weight, onset_time_hour)
+    t_max_time = metrics['tmax']
+    c_max_value = metrics['cmax']
+    onset_concentration = metrics['onset_concentration']
+    falling_time = metrics['effect_end'] if np.isfinite(metrics['effect_end']) else None
 
-    try:
-        fall_index = np.where(conc_after_peak < onset_concentration)[0][0]
-        falling_time = time_after_peak[fall_index]
-        falling_onset_concentration = concentration[t_max_index + fall_index]
-    except IndexError:
-        falling_time = None
-        falling_onset_concentration = None
+    # model_fn: 시트 model 컬럼에 맞는 농도 함수 t -> C (기본은 1-컴파트먼트)
+    if model_fn is None:
+        model_fn = lambda t: patch_zero_order(t, D, F, V_d, t_half, patch_duration_hour, body_weight)
 
     # ✅ time과 농도 배열을 falling_time + t_last 자르기
     if falling_time is not None:
         plot_end_time = falling_time + t_last
-        mask = time <= plot_end_time
-        time = time[mask]
-        concentration = concentration[mask]
+        time, concentration = clip_curve(time, concentration, plot_end_time,
+                                         model_fn, extra_times=(patch_duration_hour, t_max_time))
     else:
         plot_end_time = time[-1]  # fallback
 
@@ -101,58 +80,111 @@ def plot_patch_concentration(drug_name, D, F, V_d, t_half, t_max, body_weight, o
     | Tmax | {t_max} hr |
     | Patch 부착 시간 | {patch_duration_hour} hr |
     | 약효 시작 | {onset_time_hour} hr |
+    {steady_rows(tau, steady)}
     """)
 
-    # 그래프
-    fig, ax = plt.subplots(figsize=(10, 6))
-    ax.plot(time, concentration, label='혈중 농도', color='blue')
-    ax.axvline(x=onset_time_hour, color='green', linestyle='--', label=f'약효 시작: {onset_time_hour:.1f}h')
-    ax.plot(t_max_time, c_max_value, 'kv', markersize=8, label=f'Cmax: {c_max_value:.2f} ng/mL')
-    #ax.axhline(y=onset_concentration, color='blue', linestyle=':', label=f'약효 기준 농도: {onset_concentration:.2f} ng/mL')
-    ax.axhline(y=onset_concentration,
-               xmin=0, xmax=1,
-               color='blue', linestyle='--', linewidth=2,
-               label=f'약효 기준 농도: {onset_concentration:.2f} ng/mL')
-    ax.axvline(x=plot_end_time, color='gray', linestyle=':',
-               label=f'그래프 종료: {plot_end_time:.1f}h')
-
-    if falling_time is not None:
-        ax.axvline(x=falling_time, color='orange', linestyle='--',
-                   label=f'약효 종료 시간: {falling_time:.1f}h')
-
-    ax.set_title(f'{drug_name} - 혈중 농도 및 약효 시간')
-    ax.set_xlabel("시간 (hours)")
-    ax.set_ylabel("혈중 농도 (ng/mL)")
-    ax.grid(True, linestyle=':')
-    ax.legend()
-    ax.set_xlim(0, plot_end_time)
-    ax.set_ylim(0)
-
-    st.pyplot(fig)
+    # 그래프: 자리만 잡아 두고 main에서 모든 약물을 한꺼번에 렌더링 (rendering.render_many)
+    return st.empty(), figure_job(concentration_figure, drug_name, time, concentration, onset_time_hour, t_max_time,
+                                  c_max_value, onset_concentration, plot_end_time, falling_time)
 
 
 # === 메인 실행 ===
 def main():
-    df = get_google_sheet()
-    filtered_df = df[(df['Use'] == 'Y') & (df['route_of_administration'].str.contains('패치'))]
-
+    table = get_param_table()
+    drugs = table.select(contains=PATCH_ROUTES[0], required=REQUIRED)
+    for name, cols in table.problems(contains=PATCH_ROUTES[0], required=REQUIRED):
+        st.warning(f"{name}: {', '.join(cols)} 값이 비어 있거나 잘못되어 제외했습니다.")
+    # 빠른 조정 모드: 용량·체중·F 슬라이더. 곡선 모양은 캐시, 배율만 다시 계산
+    st.sidebar.header("빠른 조정")
+    if st.sidebar.toggle("빠른 조정 모드 (전체 약물 그래프 한 장)", value=False):
+        dose_pct = st.sidebar.slider("용량 (%)", 25, 300, 100, 5)
+        f_pct = st.sidebar.slider("생체이용률 F (%)", 25, 200, 100, 5)
+        body_weight = st.sidebar.slider("체중 (kg)", 30, 150, BODY_WEIGHT)
+        interactive_view(drugs, 'patch_zero_order', N_POINTS, dose_pct, f_pct, body_weight,
+                         ('cmax', 'tmax', 'onset_concentration', 'effect_end'))
+        return
+
+    # 장기 부착: tau(교체 간격)마다 새 패치, 일별 최저/최고/평균만 표시
+    long_days = int(st.sidebar.number_input("장기 부착 시뮬레이션 (일, 0 = 끄기)", min_value=0, max_value=365, value=0))
+    n_patients = int(st.sidebar.number_input("인구집단 시뮬레이션 (가상 환자 수, 0 = 끄기)",
+                                             min_value=0, max_value=100000, value=0, step=500))
+    interactive_charts = st.sidebar.toggle("인터랙티브 그래프 (브라우저에서 확대·툴팁)", value=False)
+
+    # 전체 약물 요약(해석식 지표)을 먼저, 곡선 계산·그래프는 고른 약물만
+    metrics = shared_model_metrics(drugs, 'patch_zero_order', BODY_WEIGHT, numeric=False)  # 약물별 model 컬럼(1cmt/2cmt)에 맞게
+    # 교체 간격(tau)마다 새 패치를 붙일 때의 정상상태 (해석식 + 한 구간 극값 탐색)
+    steady = patch_steady_state_table(drugs, BODY_WEIGHT, 'patch_zero_order')
+    st.dataframe(summary_frame(drugs, metrics | steady, ('cmax', 'tmax', 'onset_concentration', 'effect_end',
+                                                          'effect_duration', 'css_max', 'css_min', 'css_avg')),
+                 hide_index=True)
+    if len(numeric_rows(drugs, 'patch_zero_order')):
+        st.caption(NUMERIC_NOTE)
+    picked = pick_drugs(drugs)
+    drugs, steady = drugs.take(picked), take_metrics(steady, picked)
+    metrics = shared_model_metrics(drugs, 'patch_zero_order', BODY_WEIGHT)  # 고른 약물은 비선형 소실(ODE)까지
     st.markdown("---")
 
-    for _, row in filtered_df.iterrows():
+    # 고른 패치 약물을 한 번에 계산: (약물 수, N_POINTS)
+    with stage('simulate', model='patch_zero_order', drugs=len(drugs), points=N_POINTS):
+        times, concentrations = shared_batch(drugs, 'patch_zero_order', N_POINTS, BODY_WEIGHT)
+
+    slots, jobs = [], []
+    for i in range(len(drugs)):
+        row = drugs.row(i)
         st.subheader(f"🧪 {row['drug_name']}")
-        plot_patch_concentration(
+        slot, job = plot_patch_concentration(
             drug_name=row['drug_name'],
-            D=float(row['D']),
-            F=float(row['F']) * 0.01,
-            V_d=float(row['V_d']),
-            t_half=float(row['t_half']),
-            t_max=float(row['t_max']),
+            D=row['D'],
+            F=row['F'],
+            V_d=row['V_d'],
+            t_half=row['t_half'],
+            t_max=row['t_max'],
             body_weight=BODY_WEIGHT,
-            onset_time_hour=float(row['onset_time_hour']),
-            patch_duration_hour=float(row['patch_duration_hour']),
-            t_last = float(row['t_last'])
+            onset_time_hour=row['onset_time_hour'],
+            patch_duration_hour=row['patch_duration_hour'],
+            t_last = row['t_last'],
+            time=times[i],
+            concentration=concentrations[i],
+            metrics={key: float(v[i]) for key, v in metrics.items()},
+            tau=row['tau'],
+            steady={key: float(v[i]) for key, v in steady.items()},
+            model_fn=row_model('patch_zero_order', row, BODY_WEIGHT)
         )
+        slots.append(slot)
+        jobs.append(job)
+        if long_days > 0 and row['tau'] > 0 and row['model'] != DEFAULT_MODEL:
+            # 스트리밍은 1-컴파트먼트 투여 일정 엔진이라 위 곡선(2cmt·mm)과 맞지 않음
+            st.info(f"{row['drug_name']}: 장기 부착 시뮬레이션은 1-컴파트먼트 모델만 계산하므로 시트 model 컬럼이 2cmt·mm인 약물은 건너뜁니다.")
+        elif long_days > 0 and row['tau'] > 0:
+            horizon = long_days * 24.0
+            blocks = stream_regimen(periodic_events(row['D'], row['tau'], horizon, ROUTE_PATCH), row['F'], row['V_d'],
+                                    row['t_half'], row['t_max'], BODY_WEIGHT, horizon, LONG_DT,
+                                    patch_duration_hour=row['patch_duration_hour'], tau_off=None, scale=PATCH_SCALE)
+            summary = summarize_stream(blocks)
+            st.image(render(daily_envelope_figure, summary, f"{row['drug_name']} - {long_days}일 부착 시 일별 농도 범위"))
+        if n_patients > 0:
+            # 체중·Vd·CL·F가 환자마다 다를 때의 중앙값과 5–95% 구간
+            pop = shared_population(model_name('patch_zero_order', row['model']), times[i], row, n_patients, BODY_WEIGHT,
+                                      onset_concentration=float(metrics['onset_concentration'][i]))
+            st.image(render(population_figure, pop, row['drug_name']))
         st.markdown("---")
 
+    if interactive_charts:
+        # 브라우저에서 그리는 그래프: 곡선은 LTTB로 줄여 보내고 확대·툴팁은 재실행 없이
+        with stage('chart', charts=len(jobs)):
+            for slot, job in zip(slots, jobs):
+                slot.altair_chart(chart_for(job))
+    else:
+        # 약물별 그래프를 작업 프로세스에서 한꺼번에 그려 (캐시에 없는 것만) 자리에 채움
+        for slot, image in zip(slots, render_many(jobs)):
+            slot.image(image)
+
+    # 고른 약물의 곡선(그래프로 자르기 전 전체 격자)·지표 내려받기
+    download_section('patch_zero_order', {
+        '곡선': lambda: curves_table(drugs.drug_name, times, {'concentration': concentrations}),
+        '지표': lambda: metrics_table(drugs.drug_name, metrics | steady),
+    })
+
 if __name__ == "__main__":
     main()
+    end_page()
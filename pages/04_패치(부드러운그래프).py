@@ -1,97 +1,73 @@
 import streamlit as st
 import numpy as np
-import platform
-import math
-import matplotlib.pyplot as plt
-import matplotlib.font_manager as fm
-import os
-import matplotlib.ticker as ticker
-from functions import get_google_sheet
+from bootstrap import end_page, setup_page
+from perf import stage
+from functions import get_param_table
+from interactive import interactive_view
+from pk_metrics import patch_metrics
+from pk_models import PATCH_SCALE, clip_curve, patch_time_grid, patch_washout, shared_batch
+from population import population_figure, shared_population
+from figures import concentration_figure
+from charts import chart_for
+from selection import one_compartment_only, pick_drugs, summary_frame, take_metrics
+from export import curves_table, download_section, metrics_table
+from rendering import figure_job, render, render_many
+from regimen import ROUTE_PATCH
+from steady_state import patch_steady_state_table
+from streaming import daily_envelope_figure, periodic_events, stream_regimen, summarize_stream
+from params import DEFAULTS, PATCH_ROUTES, REQUIRED_COLUMNS
 
 BODY_WEIGHT = 70
+REQUIRED = REQUIRED_COLUMNS + ('patch_duration_hour',)  # 계산에 필요한 시트 컬럼
 
 # Streamlit 설정
-st.set_page_config(layout="centered")
-st.title("💊 패치 약물 농도 시뮬레이션")
-
-# 폰트 설정
-system = platform.system()
-if system == "Windows":
-    font_path = "C:/Windows/Fonts/malgun.ttf"
-elif system == "Darwin":
-    font_path = "/System/Library/Fonts/Supplemental/AppleGothic.ttf"
-elif system == "Linux":
-    font_path = "/usr/share/fonts/truetype/nanum/NanumGothic.ttf"
-else:
-    font_path = None
-
-if font_path and os.path.exists(font_path):
-    font_prop = fm.FontProperties(fname=font_path)
-    plt.rcParams["font.family"] = font_prop.get_name()
-    plt.rcParams["axes.unicode_minus"] = False
-else:
-    print(f"⚠️ 해당 OS({system})에서 폰트를 찾을 수 없습니다.")
+setup_page("💊 패치 약물 농도 시뮬레이션")
+
+LONG_DT = 0.1  # 장기 부착 시뮬레이션 간격 (hr)
+N_POINTS = 500  # 그래프용 점 수 (Tmax, 약효 종료 등 수치는 격자와 무관하게 계산)
+
+
+def steady_rows(tau, steady):
+    # tau마다 새 패치로 바꿔 붙일 때의 정상상태 (표 마지막 행들, tau가 없으면 빈 문자열)
+    if steady is None or not np.isfinite(steady['css_avg']):
+        return ""
+    return (f"| 반복 부착 정상상태 Css (최고 / 최저 / 평균, {tau:g} h마다 교체) | "
+            f"{steady['css_max']:.2f} / {steady['css_min']:.2f} / {steady['css_avg']:.2f} |\n"
+            f"    | 정상상태 도달 (90% / 95%) | {steady['t_ss_90']:.1f} / {steady['t_ss_95']:.1f} hr |")
+
 
 # 패치 약물 농도 계산 함수
 def plot_patch_concentration(
     drug_name, D, F, V_d, t_half, t_max,
-    body_weight, onset_time_hour, patch_duration_hour, t_last
+    body_weight, onset_time_hour, patch_duration_hour, t_last,
+    tau_off=DEFAULTS['tau_off'], time=None, concentration=None, metrics=None, tau=None, steady=None
 ):
     # --- 파라미터 ---
-    D_ng = D * 1e6
-    k = np.log(2) / t_half                   # 소실속도(1/h)
-    R0 = (D_ng * F) / patch_duration_hour    # ng/h (패치 부착 중)
     Vd_total = V_d * body_weight             # L
-    total_time = max(patch_duration_hour * 2, t_half * 7)
-
-    # 워시아웃(잔여 흡수) 시간상수: 패치 제거 후 입력이 서서히 0으로
-    tau_off = 6.0  # hours (필요하면 3~12h 사이로 튜닝)
-
-    # --- 시간축/수치적분 ---
-    time = np.linspace(0, total_time, 20000)
-    dt = time[1] - time[0]
-    concentration = np.zeros_like(time)
-
-    t_off = patch_duration_hour
-    for i in range(1, len(time)):
-        t = time[i]
-        if t <= t_off:
-            R_t = R0
-        else:
-            R_t = R0 * np.exp(-(t - t_off) / tau_off)  # 부드러운 종료(잔여 흡수 꼬리)
-
-        # 1-컴파트먼트 미분방정식 적분: dc/dt = R(t)/Vd - k*c
-        dc = (R_t / Vd_total - k * concentration[i-1]) * dt
-        concentration[i] = max(concentration[i-1] + dc, 0.0)
-
-    # --- Tmax, Cmax ---
-    t_max_index = np.argmax(concentration)
-    t_max_time = time[t_max_index]
-    c_max_value = concentration[t_max_index]
-
-    # --- onset 농도(모델 값에서 직접 샘플링) ---
-    onset_idx = np.searchsorted(time, onset_time_hour, side="left")
-    onset_idx = min(onset_idx, len(time)-1)
-    onset_concentration = concentration[onset_idx]
-
-    # --- 약효 종료 시점(피크 이후 농도가 onset 아래로 내려가는 첫 시점) ---
-    time_after_peak = time[t_max_index:]
-    conc_after_peak = concentration[t_max_index:]
-    below = np.where(conc_after_peak < onset_concentration)[0]
-    if len(below) > 0:
-        fall_index = below[0]
-        falling_time = time_after_peak[fall_index]
-    else:
-        falling_time = None
+
+    # 워시아웃(잔여 흡수) 시간상수 tau_off: 패치 제거 후 입력이 서서히 0으로 (시트의 tau_off 컬럼, 기본 6h)
+    # dc/dt = R(t)/Vd - k*c 를 해석해로 계산 (main에서 여러 약물을 한 번에 계산해 넘겨주지 않은 경우)
+    if time is None:
+        time = patch_time_grid(t_half, patch_duration_hour, N_POINTS)
+        concentration = patch_washout(time, D, F, V_d, t_half, patch_duration_hour, body_weight, tau_off)
+
+    # --- Tmax, Cmax, onset 농도, 약효 종료 시점 (구간 근 찾기, 격자와 무관) ---
+    if metrics is None:
+        metrics = patch_metrics(D, F, V_d, t_half, patch_duration_hour, body_weight, onset_time_hour, tau_off)
+    t_max_time = metrics['tmax']
+    c_max_value = metrics['cmax']
+    onset_concentration = metrics['onset_concentration']
+    falling_time = metrics['effect_end'] if np.isfinite(metrics['effect_end']) else None
 
     # --- 그래프 범위 자르기 ---
     if falling_time is not None:
         plot_end_time = falling_time + t_last
     else:
         plot_end_time = time[-1]
-    mask = time <= plot_end_time
-    time = time[mask]
-    concentration = concentration[mask]
+    time, concentration = clip_curve(
+        time, concentration, plot_end_time,
+        lambda t: patch_washout(t, D, F, V_d, t_half, patch_duration_hour, body_weight, tau_off),
+        extra_times=(patch_duration_hour, t_max_time))
 
     # --- 표 출력 ---
     st.markdown(f"""
@@ -105,54 +81,108 @@ def plot_patch_concentration(
     | Patch 부착 시간 | {patch_duration_hour} hr |
     | 약효 시작 | {onset_time_hour} hr |
     | 워시아웃 τ | {tau_off} hr |
+    {steady_rows(tau, steady)}
     """)
 
-    # --- 그래프 ---
-    fig, ax = plt.subplots(figsize=(10, 6))
-    ax.plot(time, concentration, label='혈중 농도')
-    ax.axvline(x=onset_time_hour, linestyle='--', label=f'약효 시작: {onset_time_hour:.1f}h')
-    ax.plot(t_max_time, c_max_value, 'v', label=f'Cmax: {c_max_value:.2f} ng/mL')
-    ax.axhline(y=onset_concentration, linestyle='--',
-               label=f'약효 기준 농도: {onset_concentration:.2f} ng/mL')
-    ax.axvline(x=plot_end_time, linestyle=':',
-               label=f'그래프 종료: {plot_end_time:.1f}h')
-    if falling_time is not None:
-        ax.axvline(x=falling_time, linestyle='--',
-                   label=f'약효 종료 시간: {falling_time:.1f}h')
-
-    ax.set_title(f'{drug_name} - 혈중 농도 및 약효 시간')
-    ax.set_xlabel("시간 (hours)")
-    ax.set_ylabel("혈중 농도 (ng/mL)")
-    ax.grid(True, linestyle=':')
-    ax.legend()
-    ax.set_xlim(0, plot_end_time)
-    ax.set_ylim(0)
-    st.pyplot(fig)
+    # --- 그래프: 자리만 잡아 두고 main에서 모든 약물을 한꺼번에 렌더링 (rendering.render_many) ---
+    return st.empty(), figure_job(concentration_figure, drug_name, time, concentration, onset_time_hour, t_max_time,
+                                  c_max_value, onset_concentration, plot_end_time, falling_time, colored=False)
 
 
 
 # === 메인 실행 ===
 def main():
-    df = get_google_sheet()
-    filtered_df = df[(df['Use'] == 'Y') & (df['route_of_administration'].str.contains('패치'))]
-
+    table = get_param_table()
+    drugs = table.select(contains=PATCH_ROUTES[0], required=REQUIRED)
+    for name, cols in table.problems(contains=PATCH_ROUTES[0], required=REQUIRED):
+        st.warning(f"{name}: {', '.join(cols)} 값이 비어 있거나 잘못되어 제외했습니다.")
+    drugs = one_compartment_only(drugs, "패치 페이지")
+    # 빠른 조정 모드: 용량·체중·F 슬라이더. 곡선 모양은 캐시, 배율만 다시 계산
+    st.sidebar.header("빠른 조정")
+    if st.sidebar.toggle("빠른 조정 모드 (전체 약물 그래프 한 장)", value=False):
+        dose_pct = st.sidebar.slider("용량 (%)", 25, 300, 100, 5)
+        f_pct = st.sidebar.slider("생체이용률 F (%)", 25, 200, 100, 5)
+        body_weight = st.sidebar.slider("체중 (kg)", 30, 150, BODY_WEIGHT)
+        interactive_view(drugs, 'patch_washout', N_POINTS, dose_pct, f_pct, body_weight,
+                         ('cmax', 'tmax', 'onset_concentration', 'effect_end'))
+        return
+    interactive_charts = st.sidebar.toggle("인터랙티브 그래프 (브라우저에서 확대·툴팁)", value=False)
+
+    # 장기 부착: tau(교체 간격)마다 새 패치, 일별 최저/최고/평균만 표시
+    long_days = int(st.sidebar.number_input("장기 부착 시뮬레이션 (일, 0 = 끄기)", min_value=0, max_value=365, value=0))
+    n_patients = int(st.sidebar.number_input("인구집단 시뮬레이션 (가상 환자 수, 0 = 끄기)",
+                                             min_value=0, max_value=100000, value=0, step=500))
+
+    # 전체 약물 요약(해석식 지표)을 먼저, 곡선 계산·그래프는 고른 약물만
+    metrics = patch_metrics(drugs.D, drugs.F, drugs.V_d, drugs.t_half, drugs.patch_duration_hour, BODY_WEIGHT,
+                            drugs.onset_time_hour, drugs.tau_off)
+    # 교체 간격(tau)마다 새 패치를 붙일 때의 정상상태 (해석식 + 한 구간 극값 탐색)
+    steady = patch_steady_state_table(drugs, BODY_WEIGHT, 'patch_washout')
+    st.dataframe(summary_frame(drugs, metrics | steady, ('cmax', 'tmax', 'onset_concentration', 'effect_end',
+                                                          'effect_duration', 'css_max', 'css_min', 'css_avg')),
+                 hide_index=True)
+    picked = pick_drugs(drugs)
+    drugs, metrics, steady = drugs.take(picked), take_metrics(metrics, picked), take_metrics(steady, picked)
     st.markdown("---")
 
-    for _, row in filtered_df.iterrows():
+    # 고른 패치 약물을 한 번에 계산: (약물 수, N_POINTS)
+    with stage('simulate', model='patch_washout', drugs=len(drugs), points=N_POINTS):
+        times, concentrations = shared_batch(drugs, 'patch_washout', N_POINTS, BODY_WEIGHT)
+
+    slots, jobs = [], []
+    for i in range(len(drugs)):
+        row = drugs.row(i)
         st.subheader(f"🧪 {row['drug_name']}")
-        plot_patch_concentration(
+        slot, job = plot_patch_concentration(
             drug_name=row['drug_name'],
-            D=float(row['D']),
-            F=float(row['F']) * 0.01,
-            V_d=float(row['V_d']),
-            t_half=float(row['t_half']),
-            t_max=float(row['t_max']),
+            D=row['D'],
+            F=row['F'],
+            V_d=row['V_d'],
+            t_half=row['t_half'],
+            t_max=row['t_max'],
             body_weight=BODY_WEIGHT,
-            onset_time_hour=float(row['onset_time_hour']),
-            patch_duration_hour=float(row['patch_duration_hour']),
-            t_last = float(row['t_last'])
+            onset_time_hour=row['onset_time_hour'],
+            patch_duration_hour=row['patch_duration_hour'],
+            t_last = row['t_last'],
+            tau_off=row['tau_off'],
+            time=times[i],
+            concentration=concentrations[i],
+            metrics={key: float(v[i]) for key, v in metrics.items()},
+            tau=row['tau'],
+            steady={key: float(v[i]) for key, v in steady.items()}
         )
+        slots.append(slot)
+        jobs.append(job)
+        if long_days > 0 and row['tau'] > 0:
+            horizon = long_days * 24.0
+            blocks = stream_regimen(periodic_events(row['D'], row['tau'], horizon, ROUTE_PATCH), row['F'], row['V_d'],
+                                    row['t_half'], row['t_max'], BODY_WEIGHT, horizon, LONG_DT,
+                                    patch_duration_hour=row['patch_duration_hour'], tau_off=row['tau_off'], scale=PATCH_SCALE)
+            summary = summarize_stream(blocks)
+            st.image(render(daily_envelope_figure, summary, f"{row['drug_name']} - {long_days}일 부착 시 일별 농도 범위"))
+        if n_patients > 0:
+            # 체중·Vd·CL·F가 환자마다 다를 때의 중앙값과 5–95% 구간
+            pop = shared_population('patch_washout', times[i], row, n_patients, BODY_WEIGHT,
+                                      onset_concentration=float(metrics['onset_concentration'][i]))
+            st.image(render(population_figure, pop, row['drug_name']))
         st.markdown("---")
 
+    if interactive_charts:
+        # 브라우저에서 그리는 그래프: 곡선은 LTTB로 줄여 보내고 확대·툴팁은 재실행 없이
+        with stage('chart', charts=len(jobs)):
+            for slot, job in zip(slots, jobs):
+                slot.altair_chart(chart_for(job))
+    else:
+        # 약물별 그래프를 작업 프로세스에서 한꺼번에 그려 (캐시에 없는 것만) 자리에 채움
+        for slot, image in zip(slots, render_many(jobs)):
+            slot.image(image)
+
+    # 고른 약물의 곡선(그래프로 자르기 전 전체 격자)·지표 내려받기
+    download_section('patch_washout', {
+        '곡선': lambda: curves_table(drugs.drug_name, times, {'concentration': concentrations}),
+        '지표': lambda: metrics_table(drugs.drug_name, metrics | steady),
+    })
+
 if __name__ == "__main__":
     main()
+    end_page()
@@ -0,0 +1,149 @@
+import streamlit as st
+import numpy as np
+import pandas as pd
+from bootstrap import end_page, setup_page
+from perf import stage
+from functions import get_param_table
+from rotation import ORAL_MODEL, leg_events, rotation_figure, simulate_rotation
+from rendering import render
+from export import curves_table, download_section, metrics_table
+from params import DEFAULT_MODEL, ORAL_ROUTES, PATCH_ROUTES, REQUIRED_COLUMNS
+
+BODY_WEIGHT = 70
+ORAL_REQUIRED = REQUIRED_COLUMNS + ('tau',)  # 계산에 필요한 시트 컬럼
+PATCH_REQUIRED = REQUIRED_COLUMNS + ('tau', 'patch_duration_hour')
+
+# Streamlit 설정
+setup_page("🔄 약물 전환(로테이션) 시뮬레이션")
+
+DT = 0.1  # 시간 간격 (hr)
+
+
+def candidate_drugs(table, washout):
+    # 전환에 쓸 수 있는 경구·패치 약물: 이름 → (시트 행, 모델)
+    patch_model = 'patch_washout' if washout else 'patch_zero_order'
+    out = {}
+    for drugs, model in ((table.select(routes=ORAL_ROUTES, required=ORAL_REQUIRED), ORAL_MODEL),
+                         (table.select(contains=PATCH_ROUTES[0], required=PATCH_REQUIRED), patch_model)):
+        for i in range(len(drugs)):
+            row = drugs.row(i)
+            out[row['drug_name']] = (row, model)
+    return out
+
+
+def _parse_steps(text):
+    # "48:5, 60:2.5" → ([(48.0, 5.0), (60.0, 2.5)], 버린 항목). 시각·용량은 0 이상의 유한한 숫자만
+    kept, dropped = [], []
+    for part in text.replace(';', ',').split(','):
+        part = part.strip()
+        if not part:
+            continue
+        try:
+            hour, dose = (float(x) for x in part.split(':'))
+        except ValueError:
+            hour = dose = np.nan
+        if np.isfinite(hour) and np.isfinite(dose) and hour >= 0 and dose >= 0:
+            kept.append((hour, dose))
+        else:
+            dropped.append(part)
+    return kept, dropped
+
+
+def step_input(label, placeholder):
+    # 사이드바 용량 단계 입력 (비우면 단계 없이 한 용량). 잘못된 항목은 경고를 띄우고 빼고 씀
+    steps, dropped = _parse_steps(st.sidebar.text_input(label, "", placeholder=placeholder))
+    if dropped:
+        st.warning(f"{label}: {', '.join(dropped)} — '시각 h:용량 mg' 형식의 0 이상 숫자만 쓸 수 있어 제외했습니다.")
+    return steps
+
+
+def steps_text(steps):
+    return ', '.join(f"{hour:g} h부터 {dose:g} mg" for hour, dose in sorted(steps)) or "없음"
+
+
+def runs_frame(runs):
+    return pd.DataFrame({'시작 (h)': [a for a, _ in runs], '끝 (h)': [b for _, b in runs],
+                         '길이 (h)': [b - a for a, b in runs]}).round(1)
+
+
+# === 메인 실행 ===
+def main():
+    table = get_param_table()
+    washout = st.sidebar.toggle("패치 제거 후 워시아웃 적용", value=True)
+    drugs = candidate_drugs(table, washout)
+    names = list(drugs)
+    if len(names) < 2:
+        st.warning("전환할 약물이 두 개 이상 필요합니다.")
+        return
+
+    st.sidebar.header("전환 설정")
+    old_name = st.sidebar.selectbox("이전 약물 (중단)", names, index=len(names) - 1)
+    new_name = st.sidebar.selectbox("새 약물 (시작)", names, index=0)
+    old_row, old_model = drugs[old_name]
+    new_row, new_model = drugs[new_name]
+    switch_time = st.sidebar.slider("전환 시각 (이전 약물 중단, h)", 0.0, 240.0, 72.0, 1.0)
+    lead = st.sidebar.slider("새 약물 시작 (전환 시각 기준, h)", -48.0, 48.0, 0.0, 1.0)
+    new_dose = st.sidebar.number_input("새 약물 용량 (mg)", min_value=0.0, value=new_row['D'])
+    old_factor = st.sidebar.number_input("이전 약물 등가 가중치", min_value=0.0, value=old_row['equianalgesic_factor'])
+    new_factor = st.sidebar.number_input("새 약물 등가 가중치", min_value=0.0, value=new_row['equianalgesic_factor'])
+    # 교차 감량: 이전 약물은 전환 시각 전에 단계적으로 줄이고, 새 약물은 단계적으로 늘림 (각 시각부터 그 용량, 0 = 중단)
+    st.sidebar.header("교차 감량 단계")
+    old_steps = step_input("이전 약물 감량 (시각 h:용량 mg)", "예: 48:5, 60:2.5")
+    new_steps = step_input("새 약물 증량 (시각 h:용량 mg)", "예: 60:5, 84:10")
+
+    # 이전 약물은 전환 시각까지, 새 약물은 (전환 + lead)부터 끝까지
+    new_start = max(switch_time + lead, 0.0)
+    horizon = new_start + max(72.0, 5.0 * max(old_row['t_half'], new_row['t_half']))
+    time = np.arange(0.0, horizon + DT, DT)
+    legs = [
+        {'row': old_row, 'model': old_model, 'factor': old_factor,
+         'events': leg_events(old_row, old_model, 0.0, switch_time, steps=old_steps)},
+        {'row': new_row, 'model': new_model, 'factor': new_factor,
+         'events': leg_events(new_row, new_model, new_start, horizon, dose=new_dose, steps=new_steps)},
+    ]
+    with stage('simulate', model='rotation', points=len(time)):
+        result = simulate_rotation(time, legs, BODY_WEIGHT)
+
+    st.markdown(f"""
+    | 항목 | 이전 약물 | 새 약물 |
+    |------|------|------|
+    | 약물 | {old_name} | {new_name} |
+    | 투여 | 0 ~ {switch_time:.0f} h, {old_row['tau']:.0f} h 간격, {old_row['D']} mg | {new_start:.0f} h부터, {new_row['tau']:.0f} h 간격, {new_dose} mg |
+    | 용량 단계 | {steps_text(old_steps)} | {steps_text(new_steps)} |
+    | 약효 기준 농도 | {result['onset_concentration'][0]:.2f} | {result['onset_concentration'][1]:.2f} |
+    | 등가 가중치 | {old_factor} | {new_factor} |
+    """)
+    names = [old_name, new_name]
+    other = [name for name, row in zip(names, (old_row, new_row)) if row['model'] != DEFAULT_MODEL]
+    if other:
+        st.info(f"{', '.join(other)}: 약물 전환은 1-컴파트먼트 모델로 계산합니다 (시트 model 컬럼의 2cmt·mm 미반영).")
+    st.image(render(rotation_figure, result, names, switch_time=switch_time))
+
+    missing = [name for name, ok in zip(names, result['valid']) if not ok]
+    if missing:
+        st.info(f"약효 시작 시간(onset_time_hour)이 없어 {', '.join(missing)}의 약효 기준 농도를 정할 수 없습니다. "
+                "효과 공백·과다 중첩은 계산하지 않습니다.")
+    else:
+        st.subheader("효과 공백 (합산 효과 < 기준)")
+        if result['gaps']:
+            st.dataframe(runs_frame(result['gaps']), hide_index=True)
+        else:
+            st.success("공백 없음")
+        st.subheader("과다 중첩 (두 약물이 함께 작용하며 합산 효과 > 기준의 2배)")
+        if result['overlaps']:
+            st.dataframe(runs_frame(result['overlaps']), hide_index=True)
+        else:
+            st.success("과다 중첩 없음")
+
+    # 두 약물의 농도·효과 곡선, 합산 효과, 약효 기준 농도 내려받기
+    download_section('rotation', {
+        '곡선': lambda: curves_table(names, time, {'concentration': result['concentration'], 'effect': result['effect']}),
+        '합산 효과': lambda: pd.DataFrame({'time_hour': time, 'combined': result['combined']}),
+        '지표': lambda: metrics_table(names, {'onset_concentration': result['onset_concentration'],
+                                             'equianalgesic_factor': [old_factor, new_factor]}),
+    })
+
+
+if __name__ == "__main__":
+    main()
+    end_page()
@@ -0,0 +1,105 @@
+import streamlit as st
+import numpy as np
+import pandas as pd
+import os
+from bootstrap import end_page, setup_page
+from perf import stage
+from functions import base_dir, get_param_table
+from regimen import ROUTE_ORAL, ROUTE_PATCH
+from tdm import fit_patients, fitted_curve, tdm_figure
+from rendering import render
+from export import download_section
+from params import ORAL_ROUTES, PATCH_ROUTES, REQUIRED_COLUMNS
+
+BODY_WEIGHT = 70
+PATCH_REQUIRED = REQUIRED_COLUMNS + ('patch_duration_hour',)  # 계산에 필요한 시트 컬럼
+SAMPLE_FILE = os.path.join(base_dir, 'data', 'sample_tdm.csv')
+SAMPLE_DRUG = '옥시코돈 속방정 10mg'
+
+# Streamlit 설정
+setup_page("🩸 측정 농도(TDM)로 환자별 파라미터 추정")
+
+DT = 0.1  # 그래프 시간 간격 (hr)
+
+
+def candidate_drugs(table):
+    # 추정에 쓸 수 있는 경구·패치 약물: 이름 → (시트 행, 경로)
+    out = {}
+    for drugs, route in ((table.select(routes=ORAL_ROUTES), ROUTE_ORAL),
+                         (table.select(contains=PATCH_ROUTES[0], required=PATCH_REQUIRED), ROUTE_PATCH)):
+        for i in range(len(drugs)):
+            row = drugs.row(i)
+            out[row['drug_name']] = (row, route)
+    return out
+
+
+def load_records(uploaded):
+    # 한 파일에 관측(concentration)과 투여(dose) 행을 함께: patient_id, time, concentration, dose (+ body_weight)
+    df = pd.read_csv(uploaded if uploaded is not None else SAMPLE_FILE)
+    for col in ('time', 'concentration', 'dose', 'body_weight'):
+        if col in df:
+            df[col] = pd.to_numeric(df[col], errors='coerce')
+    df['patient_id'] = df['patient_id'].astype(str)
+    observations = df[df['concentration'].notna()] if 'concentration' in df else df.iloc[:0]
+    doses = df[df['dose'].notna()] if 'dose' in df else df.iloc[:0]
+    return observations, doses
+
+
+# === 메인 실행 ===
+def main():
+    drugs = candidate_drugs(get_param_table())
+    names = list(drugs)
+    if not names:
+        st.warning("추정할 약물이 없습니다.")
+        return
+
+    st.sidebar.header("TDM 설정")
+    name = st.sidebar.selectbox("약물", names, index=names.index(SAMPLE_DRUG) if SAMPLE_DRUG in names else 0)
+    row, route = drugs[name]
+    uploaded = st.sidebar.file_uploader("측정 농도 CSV (patient_id, time, concentration, dose, body_weight)",
+                                        type='csv')
+    use_prior = st.sidebar.toggle("시트 값을 사전분포로 사용 (측정값이 적을 때 권장)", value=True)
+    if uploaded is None:
+        st.info(f"업로드한 파일이 없어 예시 데이터({SAMPLE_DRUG}, 6시간마다 10mg)를 사용합니다.")
+
+    observations, doses = load_records(uploaded)
+    if observations.empty:
+        st.warning("측정 농도 행이 없습니다.")
+        return
+    with stage('fit', observations=len(observations)) as s:
+        fit = fit_patients(observations, doses, row, BODY_WEIGHT, route=route,
+                           **({} if use_prior else {'prior_sd': None}))
+        s['patients'] = len(fit)
+    if not fit['converged'].all():
+        st.warning(f"{(~fit['converged']).sum()}명은 추정이 수렴하지 않았습니다.")
+
+    columns = {'patient_id': '환자', 'n_obs': '측정 수', 'body_weight': '체중 (kg)', 't_half': 't½ (h)',
+               't_max': 'Tmax (h)', 'V_d': 'Vd (L/kg)', 'k_rse': 'k RSE (%)', 'ka_rse': 'ka RSE (%)',
+               'V_d_rse': 'Vd RSE (%)'}
+    if route != ROUTE_ORAL:  # 패치는 Tmax를 추정하지 않음
+        del columns['t_max'], columns['ka_rse']
+    st.markdown(f"시트 전형값: t½ {row['t_half']} h, Tmax {row['t_max']} h, Vd {row['V_d']} L/kg")
+    st.dataframe(fit[list(columns)].rename(columns=columns).round(2), hide_index=True)
+
+    patient = st.selectbox("환자", fit['patient_id'])
+    fit_row = fit.set_index('patient_id').loc[patient].to_dict()
+    obs = observations[observations['patient_id'] == patient]
+    dose = doses[doses['patient_id'] == patient]
+    horizon = max(obs['time'].max(), dose['time'].max() if len(dose) else 0.0) + 2 * fit_row['t_half']
+    time = np.arange(0.0, horizon + DT, DT)
+    bw = fit_row['body_weight']
+    population = fitted_curve(time, dose, row, row, bw, route=route)
+    fitted = fitted_curve(time, dose, row, fit_row, bw, route=route)
+    st.image(render(tdm_figure, time, population, fitted, obs['time'], obs['concentration'], f"{name} - {patient}"))
+
+    # 전체 환자의 추정 결과와 고른 환자의 곡선(시트 전형값 / 추정값) 내려받기
+    download_section('tdm', {
+        '추정': lambda: fit,
+        '곡선': lambda: pd.DataFrame({'patient_id': patient, 'time_hour': time, 'population': population,
+                                      'fitted': fitted}),
+    })
+
+
+if __name__ == "__main__":
+    main()
+    end_page()
@@ -0,0 +1,176 @@
+import hashlib
+
+import numpy as np
+import pandas as pd
+
+# 시트의 route_of_administration 값
+ORAL_ROUTES = ('경구일반', '경구서방')
+PATCH_ROUTES = ('패치',)
+
+# 숫자형 파라미터 컬럼 (시트에서는 모두 문자열)
+FLOAT_COLUMNS = (
+    'D', 'F', 'V_d', 't_half', 't_max', 'onset_time_hour', 't_last', 'tau', 'patch_duration_hour',
+    'tau_off', 'equianalgesic_factor', 'k12', 'k21', 'Vmax', 'Km',
+)
+PERCENT_COLUMNS = ('F',)  # 시트에는 % 단위로 저장됨 → 0~1 비율로 변환
+
+# 시트에 컬럼이 없거나 칸이 비어 있을 때 쓰는 기본값
+DEFAULTS = {
+    'tau_off': 6.0,  # 패치 제거 후 워시아웃 시간상수 (hr)
+    'equianalgesic_factor': 1.0,  # 약물 전환 시 효과 가중치 (약효 기준 농도 대비 상대 효력)
+}
+
+# 모든 모델에 공통으로 필요한 컬럼과 투여경로별 추가 컬럼
+REQUIRED_COLUMNS = ('D', 'F', 'V_d', 't_half', 't_max', 'onset_time_hour', 't_last')
+POSITIVE_COLUMNS = ('D', 'F', 'V_d', 't_half', 't_max', 'tau', 'patch_duration_hour', 'tau_off',
+                    'k12', 'k21', 'Vmax', 'Km')
+
+# 시트의 model 컬럼: 비어 있으면 1-컴파트먼트. 모델별로 추가로 필요한 컬럼
+DEFAULT_MODEL = '1cmt'
+MODEL_REQUIRED = {
+    '1cmt': (),
+    '2cmt': ('k12', 'k21'),  # 구획 간 이동 속도상수 (1/hr), V_d는 중심구획, t_half는 말기 반감기
+    'mm': ('Vmax', 'Km'),    # Michaelis–Menten 소실: Vmax (mg/hr/kg), Km (mg/L)
+}
+
+
+def _parse_float(values):
+    # 빈 칸, 공백, 쉼표 천단위 구분자 처리. 숫자가 아니면 NaN
+    s = pd.Series(values, dtype=object).astype(str).str.strip().str.replace(',', '', regex=False)
+    return pd.to_numeric(s, errors='coerce').to_numpy(dtype=np.float64)
+
+
+class ParamTable:
+    # 약물 파라미터를 한 번만 파싱해 둔 컬럼형 테이블.
+    # 파라미터는 컬럼별 float64 배열, 투여경로는 범주형 코드(route_codes + routes), Use는 bool 배열.
+    # 배열은 읽기 전용이라 여러 세션이 같은 테이블을 공유해도 안전하다.
+
+    def __init__(self, drug_name, route_codes, routes, use, columns, kinds=None):
+        self.drug_name = drug_name
+        self.route_codes = route_codes
+        self.routes = tuple(routes)
+        self.use = use
+        self.columns = columns
+        self.kinds = np.full(len(drug_name), DEFAULT_MODEL, dtype=object) if kinds is None else kinds  # model 컬럼
+        for arr in (drug_name, route_codes, use, self.kinds, *columns.values()):
+            arr.setflags(write=False)
+
+    @classmethod
+    def from_frame(cls, df):
+        n = len(df)
+        drug_name = df['drug_name'].astype(str).to_numpy(dtype=object) if 'drug_name' in df else np.full(n, '', dtype=object)
+        route = df['route_of_administration'].astype(str).str.strip() if 'route_of_administration' in df \
+            else pd.Series([''] * n)
+        cat = pd.Categorical(route)
+        use = (df['Use'].astype(str).str.strip().str.upper() == 'Y').to_numpy() if 'Use' in df \
+            else np.ones(n, dtype=bool)
+        kinds = None
+        if 'model' in df:
+            kinds = df['model'].fillna('').astype(str).str.strip().str.lower()
+            kinds = kinds.where(~kinds.isin(('', 'nan', 'none')), DEFAULT_MODEL).to_numpy(dtype=object)
+
+        columns = {}
+        for col in FLOAT_COLUMNS:
+            arr = _parse_float(df[col]) if col in df else np.full(n, np.nan)
+            if col in PERCENT_COLUMNS:
+                arr = arr * 0.01
+            if col in DEFAULTS:
+                arr = np.where(np.isnan(arr), DEFAULTS[col], arr)
+            columns[col] = arr
+        return cls(drug_name, cat.codes.astype(np.int16), cat.categories, use, columns, kinds)
+
+    def __len__(self):
+        return len(self.drug_name)
+
+    def content_key(self):
+        # 테이블 내용의 해시 (compute_cache 키). 배열이 읽기 전용이라 한 번만 계산
+        key = self.__dict__.get('_content_key')
+        if key is None:
+            h = hashlib.sha1(repr((self.routes, self.drug_name.tolist(), self.kinds.tolist())).encode())
+            for arr in (self.route_codes, self.use, *self.columns.values()):
+                h.update(np.ascontiguousarray(arr).tobytes())
+            h.update(repr(tuple(self.columns)).encode())
+            key = self._content_key = h.hexdigest()
+        return key
+
+    def __getattr__(self, name):
+        # table.D, table.t_half ... 처럼 컬럼 배열에 바로 접근
+        columns = self.__dict__.get('columns')
+        if columns is not None and name in columns:
+            return columns[name]
+        raise AttributeError(name)
+
+    @property
+    def route(self):
+        names = np.array(self.routes + ('',), dtype=object)
+        return names[self.route_codes]  # 코드 -1(결측)은 ''로
+
+    def route_mask(self, routes=None, contains=None):
+        # routes: 정확히 일치하는 경로들, contains: 부분 문자열 (예: '패치')
+        if routes is None and contains is None:
+            return np.ones(len(self), dtype=bool)
+        wanted = [i for i, r in enumerate(self.routes)
+                  if (routes is not None and r in routes) or (contains is not None and contains in r)]
+        return np.isin(self.route_codes, wanted)
+
+    def _bad_value(self, col):
+        arr = self.columns[col]
+        bad = ~np.isfinite(arr)
+        if col in POSITIVE_COLUMNS:
+            bad |= ~(arr > 0)
+        return bad
+
+    def invalid_mask(self, required=REQUIRED_COLUMNS):
+        # required 컬럼 + 약물별 model에 필요한 컬럼 중 하나라도 비었거나 잘못된 행. 알 수 없는 model도 제외
+        bad = np.zeros(len(self), dtype=bool)
+        for col in required:
+            bad |= self._bad_value(col)
+        bad |= ~np.isin(self.kinds, list(MODEL_REQUIRED))
+        for kind, cols in MODEL_REQUIRED.items():
+            rows = self.kinds == kind
+            for col in cols:
+                bad |= rows & self._bad_value(col)
+        return bad
+
+    def take(self, index):
+        index = np.asarray(index)
+        if index.dtype == bool:
+            index = np.flatnonzero(index)
+        columns = {k: v[index] for k, v in self.columns.items()}
+        return ParamTable(self.drug_name[index], self.route_codes[index], self.routes, self.use[index], columns,
+                          self.kinds[index])
+
+    def select(self, routes=None, contains=None, use_only=True, required=REQUIRED_COLUMNS):
+        # 투여경로로 자르고, 계산에 필요한 값이 비어 있거나 잘못된 행은 제외
+        mask = self.route_mask(routes, contains)
+        if use_only:
+            mask &= self.use
+        return self.take(mask & ~self.invalid_mask(required))
+
+    def problems(self, routes=None, contains=None, required=REQUIRED_COLUMNS):
+        # 사용(Use == 'Y')으로 표시됐지만 값이 잘못돼 계산에서 빠지는 약물 이름과 컬럼
+        mask = self.route_mask(routes, contains) & self.use
+        out = []
+        for i in np.flatnonzero(mask):
+            kind = self.kinds[i]
+            cols = [c for c in required + MODEL_REQUIRED.get(kind, ())
+                    if not np.isfinite(self.columns[c][i]) or (c in POSITIVE_COLUMNS and not self.columns[c][i] > 0)]
+            if kind not in MODEL_REQUIRED:
+                cols.append('model')
+            if cols:
+                out.append((self.drug_name[i], cols))
+        return out
+
+    def row(self, i):
+        # i번째 약물의 파라미터를 파이썬 float로
+        out = {'drug_name': self.drug_name[i], 'route_of_administration': self.route[i], 'model': self.kinds[i]}
+        for k, v in self.columns.items():
+            out[k] = float(v[i])
+        return out
+
+    def to_frame(self):
+        df = pd.DataFrame({'drug_name': self.drug_name, 'route_of_administration': self.route,
+                           'Use': np.where(self.use, 'Y', 'N'), 'model': self.kinds})
+        for k, v in self.columns.items():
+            df[k] = v
+        return df
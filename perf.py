@@ -0,0 +1,100 @@
+import contextvars
+import json
+import logging
+import os
+import threading
+import time
+from collections import defaultdict, deque
+from contextlib import contextmanager
+
+import numpy as np
+
+# 단계별 시간 측정: 시트 인증·다운로드·파싱, 페이지의 모델 계산, 그림 렌더링.
+# - stage(이름, **필드)로 감싼 구간의 벽시계 시간(ms)과 점 수·바이트 수 등을 기록
+# - 페이지 실행(start_page ~ finish_page) 안이면 그 실행에 모았다가 한 줄 JSON으로, 밖이면(백그라운드 갱신 등) 바로 JSON으로 남김
+# - 페이지별 최근 LATENCY_WINDOW번의 전체 시간으로 p50/p95 (사이드바 디버그 패널)
+# JSON 로그는 'abcgraph.perf' 로거로 나감. ABCGRAPH_PERF_LOG = 파일 경로 | '-'(stderr) 이면 여기서 핸들러를 붙임
+
+PERF_LOG_ENV = "ABCGRAPH_PERF_LOG"
+LATENCY_WINDOW = 500  # 페이지별로 보관하는 최근 실행 수
+
+logger = logging.getLogger('abcgraph.perf')
+_run = contextvars.ContextVar('perf_run', default=None)  # Streamlit 세션마다 스크립트 스레드가 달라 실행끼리 섞이지 않음
+_latencies = defaultdict(lambda: deque(maxlen=LATENCY_WINDOW))  # 페이지 → 최근 전체 시간 (ms)
+_latency_lock = threading.Lock()
+
+
+def _configure_logger():
+    target = os.environ.get(PERF_LOG_ENV)
+    if not target or logger.handlers:
+        return
+    handler = logging.StreamHandler() if target == '-' else logging.FileHandler(target, encoding='utf-8')
+    handler.setFormatter(logging.Formatter('%(message)s'))
+    logger.addHandler(handler)
+    logger.setLevel(logging.INFO)
+
+
+_configure_logger()
+
+
+def _emit(record):
+    if logger.isEnabledFor(logging.INFO):
+        logger.info(json.dumps(record, ensure_ascii=False, default=float))
+
+
+def start_page(page):
+    # 페이지 스크립트 실행 시작 (재실행마다 새로)
+    _run.set({'page': page, 'started': time.time(), 'start': time.perf_counter(), 'stages': []})
+
+
+@contextmanager
+def stage(name, **fields):
+    # with stage('simulate', drugs=3, points=300) as s: ...; s['bytes'] = ... (필드는 구간 안에서 더해도 됨)
+    record = {'stage': name, **fields}
+    start = time.perf_counter()
+    try:
+        yield record
+    finally:
+        record['ms'] = round((time.perf_counter() - start) * 1e3, 3)
+        run = _run.get()
+        if run is not None:
+            run['stages'].append(record)
+        else:
+            _emit({'event': 'stage', 'ts': time.time(), **record})
+
+
+def finish_page():
+    # 페이지 실행 끝: 전체 시간을 p50/p95용으로 보관하고 JSON 한 줄로 남김. 반환: 이번 실행 기록
+    run = _run.get()
+    if run is None:
+        return None
+    _run.set(None)
+    total = round((time.perf_counter() - run.pop('start')) * 1e3, 3)
+    run['total_ms'] = total
+    with _latency_lock:
+        _latencies[run['page']].append(total)
+    _emit({'event': 'page', 'ts': run['started'], 'page': run['page'], 'total_ms': total, 'stages': run['stages']})
+    return run
+
+
+def latency_summary():
+    # 페이지 → {'n', 'p50_ms', 'p95_ms', 'max_ms'} (이 프로세스의 최근 실행)
+    with _latency_lock:
+        samples = {page: np.array(values) for page, values in _latencies.items() if values}
+    return {page: {'n': len(v), 'p50_ms': float(np.percentile(v, 50)), 'p95_ms': float(np.percentile(v, 95)),
+                   'max_ms': float(v.max())} for page, v in samples.items()}
+
+
+def debug_panel(run, startup=None):
+    # 사이드바 디버그 패널: 이번 실행의 단계별 시간, 페이지별 p50/p95, 첫 import 시간
+    import pandas as pd
+    import streamlit as st
+
+    with st.sidebar.expander("성능 측정", expanded=True):
+        st.caption(f"이번 실행: {run['total_ms']:.0f} ms")
+        st.dataframe(pd.DataFrame(run['stages']), hide_index=True)
+        summary = latency_summary()
+        st.dataframe(pd.DataFrame.from_dict(summary, orient='index').round(1))
+        if startup:
+            st.dataframe(pd.DataFrame({'항목': list(startup), 'ms': [v * 1e3 for v in startup.values()]}).round(1),
+                         hide_index=True)
@@ -0,0 +1,358 @@
+import numpy as np
+
+from compute_cache import shared
+from pk_models import (
+    LN2,
+    MODELS,
+    ORAL_SCALE,
+    PATCH_SCALE,
+    _exp_diff_slope,
+    _two_compartment_coefficients,
+    model_groups,
+    oral_2cmt,
+    oral_multi_dose,
+    oral_single,
+    patch_2cmt,
+    patch_washout,
+    patch_zero_order,
+    rate_constants,
+    time_grid,
+    two_compartment_rates,
+)
+
+# 격자 해상도와 무관한 PK 지표 (해석식이 있으면 해석식, 없으면 구간 안에서 벡터화된 이분법)
+# 모든 함수는 약물별 파라미터 배열을 받아 약물별 배열을 돌려준다 (스칼라를 넣으면 스칼라).
+
+
+def find_root_bracketed(f, lo, hi, tol=1e-9, max_iter=200):
+    # f(lo)와 f(hi)의 부호가 다른 구간에서 f(t) = 0 인 t를 약물별로 동시에 찾음 (이분법)
+    # 부호가 같은 구간은 NaN
+    lo = np.array(lo, dtype=np.float64)
+    hi = np.array(hi, dtype=np.float64)
+    f_lo = f(lo)
+    valid = np.sign(f_lo) != np.sign(f(hi))
+    for _ in range(max_iter):
+        if np.all(hi - lo <= tol * np.maximum(1.0, np.abs(hi))):
+            break
+        mid = 0.5 * (lo + hi)
+        f_mid = f(mid)
+        left = np.sign(f_mid) == np.sign(f_lo)
+        lo = np.where(left, mid, lo)
+        f_lo = np.where(left, f_mid, f_lo)
+        hi = np.where(left, hi, mid)
+    return np.where(valid, 0.5 * (lo + hi), np.nan)
+
+
+def _bracket_above(f, start, step):
+    # start 이후 f가 0 아래로 내려가는 구간 [lo, hi]를 step을 두 배씩 늘려가며 찾음 (f는 start 이후 감소)
+    lo = np.array(start, dtype=np.float64)
+    hi = lo + step
+    for _ in range(60):
+        above = f(hi) > 0
+        if not np.any(above):
+            break
+        lo = np.where(above, hi, lo)
+        step = np.where(above, step * 2.0, step)
+        hi = np.where(above, hi + step, hi)
+    return lo, hi
+
+
+def _column_fn(model, *params, **kw):
+    # pk_models 커널을 "약물별 시점 하나" 평가 함수로: t (n,) → C (n,)
+    def f(t):
+        return model(np.asarray(t)[..., None], *params, **kw)[..., 0]
+    return f
+
+
+def _finish(out, scalar):
+    if scalar:
+        return {k: float(np.asarray(v).reshape(-1)[0]) for k, v in out.items()}
+    return out
+
+
+def _is_scalar(*xs):
+    return all(np.ndim(x) == 0 for x in xs)
+
+
+def _effect_window(conc, t_peak, onset_time_hour, onset_concentration, step):
+    # 약효 시작은 onset_time_hour, 종료는 피크 이후 농도가 onset 농도 아래로 떨어지는 시점
+    effect_end = np.full(np.shape(t_peak), np.nan)
+    positive = onset_concentration > 0
+    if np.any(positive):
+        thr = np.where(positive, onset_concentration, np.inf)
+
+        def g(t):
+            return conc(t) - thr
+
+        lo, hi = _bracket_above(g, t_peak, step)
+        effect_end = np.where(positive, find_root_bracketed(g, lo, hi), np.nan)
+    return np.broadcast_to(onset_time_hour, np.shape(t_peak)).astype(float), effect_end
+
+
+# === 경구 단일 투여 ===
+def oral_single_metrics(D, F, V_d, t_half, t_max, body_weight, onset_time_hour, t_end=None):
+    # tmax = ln(ka/k)/(ka-k), cmax = C(tmax)
+    # AUC는 질량 보존식 ∫C = (흡수된 양/V - C(t)) / k 로 정확히 계산
+    scalar = _is_scalar(D, F, V_d, t_half, t_max, onset_time_hour)
+    D, F, V_d, t_half, t_max, onset_time_hour = np.broadcast_arrays(
+        *(np.atleast_1d(np.asarray(x, dtype=np.float64)) for x in (D, F, V_d, t_half, t_max, onset_time_hour)))
+    k, ka = rate_constants(t_half, t_max)
+    Vd_total = V_d * body_weight
+    conc = _column_fn(oral_single, D, F, V_d, t_half, t_max, body_weight)
+
+    tmax = np.log(ka / k) / (ka - k)
+    cmax = conc(tmax)
+    onset_concentration = conc(onset_time_hour)
+    effect_start, effect_end = _effect_window(conc, tmax, onset_time_hour, onset_concentration, t_half)
+
+    auc_inf = F * D / (k * Vd_total) * ORAL_SCALE
+    out = {
+        'tmax': tmax, 'cmax': cmax, 'onset_concentration': onset_concentration,
+        'effect_start': effect_start, 'effect_end': effect_end,
+        'effect_duration': effect_end - effect_start, 'auc_0_inf': auc_inf,
+    }
+    if t_end is not None:
+        t_end = np.broadcast_to(np.asarray(t_end, dtype=np.float64), D.shape)
+        absorbed = F * D * (-np.expm1(-ka * t_end))
+        out['auc_0_t'] = (absorbed / Vd_total * ORAL_SCALE - conc(t_end)) / k
+    return _finish(out, scalar)
+
+
+# === 경구 연속 투여 (같은 용량, tau 간격, n_doses회) ===
+def oral_multi_dose_metrics(D, F, V_d, t_half, t_max, tau, n_doses, body_weight, t_end=None):
+    # 마지막 투여 구간의 피크가 전체 최대: s* = ln(ka·A_ka / (k·A_k)) / (ka - k)
+    scalar = _is_scalar(D, F, V_d, t_half, t_max, tau)
+    D, F, V_d, t_half, t_max, tau = np.broadcast_arrays(
+        *(np.atleast_1d(np.asarray(x, dtype=np.float64)) for x in (D, F, V_d, t_half, t_max, tau)))
+    k, ka = rate_constants(t_half, t_max)
+    Vd_total = V_d * body_weight
+    conc = _column_fn(oral_multi_dose, D, F, V_d, t_half, t_max, tau, n_doses, body_weight)
+
+    def accum(r):
+        return -np.expm1(-n_doses * r * tau) / -np.expm1(-r * tau)
+
+    s_peak = np.log(ka * accum(ka) / (k * accum(k))) / (ka - k)
+    tmax = (n_doses - 1) * tau + np.maximum(s_peak, 0.0)
+    out = {
+        'tmax': tmax, 'cmax': conc(tmax),
+        'css_avg': F * D / (k * Vd_total * tau) * ORAL_SCALE,
+        'auc_0_inf': n_doses * F * D / (k * Vd_total) * ORAL_SCALE,
+    }
+    if t_end is None:
+        t_end = n_doses * tau
+    t_end = np.broadcast_to(np.asarray(t_end, dtype=np.float64), D.shape)
+    # 흡수된 양 = Σ F·D·(1 - e^(-ka·(t - t_i))), t_i <= t
+    n_given = np.clip(np.floor(t_end / tau) + 1, 0, n_doses)
+    s_last = t_end - (n_given - 1) * tau
+    absorbed = F * D * (n_given - np.exp(-ka * s_last) * -np.expm1(-n_given * ka * tau) / -np.expm1(-ka * tau))
+    out['auc_0_t'] = (absorbed / Vd_total * ORAL_SCALE - conc(t_end)) / k
+    return _finish(out, scalar)
+
+
+# === 패치 ===
+def patch_metrics(D, F, V_d, t_half, patch_duration_hour, body_weight, onset_time_hour, tau_off=None, t_end=None):
+    # tau_off가 없으면 제로오더 모델: tmax = 패치 제거 시점
+    # 워시아웃 모델: 제거 후 dC/dt = 0 이 되는 시점을 구간 [T, T + 충분히 긴 시간]에서 이분법으로 찾음
+    scalar = _is_scalar(D, F, V_d, t_half, patch_duration_hour, onset_time_hour, tau_off)
+    arrays = [np.atleast_1d(np.asarray(x, dtype=np.float64))
+              for x in (D, F, V_d, t_half, patch_duration_hour, onset_time_hour)]
+    if tau_off is not None:
+        arrays.append(np.atleast_1d(np.asarray(tau_off, dtype=np.float64)))
+    arrays = np.broadcast_arrays(*arrays)
+    D, F, V_d, t_half, T, onset_time_hour = arrays[:6]
+    k = LN2 / t_half
+    R0 = D * F / T  # mg/hr
+    Vd_total = V_d * body_weight
+
+    if tau_off is None:
+        conc = _column_fn(patch_zero_order, D, F, V_d, t_half, T, body_weight)
+        tmax = T.copy()
+        total_input = R0 * T
+    else:
+        tau_off = arrays[6]
+        conc = _column_fn(patch_washout, D, F, V_d, t_half, T, body_weight, tau_off)
+
+        def slope(t):
+            # dC/dt = R(t)·scale/V - k·C
+            return R0 * np.exp(-(t - T) / tau_off) / Vd_total * PATCH_SCALE - k * conc(t)
+
+        lo, hi = T.copy(), T + 10.0 * (tau_off + t_half)
+        tmax = find_root_bracketed(slope, lo, hi)
+        tmax = np.where(np.isnan(tmax), T, tmax)
+        total_input = R0 * (T + tau_off)
+
+    cmax = conc(tmax)
+    onset_concentration = conc(onset_time_hour)
+    effect_start, effect_end = _effect_window(conc, tmax, onset_time_hour, onset_concentration, t_half)
+    out = {
+        'tmax': tmax, 'cmax': cmax, 'onset_concentration': onset_concentration,
+        'effect_start': effect_start, 'effect_end': effect_end,
+        'effect_duration': effect_end - effect_start,
+        'auc_0_inf': total_input / (k * Vd_total) * PATCH_SCALE,
+    }
+    if t_end is not None:
+        t_end = np.broadcast_to(np.asarray(t_end, dtype=np.float64), D.shape)
+        absorbed = R0 * np.minimum(t_end, T)
+        if tau_off is not None:
+            absorbed = absorbed + R0 * tau_off * -np.expm1(-np.maximum(t_end - T, 0.0) / tau_off)
+        out['auc_0_t'] = (absorbed / Vd_total * PATCH_SCALE - conc(t_end)) / k
+    return _finish(out, scalar)
+
+
+# === 시트 model 컬럼에 따른 모델 (2-컴파트먼트, 비선형 소실) ===
+def _two_compartment_arrays(*xs):
+    return np.broadcast_arrays(*(np.atleast_1d(np.asarray(x, dtype=np.float64)) for x in xs))
+
+
+def oral_2cmt_metrics(D, F, V_d, t_half, t_max, k12, k21, body_weight, onset_time_hour):
+    # tmax: dC/dt = 0 인 시점을 이분법 (투여 직후 기울기 > 0, Tmax부터 두 배씩 늘려 기울기가 음수인 구간을 찾음)
+    # AUC = F·D / (k10·Vc)  (A/α + B/β = 1/k10)
+    scalar = _is_scalar(D, F, V_d, t_half, t_max, k12, k21, onset_time_hour)
+    D, F, V_d, t_half, t_max, k12, k21, onset_time_hour = _two_compartment_arrays(
+        D, F, V_d, t_half, t_max, k12, k21, onset_time_hour)
+    alpha, beta, A, B = _two_compartment_coefficients(t_half, k12, k21)
+    _, _, k10 = two_compartment_rates(t_half, k12, k21)
+    _, ka = rate_constants(t_half, t_max)
+    conc = _column_fn(oral_2cmt, D, F, V_d, t_half, t_max, k12, k21, body_weight)
+
+    def slope(t):
+        # dC/dt를 양의 상수 ka·F·D/Vc로 나눈 값
+        return A * _exp_diff_slope(alpha, ka, t) + B * _exp_diff_slope(beta, ka, t)
+
+    lo, hi = _bracket_above(slope, np.zeros_like(t_max), t_max)
+    tmax = find_root_bracketed(slope, lo, hi)
+    onset_concentration = conc(onset_time_hour)
+    effect_start, effect_end = _effect_window(conc, tmax, onset_time_hour, onset_concentration, t_half)
+    out = {
+        'tmax': tmax, 'cmax': conc(tmax), 'onset_concentration': onset_concentration,
+        'effect_start': effect_start, 'effect_end': effect_end,
+        'effect_duration': effect_end - effect_start,
+        'auc_0_inf': F * D / (k10 * V_d * body_weight) * ORAL_SCALE,
+    }
+    return _finish(out, scalar)
+
+
+def patch_2cmt_metrics(D, F, V_d, t_half, patch_duration_hour, k12, k21, body_weight, onset_time_hour):
+    # 부착 중에는 계속 오르고 제거 후에는 두 지수항 모두 감소 → tmax = 패치 제거 시점
+    # AUC = F·D / (k10·Vc)  (입력 총량만으로 정해짐)
+    scalar = _is_scalar(D, F, V_d, t_half, patch_duration_hour, k12, k21, onset_time_hour)
+    D, F, V_d, t_half, T, k12, k21, onset_time_hour = _two_compartment_arrays(
+        D, F, V_d, t_half, patch_duration_hour, k12, k21, onset_time_hour)
+    _, _, k10 = two_compartment_rates(t_half, k12, k21)
+    conc = _column_fn(patch_2cmt, D, F, V_d, t_half, T, k12, k21, body_weight)
+
+    tmax = np.where(np.isnan(k10), np.nan, T)
+    onset_concentration = conc(onset_time_hour)
+    effect_start, effect_end = _effect_window(conc, tmax, onset_time_hour, onset_concentration, t_half)
+    out = {
+        'tmax': tmax, 'cmax': conc(tmax), 'onset_concentration': onset_concentration,
+        'effect_start': effect_start, 'effect_end': effect_end,
+        'effect_duration': effect_end - effect_start,
+        'auc_0_inf': F * D / (k10 * V_d * body_weight) * PATCH_SCALE,
+    }
+    return _finish(out, scalar)
+
+
+DENSE_POINTS = 4001  # 해석식이 없는 모델(비선형 소실)의 지표 계산용 격자
+
+
+def _interp_rows(time, concentration, t):
+    # 행마다 np.interp(t[i], time[i], concentration[i])를 한 번에 (시각은 행마다 오름차순, 범위 밖은 끝값)
+    rows = np.arange(len(time))
+    j = np.clip((time <= t[:, None]).sum(axis=1), 1, time.shape[1] - 1)
+    t0, t1 = time[rows, j - 1], time[rows, j]
+    c0, c1 = concentration[rows, j - 1], concentration[rows, j]
+    w = np.clip((t - t0) / np.where(t1 > t0, t1 - t0, 1.0), 0.0, 1.0)
+    return c0 + w * (c1 - c0)
+
+
+def curve_metrics(time, concentration, onset_time_hour, t_peak=None):
+    # 조밀한 (약물 수, 점 수) 곡선에서 지표 계산. 피크는 포물선 보간(t_peak를 주면 그 시각),
+    # 기준 농도 교차는 선형 보간, AUC는 사다리꼴 + 마지막 두 점의 기울기로 무한대까지 외삽
+    rows = np.arange(len(time))
+    onset_time_hour = np.broadcast_to(np.asarray(onset_time_hour, dtype=np.float64), rows.shape)
+
+    def at(t):
+        return _interp_rows(time, concentration, t)
+
+    if t_peak is None:
+        i = np.clip(np.argmax(concentration, axis=1), 1, time.shape[1] - 2)
+        y0, y1, y2 = (concentration[rows, i + d] for d in (-1, 0, 1))
+        den = y0 - 2 * y1 + y2
+        shift = np.where(den < 0, 0.5 * (y0 - y2) / np.where(den < 0, den, 1.0), 0.0)
+        tmax = time[rows, i] + np.clip(shift, -1.0, 1.0) * (time[rows, i + 1] - time[rows, i])
+        cmax = np.where(den < 0, y1 - 0.25 * (y0 - y2) * shift, y1)
+    else:
+        tmax = np.broadcast_to(np.asarray(t_peak, dtype=np.float64), rows.shape).copy()
+        cmax = at(tmax)
+    onset_concentration = at(onset_time_hour)
+
+    # 피크 이후 처음으로 기준 농도 아래로 내려가는 구간
+    below = (concentration < onset_concentration[:, None]) & (time > tmax[:, None])
+    has_end = below.any(axis=1) & (onset_concentration > 0)
+    j = np.maximum(np.argmax(below, axis=1), 1)
+    c0, c1 = concentration[rows, j - 1], concentration[rows, j]
+    t0, t1 = time[rows, j - 1], time[rows, j]
+    frac = np.where(c0 != c1, (c0 - onset_concentration) / np.where(c0 != c1, c0 - c1, 1.0), 0.0)
+    effect_end = np.where(has_end, t0 + np.clip(frac, 0.0, 1.0) * (t1 - t0), np.nan)
+
+    auc = np.trapezoid(concentration, time, axis=1)
+    c_a, c_b = concentration[:, -2], concentration[:, -1]
+    slope = np.log(np.where((c_a > c_b) & (c_b > 0), c_a / np.where(c_b > 0, c_b, 1.0), np.nan)) / (time[:, -1] - time[:, -2])
+    return {
+        'tmax': tmax, 'cmax': cmax, 'onset_concentration': onset_concentration,
+        'effect_start': onset_time_hour.astype(float), 'effect_end': effect_end,
+        'effect_duration': effect_end - onset_time_hour, 'auc_0_inf': auc + c_b / slope,
+    }
+
+
+CLOSED_FORM_VARIANTS = ('oral_2cmt', 'patch_2cmt')  # 해석식으로 지표를 구하는 모델 (나머지는 ODE)
+
+
+def variant_metrics(name, p, body_weight, dense_points=DENSE_POINTS):
+    # 시트 model 컬럼으로 고른 모델(MODEL_VARIANTS)의 지표. p: 컬럼 이름 → 약물별 배열
+    # 2-컴파트먼트는 해석식, 비선형(Michaelis–Menten) 소실만 조밀한 격자에서 ODE를 풀어 curve_metrics
+    if name == 'oral_2cmt':
+        return oral_2cmt_metrics(p['D'], p['F'], p['V_d'], p['t_half'], p['t_max'], p['k12'], p['k21'], body_weight,
+                                 p['onset_time_hour'])
+    if name == 'patch_2cmt':
+        return patch_2cmt_metrics(p['D'], p['F'], p['V_d'], p['t_half'], p['patch_duration_hour'], p['k12'], p['k21'],
+                                  body_weight, p['onset_time_hour'])
+    spec = MODELS[name]
+    args = {c: np.asarray(p[c], dtype=np.float64) for c in spec['params']}
+    time = time_grid(spec['horizon'](args, {}), dense_points)
+    t_peak = None if name.startswith('oral') else args['patch_duration_hour']  # 제로오더 패치는 제거 시점이 피크
+    return curve_metrics(time, spec['func'](time, body_weight=body_weight, **args), p['onset_time_hour'], t_peak)
+
+
+def model_metrics(table, model, body_weight, dense_points=DENSE_POINTS, numeric=True):
+    # 페이지 지표를 약물별 모델에 맞게: 1·2-컴파트먼트는 해석식, 비선형 소실 약물만 조밀한 격자에서 계산
+    # model은 페이지 기본 모델 ('oral_single', 'patch_zero_order', 'patch_washout')
+    # numeric=False: 해석식만 (전체 약물 요약 표용). 비선형 소실 약물은 NaN으로 비워 둠
+    c = table.columns
+    if model == 'oral_single':
+        out = oral_single_metrics(c['D'], c['F'], c['V_d'], c['t_half'], c['t_max'], body_weight, c['onset_time_hour'])
+    else:
+        out = patch_metrics(c['D'], c['F'], c['V_d'], c['t_half'], c['patch_duration_hour'], body_weight,
+                            c['onset_time_hour'], c['tau_off'] if model == 'patch_washout' else None)
+    out = {k: np.array(v, dtype=np.float64) for k, v in out.items()}
+    for name, rows in model_groups(table.kinds, model):
+        if name == model:
+            continue
+        if not numeric and name not in CLOSED_FORM_VARIANTS:
+            for v in out.values():
+                v[rows] = np.nan
+            continue
+        for k, v in variant_metrics(name, table.take(rows).columns, body_weight, dense_points).items():
+            out[k][rows] = v
+    return out
+
+
+def numeric_rows(table, model):
+    # 해석식이 없어 ODE로 풀어야 하는 약물(비선형 소실)의 행 번호
+    groups = [rows for name, rows in model_groups(table.kinds, model)
+              if name != model and name not in CLOSED_FORM_VARIANTS]
+    return np.concatenate(groups) if groups else np.zeros(0, dtype=int)
+
+
+shared_model_metrics = shared()(model_metrics)  # 세션 간 공유 (compute_cache)
@@ -0,0 +1,518 @@
+import numpy as np
+
+from compute_cache import shared
+
+LN2 = np.log(2)
+eps = 1e-9
+
+# 농도 단위 환산 (mg/L 기준). 경구 페이지는 ng/mL(×1000),
+# 패치 페이지는 D를 ng로 바꿔 Vd(L)로 나눈 값(×1e6)을 그대로 표시 → 패치 페이지와 같은 숫자가 필요하면 PATCH_SCALE
+ORAL_SCALE = 1e3
+PATCH_SCALE = 1e6
+
+
+def _as_column(x):
+    # 약물별 파라미터(스칼라 또는 길이 n 배열)를 (n, 1)로 바꿔 시간축(m,)과 브로드캐스트되게 함
+    x = np.asarray(x, dtype=np.float64)
+    return x[..., None] if x.ndim else x
+
+
+def time_grid(horizon, n_points):
+    # 약물별 시간축: 공통 0~1 격자를 약물마다 자기 horizon 길이로 늘림 → (약물 수, n_points)
+    return np.multiply.outer(np.asarray(horizon, dtype=np.float64), np.linspace(0, 1, n_points))
+
+
+def rate_constants(t_half, t_max):
+    # 페이지와 같은 방식: k = ln2 / t½, ka = ln2 / Tmax + k
+    k = LN2 / np.asarray(t_half, dtype=np.float64)
+    ka = LN2 / np.asarray(t_max, dtype=np.float64) + k
+    ka = np.where(np.abs(ka - k) < eps, k + eps, ka)
+    return k, ka
+
+
+# === 경구: 1-컴파트먼트, 1차 흡수 ===
+def oral_single(time, D, F, V_d, t_half, t_max, body_weight):
+    # C = ka·F·D / (Vd·(ka - k)) · (e^(-k·t) - e^(-ka·t)),  mg/L → ng/mL (×1000)
+    time = np.asarray(time, dtype=np.float64)
+    D, F, V_d, t_half, t_max, body_weight = (
+        _as_column(x) for x in (D, F, V_d, t_half, t_max, body_weight))
+    k, ka = rate_constants(t_half, t_max)
+    Vd_total = V_d * body_weight
+
+    coef = (ka * F * D) / (Vd_total * (ka - k))
+    C_mg_per_L = coef * (np.exp(-k * time) - np.exp(-ka * time))
+    return np.maximum(C_mg_per_L, 0.0) * 1000.0
+
+
+def oral_multi_dose(time, D, F, V_d, t_half, t_max, tau, n_doses, body_weight):
+    # 같은 용량을 tau 간격으로 n_doses번 투여한 중첩(superposition) 해
+    #   C(t) = coef · (A_k(n)·e^(-k·s) - A_ka(n)·e^(-ka·s)),  n = 지금까지 투여 횟수, s = 마지막 투여 후 경과시간
+    #   A_r(n) = (1 - e^(-n·r·tau)) / (1 - e^(-r·tau))
+    time = np.asarray(time, dtype=np.float64)
+    D, F, V_d, t_half, t_max, tau, n_doses, body_weight = (
+        _as_column(x) for x in (D, F, V_d, t_half, t_max, tau, n_doses, body_weight))
+    k, ka = rate_constants(t_half, t_max)
+    Vd_total = V_d * body_weight
+
+    n = np.clip(np.floor(time / tau) + 1, 0, n_doses)
+    t_since_last = np.where(n == 0, 0.0, time - (n - 1) * tau)
+
+    def accum(r):
+        den = -np.expm1(-r * tau)
+        den = np.where(np.abs(den) < eps, eps, den)
+        return -np.expm1(-n * r * tau) / den
+
+    coef = (ka * F * D) / (Vd_total * (ka - k))
+    C_mg_per_L = coef * (accum(k) * np.exp(-k * t_since_last) - accum(ka) * np.exp(-ka * t_since_last))
+    C_mg_per_L = np.where(n > 0, C_mg_per_L, 0.0)
+    return np.maximum(C_mg_per_L, 0.0) * 1000.0
+
+
+def patch_time_grid(t_half, patch_duration_hour, n_points):
+    # 약물별 그래프 길이 (패치의 경우 속효성 약품보다 길게 그림). 파라미터가 배열이면 약물별 행
+    total_time = np.maximum(np.asarray(patch_duration_hour) * 2, np.asarray(t_half) * 7)
+    return time_grid(total_time, n_points)
+
+
+# === 패치: 제로오더 흡수 + 1차 소실 ===
+def patch_zero_order(time, D, F, V_d, t_half, patch_duration_hour, body_weight):
+    # 패치 부착 중 일정 속도 R0로 흡수, 제거 즉시 흡수 0
+    #   t <= T : C = R0/(k·Vd) · (1 - e^(-k·t))
+    #   t >  T : C = C(T) · e^(-k·(t - T))
+    # 두 구간을 min/max로 합쳐 한 번의 배열 연산으로 계산.
+    # 파라미터가 길이 n 배열이면 (n, len(time)) 행렬을 돌려줌. 단위는 페이지와 동일 (D[mg] × 1e6 / Vd[L])
+    time = np.asarray(time, dtype=np.float64)
+    D, F, V_d, t_half, T, body_weight = (
+        _as_column(x) for x in (D, F, V_d, t_half, patch_duration_hour, body_weight))
+
+    D_ng = D * 1e6
+    k = LN2 / t_half
+    R0 = (D_ng * F) / T
+    Vd_total = V_d * body_weight
+
+    t_on = np.minimum(time, T)
+    t_after = np.maximum(time - T, 0.0)
+    return (R0 / (k * Vd_total)) * (-np.expm1(-k * t_on)) * np.exp(-k * t_after)
+
+
+# === 패치: 제거 후 잔여 흡수(워시아웃) ===
+def _exp_diff(a, b, s):
+    # (e^(-a·s) - e^(-b·s)) / (b - a) 를 수치적으로 안정하게 계산. a ≈ b 이면 극한값 s·e^(-a·s)
+    lo = np.minimum(a, b)
+    d = np.abs(b - a)
+    safe_d = np.where(d > 1e-12, d, 1.0)
+    ratio = np.where(d > 1e-12, -np.expm1(-safe_d * s) / safe_d, s)
+    return np.exp(-lo * s) * ratio
+
+
+def _exp_diff_slope(a, b, s):
+    # _exp_diff의 s 미분 (b·e^(-b·s) - a·e^(-a·s)) / (b - a). a ≈ b 이면 극한값 (1 - a·s)·e^(-a·s)
+    d = b - a
+    near = np.abs(d) <= 1e-8 * np.maximum(np.abs(a), np.abs(b))
+    safe_d = np.where(near, 1.0, d)
+    return np.where(near, (1 - a * s) * np.exp(-a * s), (b * np.exp(-b * s) - a * np.exp(-a * s)) / safe_d)
+
+
+def patch_washout(time, D, F, V_d, t_half, patch_duration_hour, body_weight, tau_off):
+    # 패치 제거 후 피부에 남은 약제가 시간상수 tau_off로 서서히 흡수되는 모델의 해석해
+    #   dc/dt = R(t)/Vd - k·c,  R(t) = R0 (t <= T),  R0·e^(-(t-T)/tau_off) (t > T)
+    #   t <= T : C = R0/(k·Vd) · (1 - e^(-k·t))
+    #   t >  T : C = C(T)·e^(-k·s) + R0/Vd · (e^(-s/tau_off) - e^(-k·s)) / (k - 1/tau_off),  s = t - T
+    time = np.asarray(time, dtype=np.float64)
+    D, F, V_d, t_half, T, body_weight, tau_off = (
+        _as_column(x) for x in (D, F, V_d, t_half, patch_duration_hour, body_weight, tau_off))
+
+    D_ng = D * 1e6
+    k = LN2 / t_half
+    R0 = (D_ng * F) / T
+    Vd_total = V_d * body_weight
+
+    t_on = np.minimum(time, T)
+    s = np.maximum(time - T, 0.0)
+    c_on = (R0 / (k * Vd_total)) * (-np.expm1(-k * t_on))
+    return c_on * np.exp(-k * s) + (R0 / Vd_total) * _exp_diff(1.0 / tau_off, k, s)
+
+
+# === 적응형 ODE 적분기 (Dormand–Prince 5(4), 여러 약물 동시) ===
+# 해석해가 없는 입력 프로파일용. 모든 약물이 같은 스텝을 쓰고 오차는 약물 중 최댓값으로 판단.
+_DP_C = np.array([0, 1/5, 3/10, 4/5, 8/9, 1, 1])
+_DP_A = [
+    [],
+    [1/5],
+    [3/40, 9/40],
+    [44/45, -56/15, 32/9],
+    [19372/6561, -25360/2187, 64448/6561, -212/729],
+    [9017/3168, -355/33, 46732/5247, 49/176, -5103/18656],
+    [35/384, 0, 500/1113, 125/192, -2187/6784, 11/84],
+]
+_DP_B = np.array([35/384, 0, 500/1113, 125/192, -2187/6784, 11/84, 0])
+_DP_E = np.array([71/57600, 0, -71/16695, 71/1920, -17253/339200, 22/525, -1/40])  # 5차 - 4차
+# 연속 출력(dense output) 계수: y(t + θh) = y + h · Σ K_i · (P_i · [θ, θ², θ³, θ⁴])
+_DP_P = np.array([
+    [1, -8048581381/2820520608, 8663915743/2820520608, -12715105075/11282082432],
+    [0, 0, 0, 0],
+    [0, 131558114200/32700410799, -68118460800/10900136933, 87487479700/32700410799],
+    [0, -1754552775/470086768, 14199869525/1410260304, -10690763975/1880347072],
+    [0, 127303824393/49829197408, -318862633887/49829197408, 701980252875/199316789632],
+    [0, -282668133/205662961, 2019193451/616988883, -1453857185/822651844],
+    [0, 40617522/29380423, -110615467/29380423, 69997945/29380423],
+])
+
+
+def solve_ode_batch(fun, y0, t_eval, rtol=1e-6, atol=1e-9, max_steps=100000, breakpoints=()):
+    # fun(t, y) -> dy/dt, y 모양은 (약물 수, ...). t_eval은 오름차순 1차원 배열 (모든 약물 공통),
+    # 또는 행마다 오름차순인 (약물 수, m) 배열 (약물마다 출력 시각이 다를 때, 적분은 0에서 시작)
+    # breakpoints: 우변이 불연속인 시각 (패치 제거 등). 스텝이 이 시각을 넘지 않고 정확히 멈춘 뒤 다시 시작
+    # 반환: 시간축을 마지막에 붙인 y0.shape + (m,) 배열, 우변 함수 평가 횟수
+    y = np.array(y0, dtype=np.float64)
+    t_eval = np.asarray(t_eval, dtype=np.float64)
+    m = t_eval.shape[-1]
+    out = np.empty((len(y), m) + y.shape[1:])  # 시간축은 끝에서 마지막으로 옮김
+    if t_eval.ndim == 2:
+        t, t_end = t_eval.min(initial=0.0), t_eval.max(initial=0.0)
+        # 행마다 searchsorted: 행 번호만큼 띄운 한 줄 배열에서 한 번에 찾음
+        rows = np.arange(len(y))
+        offset = rows * (t_end - t + 1.0)
+        flat = (t_eval + offset[:, None]).ravel()
+
+        def ends(t_new):
+            return np.searchsorted(flat, t_new + offset, side='right') - rows * m
+    else:
+        t, t_end = t_eval[0], t_eval[-1]
+
+        def ends(t_new):
+            return np.searchsorted(t_eval, t_new, side='right')
+    j = np.broadcast_to(ends(t), (len(y),))  # 행마다 다음에 채울 출력 위치
+    out[np.arange(m) < j[:, None]] = np.repeat(y, j, axis=0)
+    f = fun(t, y)
+    n_eval = 1
+    h = (t_end - t) * 1e-3 if t_end > t else 0.0
+    K = np.empty((7,) + y.shape)
+    breakpoints = np.unique(np.asarray(breakpoints, dtype=np.float64))
+
+    for _ in range(max_steps):
+        if np.all(j >= m):
+            break
+        b = np.searchsorted(breakpoints, t, side='right')
+        stop = breakpoints[b] if b < len(breakpoints) and breakpoints[b] < t_end else t_end
+        h_try = h
+        clipped = h >= stop - t
+        h = min(h, stop - t)
+        K[0] = f
+        for i in range(1, 7):
+            dy = sum(a * K[q] for q, a in enumerate(_DP_A[i]) if a != 0)
+            K[i] = fun(t + _DP_C[i] * h, y + h * dy)
+        n_eval += 6
+        y_new = y + h * np.tensordot(_DP_B, K, axes=1)
+        err = h * np.tensordot(_DP_E, K, axes=1)
+        scale = atol + rtol * np.maximum(np.abs(y), np.abs(y_new))
+        err_norm = np.sqrt(np.mean((err / scale) ** 2)) if err.size else 0.0
+
+        if err_norm <= 1.0:
+            t_new = stop if clipped else t + h
+            # 이번 스텝 안에 들어오는 출력 시점은 연속 출력으로 채움 (행마다 j ~ j_end 구간)
+            j_end = np.broadcast_to(ends(t_new), (len(y),))
+            counts = j_end - j
+            if counts.any():
+                r = np.repeat(np.arange(len(y)), counts)
+                c = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts - j, counts)
+                theta = ((t_eval[r, c] if t_eval.ndim == 2 else t_eval[c]) - t) / h
+                powers = np.stack([theta, theta ** 2, theta ** 3, theta ** 4], axis=-1)  # (출력 수, 4)
+                Q = np.tensordot(K, _DP_P, axes=([0], [0]))                             # y.shape + (4,)
+                out[r, c] = y[r] + h * np.einsum('k...p,kp->k...', Q[r], powers)
+                j = j_end
+            t, y, f = t_new, y_new, K[6]
+            if clipped and stop < t_end:
+                # 불연속 지점 바로 뒤의 기울기로 다시 시작, 스텝 크기는 잘리기 전 값에서 이어감
+                f = fun(np.nextafter(t, np.inf), y)
+                n_eval += 1
+                h = h_try
+            factor = 5.0 if err_norm == 0 else min(5.0, 0.9 * err_norm ** -0.2)
+        else:
+            factor = max(0.2, 0.9 * err_norm ** -0.2)
+        h *= factor
+    else:
+        raise RuntimeError("solve_ode_batch: 최대 스텝 수를 넘었습니다.")
+
+    return np.moveaxis(out, 1, -1), n_eval
+
+
+def _unit_time(time, n):
+    # 약물별 시간축 길이 H로 나눈 시각 u = t/H 와 H. 모든 약물이 u(0~1)에서 같은 스텝으로 적분: dy/du = H · dy/dt
+    # time: 공통 1차원, 또는 (n, m). 행들이 서로 비례하면(time_grid) 공통 u 하나, 아니면 행마다 자기 u에서 출력
+    # 길이가 0인 시간축(시각이 모두 0)은 H = 1로 두어 0으로 나누지 않음 (출력은 초기값)
+    H = np.broadcast_to(time.max(axis=-1, initial=0.0), (n,))
+    H = np.where(H > 0, H, 1.0)
+    if time.ndim < 2:
+        return H, time / H[0]
+    u = time / H[:, None]
+    return H, (u[0] if np.allclose(u, u[:1], rtol=0, atol=1e-12) else u)
+
+
+def _ode_time(time):
+    # 시각이 오름차순이 아니면 (Tmax 등 몇 개 시점만 물을 때) 정렬한 격자에서 풀고 원래 순서로 되돌릴 인덱스를 함께 돌려줌
+    # 1차원은 0을 붙여 중복을 없앤 격자, (n, m)은 행마다 정렬 (적분은 어차피 0에서 시작)
+    if time.ndim == 2:
+        if np.all(np.diff(time, axis=1) >= 0):
+            return time, None
+        order = np.argsort(time, axis=1)
+        return np.take_along_axis(time, order, axis=1), np.argsort(order, axis=1)
+    if time.ndim == 1 and time.size and time[0] == 0 and np.all(np.diff(time) > 0):
+        return time, None
+    grid, back = np.unique(np.r_[0.0, time.ravel()], return_inverse=True)
+    return grid, back[1:].reshape(time.shape)
+
+
+def _restore(conc, back):
+    # _ode_time로 정렬한 시각의 결과를 원래 시각 순서로
+    if back is None:
+        return conc
+    return np.take_along_axis(conc, back, axis=-1) if back.ndim == 2 else conc[..., back]
+
+
+def patch_washout_ode(time, D, F, V_d, t_half, patch_duration_hour, body_weight, tau_off,
+                      input_rate=None, rtol=1e-8, atol=1e-12):
+    # 같은 워시아웃 모델을 적응형 적분기로 푼 버전 (해석해가 없는 입력 프로파일 R(t)을 넣을 때 사용)
+    # time: 공통 1차원 시간축, 또는 약물별 (n, m) 시간축 (행마다 달라도 됨)
+    # input_rate(t, R0, T, tau_off) -> ng/hr, 기본은 워시아웃 입력
+    time = np.asarray(time, dtype=np.float64)
+    n = max(np.size(x) for x in (D, F, V_d, t_half, patch_duration_hour, tau_off))
+    D, F, V_d, t_half, T, tau_off = (
+        np.broadcast_to(np.asarray(x, dtype=np.float64), (n,)) for x in (D, F, V_d, t_half, patch_duration_hour, tau_off))
+
+    k = LN2 / t_half
+    R0 = (D * 1e6 * F) / T
+    Vd_total = V_d * body_weight
+    if input_rate is None:
+        def input_rate(t, R0, T, tau_off):
+            return np.where(t <= T, R0, R0 * np.exp(-np.maximum(t - T, 0.0) / tau_off))
+
+    # 약물별 시간축 길이 H로 정규화한 시간 u(0~1)에서 적분: dc/du = H · (R(H·u)/Vd - k·c)
+    time, back = _ode_time(time)
+    H, u = _unit_time(time, n)
+
+    def rhs(u_, c):
+        t = H * u_
+        return H * (input_rate(t, R0, T, tau_off) / Vd_total - k * c)
+
+    conc, _ = solve_ode_batch(rhs, np.zeros(n), u, rtol=rtol, atol=atol, breakpoints=T / H)
+    return _restore(np.maximum(conc, 0.0), back)
+
+
+# === 2-컴파트먼트: 중심구획 + 말초구획, 중심에서 1차 소실 ===
+# 시트의 t_half는 말기(β) 반감기, V_d는 중심구획 분포용적, k12·k21(1/hr)은 구획 간 이동 속도상수.
+# 중심구획에 단위량을 넣었을 때의 농도 반응 h(t) = (A·e^(-α·t) + B·e^(-β·t)) / Vc 를 입력 형태별로 적분한 해석해.
+def two_compartment_rates(t_half, k12, k21):
+    # 말기 반감기로부터 중심구획 소실속도 k10과 지수 α, β를 구함. β < k21 이어야 함 (아니면 NaN)
+    beta = LN2 / np.asarray(t_half, dtype=np.float64)
+    k12 = np.asarray(k12, dtype=np.float64)
+    k21 = np.asarray(k21, dtype=np.float64)
+    valid = k21 > beta
+    k10 = np.where(valid, beta * (k12 + k21 - beta) / np.where(valid, k21 - beta, 1.0), np.nan)
+    alpha = k10 + k12 + k21 - beta
+    return alpha, beta, k10
+
+
+def _two_compartment_coefficients(t_half, k12, k21):
+    alpha, beta, k10 = two_compartment_rates(t_half, k12, k21)
+    A = (alpha - k21) / (alpha - beta)
+    B = (k21 - beta) / (alpha - beta)
+    return alpha, beta, A, B
+
+
+def oral_2cmt(time, D, F, V_d, t_half, t_max, k12, k21, body_weight):
+    # 1차 흡수: C = ka·F·D/Vc · Σ c_i · (e^(-λ_i·t) - e^(-ka·t)) / (ka - λ_i),  ka = ln2/Tmax + β (1-컴파트먼트와 같은 방식)
+    time = np.asarray(time, dtype=np.float64)
+    D, F, V_d, t_half, t_max, k12, k21, body_weight = (
+        _as_column(x) for x in (D, F, V_d, t_half, t_max, k12, k21, body_weight))
+    alpha, beta, A, B = _two_compartment_coefficients(t_half, k12, k21)
+    _, ka = rate_constants(t_half, t_max)
+    Vc = V_d * body_weight
+    C = ka * F * D / Vc * (A * _exp_diff(alpha, ka, time) + B * _exp_diff(beta, ka, time))
+    return np.maximum(C, 0.0) * ORAL_SCALE
+
+
+def iv_2cmt(time, D, V_d, t_half, k12, k21, body_weight):
+    # 정맥 일시 투여: C = D/Vc · (A·e^(-α·t) + B·e^(-β·t))
+    time = np.asarray(time, dtype=np.float64)
+    D, V_d, t_half, k12, k21, body_weight = (_as_column(x) for x in (D, V_d, t_half, k12, k21, body_weight))
+    alpha, beta, A, B = _two_compartment_coefficients(t_half, k12, k21)
+    C = D / (V_d * body_weight) * (A * np.exp(-alpha * time) + B * np.exp(-beta * time))
+    return np.where(time >= 0, C, 0.0) * ORAL_SCALE
+
+
+def patch_2cmt(time, D, F, V_d, t_half, patch_duration_hour, k12, k21, body_weight):
+    # 패치 제로오더 흡수 (제거 즉시 흡수 0): C = R0/Vc · Σ c_i/λ_i · (1 - e^(-λ_i·min(t,T))) · e^(-λ_i·max(t-T,0))
+    time = np.asarray(time, dtype=np.float64)
+    D, F, V_d, t_half, T, k12, k21, body_weight = (
+        _as_column(x) for x in (D, F, V_d, t_half, patch_duration_hour, k12, k21, body_weight))
+    alpha, beta, A, B = _two_compartment_coefficients(t_half, k12, k21)
+    R0 = D * F / T
+    t_on = np.minimum(time, T)
+    t_after = np.maximum(time - T, 0.0)
+
+    def term(c, lam):
+        return c / lam * (-np.expm1(-lam * t_on)) * np.exp(-lam * t_after)
+
+    return R0 / (V_d * body_weight) * (term(A, alpha) + term(B, beta)) * PATCH_SCALE
+
+
+# === 비선형(Michaelis–Menten) 소실 ===
+# dC/dt = 입력/V - Vmax·C / (V·(Km + C)),  Vmax: mg/hr/kg (체중당, V_d와 같은 방식), Km: mg/L
+# 해석해가 없으므로 solve_ode_batch로 모든 약물을 한 번에 적분 (스텝 수는 약물 수와 무관)
+def oral_mm(time, D, F, V_d, t_half, t_max, Vmax, Km, body_weight, rtol=1e-6, atol=1e-12):
+    # 1차 흡수 + 포화 소실. t_half는 ka(= ln2/Tmax + ln2/t½) 계산에만 쓰고 소실은 Vmax, Km으로
+    time = np.asarray(time, dtype=np.float64)
+    scalar = time.ndim < 2 and all(np.ndim(x) == 0 for x in (D, F, V_d, t_half, t_max, Vmax, Km))
+    n = max([np.size(x) for x in (D, F, V_d, t_half, t_max, Vmax, Km)] + [len(time) if time.ndim == 2 else 1])
+    D, F, V_d, t_half, t_max, Vmax, Km = (
+        np.broadcast_to(np.asarray(x, dtype=np.float64), (n,)) for x in (D, F, V_d, t_half, t_max, Vmax, Km))
+    _, ka = rate_constants(t_half, t_max)
+    V = V_d * body_weight
+    vmax = Vmax * body_weight / V  # mg/L/hr
+    time, back = _ode_time(time)
+    H, u = _unit_time(time, n)
+
+    def rhs(u_, y):
+        Ag, C = y[:, 0], y[:, 1]
+        absorbed = ka * Ag
+        return H[:, None] * np.stack([-absorbed, absorbed / V - vmax * C / (Km + C)], axis=1)
+
+    y, _ = solve_ode_batch(rhs, np.stack([F * D, np.zeros(n)], axis=1), u, rtol=rtol, atol=atol)
+    conc = _restore(np.maximum(y[:, 1], 0.0) * ORAL_SCALE, back)
+    return conc[0] if scalar else conc
+
+
+def patch_mm(time, D, F, V_d, t_half, patch_duration_hour, Vmax, Km, body_weight, rtol=1e-6, atol=1e-12):
+    # 패치 제로오더 흡수 + 포화 소실 (t_half는 그래프 길이에만 사용)
+    time = np.asarray(time, dtype=np.float64)
+    scalar = time.ndim < 2 and all(np.ndim(x) == 0 for x in (D, F, V_d, patch_duration_hour, Vmax, Km))
+    n = max([np.size(x) for x in (D, F, V_d, patch_duration_hour, Vmax, Km)] + [len(time) if time.ndim == 2 else 1])
+    D, F, V_d, T, Vmax, Km = (
+        np.broadcast_to(np.asarray(x, dtype=np.float64), (n,)) for x in (D, F, V_d, patch_duration_hour, Vmax, Km))
+    V = V_d * body_weight
+    R0 = D * F / T / V  # mg/L/hr
+    vmax = Vmax * body_weight / V
+    time, back = _ode_time(time)
+    H, u = _unit_time(time, n)
+
+    def rhs(u_, C):
+        return H * (np.where(H * u_ <= T, R0, 0.0) - vmax * C / (Km + C))
+
+    conc, _ = solve_ode_batch(rhs, np.zeros(n), u, rtol=rtol, atol=atol, breakpoints=T / H)
+    conc = _restore(np.maximum(conc, 0.0) * PATCH_SCALE, back)
+    return conc[0] if scalar else conc
+
+
+# === 여러 약물 × 시간 일괄 계산 ===
+# 모델 이름 → (농도 함수, 시트에서 쓰는 파라미터 컬럼, 약물별 그래프 길이)
+MODELS = {
+    'oral_single': {
+        'func': oral_single,
+        'params': ('D', 'F', 'V_d', 't_half', 't_max'),
+        'horizon': lambda p, opts: p['t_half'] * 7,
+    },
+    'oral_multi_dose': {
+        'func': oral_multi_dose,
+        'params': ('D', 'F', 'V_d', 't_half', 't_max', 'tau'),
+        'horizon': lambda p, opts: opts['n_doses'] * p['tau'],
+    },
+    'patch_zero_order': {
+        'func': patch_zero_order,
+        'params': ('D', 'F', 'V_d', 't_half', 'patch_duration_hour'),
+        'horizon': lambda p, opts: np.maximum(p['patch_duration_hour'] * 2, p['t_half'] * 7),
+    },
+    'patch_washout': {
+        'func': patch_washout,
+        'params': ('D', 'F', 'V_d', 't_half', 'patch_duration_hour', 'tau_off'),
+        'horizon': lambda p, opts: np.maximum(p['patch_duration_hour'] * 2, p['t_half'] * 7),
+    },
+    'oral_2cmt': {
+        'func': oral_2cmt,
+        'params': ('D', 'F', 'V_d', 't_half', 't_max', 'k12', 'k21'),
+        'horizon': lambda p, opts: p['t_half'] * 7,
+    },
+    'iv_2cmt': {
+        'func': iv_2cmt,
+        'params': ('D', 'V_d', 't_half', 'k12', 'k21'),
+        'horizon': lambda p, opts: p['t_half'] * 7,
+    },
+    'patch_2cmt': {
+        'func': patch_2cmt,
+        'params': ('D', 'F', 'V_d', 't_half', 'patch_duration_hour', 'k12', 'k21'),
+        'horizon': lambda p, opts: np.maximum(p['patch_duration_hour'] * 2, p['t_half'] * 7),
+    },
+    'oral_mm': {
+        'func': oral_mm,
+        'params': ('D', 'F', 'V_d', 't_half', 't_max', 'Vmax', 'Km'),
+        'horizon': lambda p, opts: p['t_half'] * 7,
+    },
+    'patch_mm': {
+        'func': patch_mm,
+        'params': ('D', 'F', 'V_d', 't_half', 'patch_duration_hour', 'Vmax', 'Km'),
+        'horizon': lambda p, opts: np.maximum(p['patch_duration_hour'] * 2, p['t_half'] * 7),
+    },
+}
+
+# 시트의 model 컬럼(params.MODEL_REQUIRED)에 따라 페이지 기본 모델 대신 쓸 모델. 없는 조합은 기본 모델 그대로
+MODEL_VARIANTS = {
+    'oral_single': {'2cmt': 'oral_2cmt', 'mm': 'oral_mm'},
+    'patch_zero_order': {'2cmt': 'patch_2cmt', 'mm': 'patch_mm'},
+}
+
+
+def model_name(model, kind):
+    # 페이지 기본 모델 + 시트 model 컬럼 값 → 실제로 계산할 MODELS 이름
+    return MODEL_VARIANTS.get(model, {}).get(kind, model)
+
+
+def model_groups(kinds, model):
+    # 약물을 실제로 계산할 모델 이름별로 묶음 → [(모델 이름, 행 번호 배열), ...]. kinds: 약물별 model 값
+    names = np.array([model_name(model, kind) for kind in kinds], dtype=object)
+    return [(name, np.flatnonzero(names == name)) for name in dict.fromkeys(names)]
+
+
+def row_model(model, row, body_weight, **options):
+    # 약물 한 개(ParamTable.row)의 농도 함수 t -> C. 시트 model 컬럼에 맞는 모델로
+    spec = MODELS[model_name(model, row.get('model'))]
+    params = {c: row[c] for c in spec['params']}
+    return lambda t: spec['func'](np.asarray(t, dtype=np.float64), body_weight=body_weight, **params, **options)
+
+
+def simulate_batch(table, model, n_points, body_weight, horizon=None, **options):
+    # table(ParamTable)의 모든 약물을 한 번의 브로드캐스트 연산으로 계산
+    # 반환: time, concentration 모두 (약물 수, n_points). 약물마다 자기 그래프 길이로 시간축을 늘림
+    spec = MODELS[model]
+    params = {c: table.columns[c] for c in spec['params']}
+    if horizon is None:
+        horizon = spec['horizon'](params, options)
+    time = time_grid(np.broadcast_to(horizon, (len(table),)), n_points)
+    groups = model_groups(table.kinds, model)
+    if len(groups) <= 1 and (not groups or groups[0][0] == model):
+        return time, spec['func'](time, body_weight=body_weight, **params, **options)
+
+    # 시트에서 다른 모델(2-컴파트먼트, 비선형 소실)을 고른 약물은 모델별로 묶어 한 번씩 계산
+    concentration = np.empty_like(time)
+    for name, rows in groups:
+        sub = MODELS[name]
+        p = {c: table.columns[c][rows] for c in sub['params']}
+        concentration[rows] = sub['func'](time[rows], body_weight=body_weight, **p, **options)
+    return time, concentration
+
+
+# 세션 간에 결과를 공유하는 simulate_batch (같은 테이블·인자면 한 번만 계산, 결과 배열은 읽기 전용)
+shared_batch = shared()(simulate_batch)
+
+
+def clip_curve(time, concentration, t_end, model, extra_times=()):
+    # 그래프용 곡선을 t_end에서 자르고, 성긴 격자에서도 꺾이는 점·피크가 정확히 그려지도록
+    # extra_times(Tmax, 패치 제거 시점 등)와 t_end를 격자에 끼워 넣음. model(t) -> 농도
+    mask = time <= t_end
+    t_stop = min(t_end, time[-1])  # 원래 격자 밖으로 곡선을 늘리지는 않음
+    extra = np.array([t for t in (*extra_times, t_end) if 0 <= t <= t_stop], dtype=np.float64)
+    if extra.size == 0:
+        return time[mask], concentration[mask]
+    new_time = np.concatenate([time[mask], extra])
+    new_conc = np.concatenate([concentration[mask], model(extra)])
+    order = np.argsort(new_time, kind='stable')
+    return new_time[order], new_conc[order]
@@ -0,0 +1,193 @@
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from compute_cache import shared
+from pk_models import LN2, MODELS
+
+# 인구집단(가상 환자) 몬테카를로 시뮬레이션.
+# 시트의 값은 "전형적인 환자" 값으로 보고, 환자마다 체중·Vd·CL·F·흡수속도를 분포에서 뽑아
+# (환자 수 × 시간) 배열을 한 번에 계산한다. 환자를 CHUNK_SIZE명씩 나눠 계산하고 청크마다 바로 줄여서
+# (시간별 농도 히스토그램 + 기준 이상 환자 수) 전체 환자 × 시간 배열은 만들지 않는다 → 메모리는 환자 수와 무관.
+# 백분위는 히스토그램에서 칸 안 로그 보간으로 구함. 칸은 시간별로 첫 청크 중앙값의 10^±HIST_DECADES 배 범위를
+# 로그 간격 HIST_BINS칸으로 나눔 (칸 폭 약 1.2%, 정확한 백분위와의 차이는 대개 0.1% 미만, 꼬리 표본이 성긴 곳에서 최대 약 0.5%).
+# 환자 수가 많으면 청크를 프로세스 풀로 나눠 계산한다.
+
+# 분포 설정: ('normal', 평균 배수 또는 값, 표준편차) / ('lognormal', CV) / ('logitnormal', 로짓 스케일 표준편차)
+DEFAULT_VARIABILITY = {
+    'body_weight': ('normal', 1.0, 0.17),  # 평균 = 페이지 체중, 표준편차 17% (40~150kg로 자름)
+    'V_d': ('lognormal', 0.3),
+    'CL': ('lognormal', 0.3),              # t½ = ln2 · Vd / CL
+    'F': ('logitnormal', 0.5),
+    'ka': ('lognormal', 0.4),              # 흡수속도 (ka - k = ln2 / Tmax 부분에 적용 → 항상 ka > k)
+}
+BODY_WEIGHT_RANGE = (40.0, 150.0)
+PERCENTILES = (5, 50, 95)
+CHUNK_SIZE = 2000
+PARALLEL_THRESHOLD = 20000  # 이 환자 수 이상이면 프로세스 풀 사용
+HIST_BINS = 1200
+HIST_DECADES = 3.0
+HIST_WIDTH = 2 * HIST_DECADES / HIST_BINS  # 칸 폭 (log10)
+
+
+def _lognormal_factor(rng, cv, n):
+    # 평균 1, 변동계수 cv인 로그정규 배수
+    if not cv:
+        return np.ones(n)
+    sigma = np.sqrt(np.log1p(cv ** 2))
+    return rng.lognormal(-0.5 * sigma ** 2, sigma, n)
+
+
+def sample_population(rng, n, params, body_weight, variability=None):
+    # 전형값 params(D, F, V_d, t_half, t_max, ...)로부터 환자 n명의 파라미터 배열을 뽑음
+    v = dict(DEFAULT_VARIABILITY)
+    v.update(variability or {})
+    out = {key: np.full(n, float(value)) for key, value in params.items()}
+
+    _, mean_factor, sd_factor = v['body_weight']
+    bw = rng.normal(body_weight * mean_factor, body_weight * sd_factor, n)
+    out['body_weight'] = np.clip(bw, *BODY_WEIGHT_RANGE)
+
+    V = params['V_d'] * _lognormal_factor(rng, v['V_d'][1], n)
+    CL = LN2 * params['V_d'] / params['t_half'] * _lognormal_factor(rng, v['CL'][1], n)  # L/kg/hr
+    out['V_d'] = V
+    out['t_half'] = LN2 * V / CL
+
+    if 'F' in params:
+        F0 = np.clip(params['F'], 1e-6, 1 - 1e-6)
+        logit = np.log(F0 / (1 - F0)) + rng.normal(0.0, v['F'][1], n)
+        out['F'] = 1.0 / (1.0 + np.exp(-logit))
+    if 't_max' in params:
+        # ka - k 에 배수를 곱하는 것은 Tmax 파라미터를 나누는 것과 같음
+        out['t_max'] = params['t_max'] / _lognormal_factor(rng, v['ka'][1], n)
+    return out
+
+
+def _simulate_chunk(model, time, params, body_weight, variability, n, seed, options):
+    rng = np.random.default_rng(seed)
+    p = sample_population(rng, n, params, body_weight, variability)
+    spec = MODELS[model]
+    args = {key: p[key] for key in spec['params']}
+    conc = spec['func'](time, body_weight=p['body_weight'], **args, **options)
+    return conc.astype(np.float32)
+
+
+def _hist_start(conc):
+    # 첫 청크 (환자, m) → 시간별 히스토그램 첫 칸 경계 (log10). 중앙값이 0인 시각은 최댓값, 그것도 0이면 전체 최댓값
+    ref = np.median(conc, axis=0)
+    ref = np.where(ref > 0, ref, conc.max(axis=0))
+    ref = np.where(ref > 0, ref, max(float(conc.max()), 1e-12))
+    return np.log10(ref) - HIST_DECADES
+
+
+def _reduce(conc, start, onset_concentration):
+    # 청크 (환자, m) → 시간별 칸별 환자 수 (m, HIST_BINS + 2), 기준 농도 이상 환자 수 (m,)
+    # 칸 0: 첫 경계 이하(0 포함), 1..HIST_BINS: 로그 칸, 마지막: 끝 경계 초과
+    m = conc.shape[1]
+    with np.errstate(divide='ignore'):
+        pos = np.where(conc > 0, (np.log10(conc, dtype=np.float64) - start) / HIST_WIDTH, -1.0)
+    idx = np.clip(np.floor(pos) + 1, 0, HIST_BINS + 1).astype(np.intp) + np.arange(m) * (HIST_BINS + 2)
+    counts = np.bincount(idx.ravel(), minlength=m * (HIST_BINS + 2)).reshape(m, HIST_BINS + 2)
+    above = None if onset_concentration is None else np.count_nonzero(conc >= onset_concentration, axis=0)
+    return counts, above
+
+
+def _reduce_chunk(model, time, params, body_weight, variability, n, seed, options, start, onset_concentration):
+    return _reduce(_simulate_chunk(model, time, params, body_weight, variability, n, seed, options), start,
+                   onset_concentration)
+
+
+def hist_percentiles(counts, start, qs=PERCENTILES):
+    # 시간별 히스토그램 → 백분위 곡선 (칸 안에서 로그 선형 보간). 첫 칸이면 0, 끝 칸이면 끝 경계
+    cum = np.cumsum(counts, axis=1)
+    n = cum[:, -1]
+    rows = np.arange(len(counts))
+    out = {}
+    for q in qs:
+        target = q / 100 * (n - 1) + 1  # np.percentile과 같은 순위 (0부터 q·(n-1)) → 누적 개수
+        j = np.argmax(cum >= target[:, None], axis=1)
+        before = np.where(j > 0, cum[rows, j - 1], 0)
+        frac = np.clip((target - before) / np.maximum(counts[rows, j], 1), 0.0, 1.0)
+        value = 10.0 ** (start + (np.minimum(j, HIST_BINS + 1) - 1 + frac) * HIST_WIDTH)
+        out[q] = np.where(j == 0, 0.0, np.where(j == HIST_BINS + 1, 10.0 ** (start + 2 * HIST_DECADES), value))
+    return out
+
+
+def simulate_population(model, time, params, n_patients, body_weight, onset_concentration=None,
+                        variability=None, seed=0, chunk_size=CHUNK_SIZE, n_workers=None, **options):
+    # model: pk_models.MODELS 이름, time: 공통 시간축 (m,), params: 약물 한 개의 전형값 dict
+    # 반환: 백분위 곡선(PERCENTILES), 약효 기준 농도 이상인 환자 비율(시간별)
+    time = np.asarray(time, dtype=np.float64)
+    n_chunks = max(1, -(-n_patients // chunk_size))
+    sizes = [min(chunk_size, n_patients - i * chunk_size) for i in range(n_chunks)]
+    seeds = np.random.SeedSequence(seed).spawn(n_chunks)  # 작업자 수와 무관하게 같은 결과
+    params = {key: float(params[key]) for key in MODELS[model]['params']}
+
+    # 첫 청크로 히스토그램 칸을 정하고 나머지 청크는 계산하자마자 줄임
+    first = _simulate_chunk(model, time, params, body_weight, variability, sizes[0], seeds[0], options)
+    start = _hist_start(first)
+    counts, above = _reduce(first, start, onset_concentration)
+    del first
+    if n_workers is None:
+        n_workers = min(os.cpu_count() or 1, n_chunks - 1) if n_patients >= PARALLEL_THRESHOLD else 1
+    jobs = [(model, time, params, body_weight, variability, size, s, options, start, onset_concentration)
+            for size, s in zip(sizes[1:], seeds[1:])]
+    if n_workers > 1:
+        # spawn: 스레드가 도는 Streamlit 서버 프로세스를 fork하지 않음 (rendering.py와 같은 이유)
+        with ProcessPoolExecutor(max_workers=n_workers, mp_context=multiprocessing.get_context('spawn')) as pool:
+            reduced = pool.map(_reduce_chunk, *zip(*jobs))
+            for chunk_counts, chunk_above in reduced:
+                counts += chunk_counts
+                if above is not None:
+                    above += chunk_above
+    else:
+        for job in jobs:
+            chunk_counts, chunk_above = _reduce_chunk(*job)
+            counts += chunk_counts
+            if above is not None:
+                above += chunk_above
+
+    result = {
+        'time': time,
+        'percentiles': hist_percentiles(counts, start),
+        'n_patients': n_patients,
+    }
+    if onset_concentration is not None:
+        result['onset_concentration'] = onset_concentration
+        result['fraction_above_onset'] = above / n_patients
+    return result
+
+
+shared_population = shared()(simulate_population)  # 세션 간 공유: 시드가 고정이라 같은 인자면 같은 결과
+
+
+def population_figure(result, title, unit='ng/mL'):
+    # 중앙값과 5–95% 구간, 약효 기준 농도 이상 환자 비율
+    from matplotlib.figure import Figure
+
+    time = result['time']
+    pct = result['percentiles']
+    has_fraction = 'fraction_above_onset' in result
+    fig = Figure(figsize=(10, 7 if has_fraction else 5))
+    axes = fig.subplots(2 if has_fraction else 1, 1, sharex=True, squeeze=False,
+                        gridspec_kw={'height_ratios': [3, 1]} if has_fraction else None)[:, 0]
+    ax = axes[0]
+    ax.fill_between(time, pct[5], pct[95], alpha=0.3, label='5–95% 구간')
+    ax.plot(time, pct[50], lw=2, label='중앙값')
+    if 'onset_concentration' in result:
+        ax.axhline(result['onset_concentration'], linestyle='--', color='blue',
+                   label=f"약효 기준 농도: {result['onset_concentration']:.2f} {unit}")
+    ax.set_title(f"{title} (가상 환자 {result['n_patients']}명)")
+    ax.set_ylabel(f"혈중 농도 ({unit})")
+    ax.grid(True, linestyle=':')
+    ax.legend()
+    ax.set_ylim(0)
+    if has_fraction:
+        axes[1].plot(time, result['fraction_above_onset'] * 100, color='green')
+        axes[1].set_ylabel("기준 이상 (%)")
+        axes[1].set_ylim(0, 100)
+        axes[1].grid(True, linestyle=':')
+    axes[-1].set_xlabel("시간 (hours)")
+    return fig
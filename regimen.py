@@ -0,0 +1,154 @@
+import numpy as np
+
+from pk_models import ORAL_SCALE, _exp_diff, rate_constants
+
+# 투여 경로
+ROUTE_ORAL = 'oral'    # 1차 흡수 (ka)
+ROUTE_IV = 'iv'        # 즉시 중심구획으로
+ROUTE_PATCH = 'patch'  # patch_duration_hour 동안 제로오더 흡수, 제거 후 tau_off가 있으면 워시아웃
+
+
+def regular_regimen(dose, tau, n_doses, start=0.0, route=ROUTE_ORAL, loading_dose=None, missed=(), delays=None):
+    # 일정한 간격의 투여 일정을 (시각, 용량, 경로) 목록으로 만듦
+    #   loading_dose: 첫 투여 용량 (없으면 dose)
+    #   missed: 빠뜨린 투여 번호 (0부터), delays: {투여 번호: 늦어진 시간(h)}
+    delays = delays or {}
+    events = []
+    for i in range(int(n_doses)):
+        if i in missed:
+            continue
+        d = loading_dose if (i == 0 and loading_dose is not None) else dose
+        events.append((start + i * tau + delays.get(i, 0.0), d, route))
+    return events
+
+
+def _breakpoints(events, F, patch_duration_hour, tau_off):
+    # 투여 이벤트를 상태 변화(시각, 위장관 Δ, 피부 잔여 Δ, 중심구획 Δ, 흡수속도 Δ) 목록으로 바꿈. 단위 mg, mg/hr
+    # 패치 이벤트는 (시각, 용량, 경로, 실제 부착 시간)으로 일찍 뗀 경우를 나타낼 수 있음 (전달 속도는 그대로)
+    rows = []
+    for t, dose, route, *wear in events:
+        if route == ROUTE_ORAL:
+            rows.append((t, F * dose, 0.0, 0.0, 0.0))
+        elif route == ROUTE_IV:
+            rows.append((t, 0.0, 0.0, dose, 0.0))
+        elif route == ROUTE_PATCH:
+            if not patch_duration_hour or patch_duration_hour <= 0:
+                raise ValueError("패치 투여에는 patch_duration_hour가 필요합니다.")
+            R = F * dose / patch_duration_hour
+            rows.append((t, 0.0, 0.0, 0.0, R))
+            # 제거 시점: 흡수 중단, 워시아웃이면 피부에 R·tau_off 만큼 남아 1/tau_off 속도로 흡수
+            skin = R * tau_off if tau_off else 0.0
+            rows.append((t + (wear[0] if wear else patch_duration_hour), 0.0, skin, 0.0, -R))
+        else:
+            raise ValueError(f"알 수 없는 투여 경로: {route}")
+    if not rows:
+        return np.zeros((0, 5))
+    bp = np.array(rows, dtype=np.float64)
+    return bp[np.argsort(bp[:, 0], kind='stable')]
+
+
+def _propagate(Ag, As, Ac, R, s, k, ka, a):
+    # 상태 (위장관 Ag, 피부 잔여 As, 중심구획 Ac, 제로오더 흡수속도 R)를 s 시간만큼 해석적으로 진행
+    ek = np.exp(-k * s)
+    Ac_new = (Ac * ek
+              + ka * Ag * _exp_diff(k, ka, s)
+              + a * As * _exp_diff(k, a, s)
+              + R * (-np.expm1(-k * s)) / k)
+    return Ag * np.exp(-ka * s), As * np.exp(-a * s), Ac_new
+
+
+def regimen_rates(t_half, t_max, tau_off=None):
+    # 상태 진행에 쓰는 속도상수 (k, ka, 피부 잔여 흡수 a)
+    k, ka = rate_constants(t_half, t_max)
+    a = 1.0 / tau_off if tau_off else 1.0  # 피부 잔여량이 없으면 a 값은 결과에 영향 없음
+    return float(k), float(ka), a
+
+
+def advance_states(bp, state, t_state, k, ka, a):
+    # state(Ag, As, Ac, R)를 t_state에서 시작해 이벤트 bp를 차례로 반영. 각 이벤트 직후 상태 (len(bp), 4)
+    # 약물 여러 개를 함께: bp (이벤트 수, 약물 수, 5), state 항목·t_state·속도상수는 약물별 배열 → (이벤트 수, 약물 수, 4)
+    out = np.empty(bp.shape[:-1] + (4,))
+    Ag, As, Ac, R = state
+    t_prev = t_state
+    for i in range(len(bp)):
+        t_i, dAg, dAs, dAc, dR = np.moveaxis(bp[i], -1, 0)
+        Ag, As, Ac = _propagate(Ag, As, Ac, R, t_i - t_prev, k, ka, a)
+        Ag = Ag + dAg
+        As = As + dAs
+        Ac = Ac + dAc
+        R = R + dR
+        R = np.where(R < 1e-12, 0.0, R)  # 패치 제거 후 남는 반올림 오차 정리
+        out[i] = np.stack([Ag, As, Ac, R], axis=-1)
+        t_prev = t_i
+    return out
+
+
+def evaluate_states(time, state_times, states, k, ka, a):
+    # 각 시점의 직전 상태에서 해석적으로 진행한 중심구획 양 (mg). 첫 상태 이전 시점은 0
+    idx = np.searchsorted(state_times, time, side='right') - 1
+    before = idx < 0
+    idx = np.maximum(idx, 0)
+    s = np.where(before, 0.0, time - state_times[idx])
+    st = states[idx]
+    _, _, Ac_t = _propagate(st[..., 0], st[..., 1], st[..., 2], st[..., 3], s, k, ka, a)
+    return np.where(before, 0.0, Ac_t)
+
+
+def simulate_regimen(time, events, F, V_d, t_half, t_max, body_weight,
+                     patch_duration_hour=None, tau_off=None, scale=ORAL_SCALE):
+    # 임의의 투여 일정 [(시각 h, 용량 mg, 경로), ...]에 대한 1-컴파트먼트 농도 (선형 중첩)
+    # 이벤트마다 상태를 해석적으로 다음 이벤트까지 넘기고(O(이벤트 수)),
+    # 각 시점은 직전 이벤트의 상태에서 한 번에 계산(O(시점 수)) → 이벤트 수 × 시점 수에 비례하지 않음
+    time = np.asarray(time, dtype=np.float64)
+    k, ka, a = regimen_rates(t_half, t_max, tau_off)
+    Vd_total = V_d * body_weight
+
+    bp = _breakpoints(events, F, patch_duration_hour, tau_off)
+    if len(bp) == 0:
+        return np.zeros_like(time)
+
+    states = advance_states(bp, (0.0, 0.0, 0.0, 0.0), bp[0, 0], k, ka, a)
+    conc = evaluate_states(time, bp[:, 0], states, k, ka, a) / Vd_total
+    return np.maximum(conc, 0.0) * scale
+
+
+def _given(x):
+    # 약물별 배열의 NaN은 "없음" (패치가 아닌 약물의 patch_duration_hour, 워시아웃이 없는 tau_off)
+    return float(x) if np.isfinite(x) else None
+
+
+def simulate_regimen_batch(time, schedules, F, V_d, t_half, t_max, body_weight,
+                           patch_duration_hour=np.nan, tau_off=np.nan, scale=ORAL_SCALE):
+    # 투여 일정 여러 개를 같은 time 위에서 한 번에 → (일정 수, 시점 수). schedules[j]는 simulate_regimen의 events
+    # 파라미터는 일정별 배열 또는 공통 스칼라. 이벤트 번호마다 모든 일정의 상태를 함께 진행하고
+    # (이벤트가 적은 일정은 마지막 상태를 길이 0으로 반복), 시점은 일정별 직전 상태에서 한 번에 계산
+    time = np.asarray(time, dtype=np.float64)
+    n = len(schedules)
+    F, V_d, t_half, t_max, T, tau_off, scale = (
+        np.broadcast_to(np.asarray(x, dtype=np.float64), (n,))
+        for x in (F, V_d, t_half, t_max, patch_duration_hour, tau_off, scale))
+    k, ka = rate_constants(t_half, t_max)
+    a = np.where(tau_off > 0, 1.0 / np.where(tau_off > 0, tau_off, 1.0), 1.0)
+
+    bps = [_breakpoints(events, F[j], _given(T[j]), _given(tau_off[j])) for j, events in enumerate(schedules)]
+    n_events = max((len(bp) for bp in bps), default=0)
+    if n_events == 0:
+        return np.zeros((n, len(time)))
+    # 이벤트가 없는 일정은 모든 시점보다 늦은 빈 이벤트만 두어 농도 0
+    after = np.max(time, initial=0.0) + 1.0
+    bp = np.zeros((n_events, n, 5))
+    for j, rows in enumerate(bps):
+        bp[:len(rows), j] = rows
+        bp[len(rows):, j, 0] = rows[-1, 0] if len(rows) else after
+
+    states = advance_states(bp, np.zeros((4, n)), bp[0, :, 0], k, ka, a)  # (이벤트 수, 일정 수, 4)
+    state_times = bp[:, :, 0].T
+    idx = np.array([np.searchsorted(row, time, side='right') for row in state_times]).reshape(n, -1) - 1
+    before = idx < 0
+    idx = np.maximum(idx, 0)
+    st = states[idx, np.arange(n)[:, None]]  # (일정 수, 시점 수, 4)
+    s = np.where(before, 0.0, time - np.take_along_axis(state_times, idx, axis=1))
+    _, _, Ac = _propagate(st[..., 0], st[..., 1], st[..., 2], st[..., 3], s,
+                          k[:, None], ka[:, None], a[:, None])
+    conc = np.where(before, 0.0, Ac) / (V_d * body_weight)[:, None]
+    return np.maximum(conc, 0.0) * scale[:, None]
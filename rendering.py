@@ -0,0 +1,123 @@
+import atexit
+import io
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+from bootstrap import setup_fonts
+from compute_cache import ComputeCache, content_key
+from perf import stage
+
+# 그림 렌더링 서비스: Figure를 만드는 함수와 인자를 받아 PNG/SVG 바이트를 돌려줌.
+# - (함수, 인자, 스타일, 형식)의 해시로 바이트를 캐시 (compute_cache: LRU + TTL + 전체 바이트 수 상한)
+# - 여러 세션이 같은 그림을 동시에 요청하면 한 세션만 그리고 나머지는 기다림 (single-flight)
+# - 캐시에 없는 그림이 여러 개면 작업 프로세스 풀에서 나눠 그림 (Streamlit 스크립트 스레드와 GIL을 쓰지 않음)
+# - pyplot을 거치지 않는 Agg Figure를 쓰고, 저장 후 바로 비워서 오래 도는 서버에서도 그림이 쌓이지 않음
+# builder는 모듈 최상위 함수여야 하고 pyplot 상태를 쓰지 않는 Figure 객체를 돌려줌
+# (figures.py, population.population_figure, streaming.daily_envelope_figure 등)
+
+FIGURE_CACHE_BYTES = 64 * 1024 * 1024  # 캐시 메모리 상한
+FIGURE_CACHE_TTL = 6 * 3600  # 초
+PARALLEL_MIN = 4  # 캐시에 없는 그림이 이 수 이상이면 프로세스 풀 사용
+MAX_WORKERS = 4
+DPI = 150
+STYLE_KEYS = ('font.family', 'axes.unicode_minus')  # 작업 프로세스로 넘기는 rcParams
+
+_cache = ComputeCache('figures', FIGURE_CACHE_BYTES, ttl=FIGURE_CACHE_TTL, size=len)  # 키 → 바이트
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def current_style():
+    # 지금 프로세스의 폰트 설정 (한글 폰트를 작업 프로세스에도 적용). matplotlib는 여기서 처음 불러옴
+    setup_fonts()
+    from matplotlib import rcParams
+
+    return {key: rcParams[key] for key in STYLE_KEYS}
+
+
+def figure_key(builder, args, kwargs, style, fmt, dpi):
+    return content_key(builder, fmt, dpi, style, tuple(args), kwargs)
+
+
+def _render(builder, args, kwargs, style, fmt, dpi):
+    # 그림 하나를 바이트로. 저장 후 Figure를 비워 메모리를 바로 돌려줌
+    setup_fonts()  # 작업 프로세스에도 폰트 파일 등록
+    from matplotlib import rc_context
+
+    with rc_context(style):
+        fig = builder(*args, **kwargs)
+        try:
+            buf = io.BytesIO()
+            fig.savefig(buf, format=fmt, dpi=dpi, bbox_inches='tight')
+            return buf.getvalue()
+        finally:
+            fig.clear()
+            del fig
+
+
+def _get_pool():
+    # spawn: 스레드가 도는 서버 프로세스를 fork하지 않음. 한 번 띄운 풀은 재실행(rerun) 사이에 재사용
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            workers = min(MAX_WORKERS, os.cpu_count() or 1)
+            _pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn'))
+        return _pool
+
+
+def shutdown_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=False, cancel_futures=True)
+            _pool = None
+
+
+atexit.register(shutdown_pool)
+
+
+def _render_tasks(tasks, parallel):
+    if parallel and len(tasks) >= PARALLEL_MIN and (os.cpu_count() or 1) > 1:
+        try:
+            return list(_get_pool().map(_render, *zip(*tasks)))
+        except Exception as e:  # 풀을 쓸 수 없는 환경이면 이 스레드에서
+            print(f"⚠️ 그림 작업 프로세스 실패, 순차 렌더링: {e}")
+            shutdown_pool()
+    return [_render(*task) for task in tasks]
+
+
+def render_many(jobs, fmt='png', style=None, dpi=DPI, parallel=True):
+    # jobs: [(builder, args, kwargs), ...] → 같은 순서의 바이트 목록.
+    # 캐시에 없고 다른 세션이 그리는 중도 아닌 그림만 그림
+    with stage('render', figures=len(jobs), rendered=0, fmt=fmt) as s:
+        style = current_style() if style is None else style
+        keys = [figure_key(b, a, k, style, fmt, dpi) for b, a, k in jobs]
+
+        def compute(miss):
+            s['rendered'] = len(miss)
+            return _render_tasks([(*jobs[i], style, fmt, dpi) for i in miss], parallel)
+
+        out = _cache.get_many(keys, compute)
+        s['bytes'] = sum(len(data) for data in out)  # 브라우저로 보내는 이미지 크기
+    return out
+
+
+def render(builder, *args, fmt='png', style=None, dpi=DPI, **kwargs):
+    # 그림 한 장 (캐시 사용, 이 스레드에서 렌더링)
+    return render_many([(builder, args, kwargs)], fmt=fmt, style=style, dpi=dpi, parallel=False)[0]
+
+
+def figure_job(builder, *args, **kwargs):
+    return builder, args, kwargs
+
+
+def cache_info():
+    info = _cache.info()
+    info['figures'] = info.pop('entries')
+    return info
+
+
+def clear_figure_cache():
+    _cache.clear()
@@ -0,0 +1,190 @@
+import argparse
+import os
+import re
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from bootstrap import setup_fonts
+from params import ORAL_ROUTES, PATCH_ROUTES, REQUIRED_COLUMNS
+from pk_metrics import model_metrics, oral_multi_dose_metrics
+from pk_models import simulate_batch
+from steady_state import oral_steady_state
+
+# Streamlit 없이 모든 약물 × 모든 페이지 모델의 지표와 곡선을 계산해 파일로 저장하는 배치 리포트.
+#   python report.py --out reports --format parquet csv --figures png
+# 모델별로 약물을 나눠 프로세스 풀에서 계산·그림 저장. 결과를 매일 다시 만들어 이전 파일과 비교(diff)할 수 있도록
+# 행 순서는 모델 → 시트 순서로 고정하고 CSV는 유효숫자 6자리로 쓴다.
+
+BODY_WEIGHT = 70
+N_DOSES = 4
+PATCH_REQUIRED = REQUIRED_COLUMNS + ('patch_duration_hour',)
+
+# 페이지와 같은 약물 선택·격자
+REPORT_MODELS = {
+    'oral_single': {'select': {'routes': ORAL_ROUTES}, 'required': REQUIRED_COLUMNS, 'n_points': 300},
+    'oral_multi_dose': {'select': {'routes': ORAL_ROUTES}, 'required': ('D', 'F', 'V_d', 't_half', 't_max', 'tau'),
+                        'n_points': 1000},
+    'patch_zero_order': {'select': {'contains': PATCH_ROUTES[0]}, 'required': PATCH_REQUIRED, 'n_points': 500},
+    'patch_washout': {'select': {'contains': PATCH_ROUTES[0]}, 'required': PATCH_REQUIRED, 'n_points': 500},
+}
+TABLE_FORMATS = ('parquet', 'csv')
+FIGURE_FORMATS = ('png', 'svg')
+CSV_FLOAT_FORMAT = '%.6g'
+
+
+def compute_model(model, drugs, body_weight=BODY_WEIGHT, n_doses=N_DOSES, n_points=None):
+    # 한 모델의 약물별 지표 dict(배열)와 곡선 (약물 수, 점 수). n_points가 없으면 페이지와 같은 격자
+    n_points = REPORT_MODELS[model]['n_points'] if n_points is None else n_points
+    if model == 'oral_multi_dose':
+        time, conc = simulate_batch(drugs, model, n_points, body_weight, n_doses=n_doses)
+        metrics = oral_multi_dose_metrics(drugs.D, drugs.F, drugs.V_d, drugs.t_half, drugs.t_max, drugs.tau, n_doses,
+                                          body_weight)
+        metrics.update(oral_steady_state(drugs.D, drugs.F, drugs.V_d, drugs.t_half, drugs.t_max, drugs.tau,
+                                         body_weight))
+    else:
+        time, conc = simulate_batch(drugs, model, n_points, body_weight)
+        metrics = model_metrics(drugs, model, body_weight)
+    return {k: np.broadcast_to(np.asarray(v, dtype=np.float64), (len(drugs),)) for k, v in metrics.items()}, time, conc
+
+
+def _safe_name(name):
+    return re.sub(r'[\\/:*?"<>|\s]+', '_', str(name)).strip('_') or 'drug'
+
+
+def report_figure(drug_name, model, time, concentration, metrics):
+    # 약물 한 개의 곡선과 Tmax·약효 기준·약효 종료 표시
+    from matplotlib.figure import Figure
+
+    fig = Figure(figsize=(10, 6))
+    ax = fig.subplots()
+    ax.plot(time, concentration, lw=2, label='혈중 농도')
+    if np.isfinite(metrics.get('onset_concentration', np.nan)):
+        ax.axhline(metrics['onset_concentration'], color='blue', linestyle='--',
+                   label=f"약효 기준 농도: {metrics['onset_concentration']:.2f}")
+    if np.isfinite(metrics.get('tmax', np.nan)):
+        ax.axvline(metrics['tmax'], color='red', linestyle='--', label=f"Tmax: {metrics['tmax']:.1f}h")
+    if np.isfinite(metrics.get('effect_end', np.nan)):
+        ax.axvline(metrics['effect_end'], color='orange', linestyle='--',
+                   label=f"약효 종료 시간: {metrics['effect_end']:.1f}h")
+    ax.set_title(f'{drug_name} - {model}')
+    ax.set_xlabel("시간 (hours)")
+    ax.set_ylabel("혈중 농도")
+    ax.grid(True, linestyle=':')
+    ax.legend()
+    ax.set_xlim(time[0], time[-1])
+    ax.set_ylim(0)
+    return fig
+
+
+def run_job(model, drugs, body_weight, n_doses, figure_dir=None, figure_formats=()):
+    # 프로세스 풀 작업 하나: 약물 묶음 하나의 지표·곡선 DataFrame, 요청하면 그림 파일 저장
+    metrics, time, conc = compute_model(model, drugs, body_weight, n_doses)
+    metrics_frame = pd.DataFrame({'model': model, 'drug_name': drugs.drug_name, 'route': drugs.route,
+                                  'kinetics': drugs.kinds, **metrics})
+    m = time.shape[1]
+    curves_frame = pd.DataFrame({
+        'model': model,
+        'drug_name': np.repeat(drugs.drug_name, m),
+        'time_hour': time.ravel(),
+        'concentration': conc.ravel(),
+    })
+    if figure_dir and figure_formats:
+        setup_fonts()  # 페이지와 같은 한글 폰트 (없으면 기본 폰트)
+        out_dir = os.path.join(figure_dir, model)
+        os.makedirs(out_dir, exist_ok=True)
+        for i in range(len(drugs)):
+            fig = report_figure(drugs.drug_name[i], model, time[i], conc[i], {k: v[i] for k, v in metrics.items()})
+            for fmt in figure_formats:
+                fig.savefig(os.path.join(out_dir, f'{_safe_name(drugs.drug_name[i])}.{fmt}'), format=fmt, dpi=100)
+    return metrics_frame, curves_frame
+
+
+def plan_jobs(table, models, n_workers, body_weight, n_doses, figure_dir=None, figure_formats=()):
+    # 모델별 약물을 작업자 수만큼 나눔 (그림을 그리지 않으면 계산이 배열 한 번이라 모델당 한 작업)
+    jobs = []
+    for model in models:
+        spec = REPORT_MODELS[model]
+        drugs = table.select(required=spec['required'], **spec['select'])
+        n_chunks = max(1, min(n_workers, len(drugs))) if figure_formats else 1
+        for rows in np.array_split(np.arange(len(drugs)), n_chunks):
+            if len(rows):
+                jobs.append((model, drugs.take(rows), body_weight, n_doses, figure_dir, tuple(figure_formats)))
+    return jobs
+
+
+def build_report(table, models=tuple(REPORT_MODELS), body_weight=BODY_WEIGHT, n_doses=N_DOSES, n_workers=None,
+                 figure_dir=None, figure_formats=()):
+    # 반환: (지표 DataFrame, 곡선 DataFrame). 행 순서는 models 순서 → 시트 순서
+    n_workers = n_workers or os.cpu_count() or 1
+    jobs = plan_jobs(table, models, n_workers, body_weight, n_doses, figure_dir, figure_formats)
+    if n_workers > 1 and len(jobs) > 1:
+        with ProcessPoolExecutor(max_workers=min(n_workers, len(jobs))) as pool:
+            results = list(pool.map(run_job, *zip(*jobs)))
+    else:
+        results = [run_job(*job) for job in jobs]
+    if not results:
+        return pd.DataFrame(), pd.DataFrame()
+    metrics = pd.concat([r[0] for r in results], ignore_index=True)
+    curves = pd.concat([r[1] for r in results], ignore_index=True)
+    return metrics, curves
+
+
+def write_table(df, path_stem, formats):
+    paths = []
+    for fmt in formats:
+        path = f'{path_stem}.{fmt}'
+        if fmt == 'parquet':
+            df.to_parquet(path, index=False)
+        else:
+            df.to_csv(path, index=False, float_format=CSV_FLOAT_FORMAT)
+        paths.append(path)
+    return paths
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="모든 약물의 PK 지표·곡선 배치 리포트 (Streamlit 없이 실행)")
+    parser.add_argument('--source', help="데이터 소스 (sample | csv:경로 | sqlite:경로#테이블 | parquet:경로). "
+                                         "없으면 ABCGRAPH_DATA_SOURCE 또는 Google Sheet")
+    parser.add_argument('--out', default='reports', help="결과 폴더 (기본: reports)")
+    parser.add_argument('--format', nargs='+', choices=TABLE_FORMATS, default=list(TABLE_FORMATS),
+                        help="지표·곡선 파일 형식")
+    parser.add_argument('--figures', nargs='*', choices=FIGURE_FORMATS, default=[],
+                        help="약물별 그림 형식 (생략하면 그림 없음)")
+    parser.add_argument('--models', nargs='+', choices=tuple(REPORT_MODELS), default=list(REPORT_MODELS))
+    parser.add_argument('--no-curves', action='store_true', help="곡선 파일은 쓰지 않음")
+    parser.add_argument('--body-weight', type=float, default=BODY_WEIGHT)
+    parser.add_argument('--n-doses', type=int, default=N_DOSES, help="연속 복용 모델의 복용 횟수")
+    parser.add_argument('--workers', type=int, default=None, help="프로세스 수 (기본: CPU 수, 1 = 순차)")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    from functions import get_param_table, set_source
+
+    if args.source:
+        from data_sources import get_data_source
+
+        set_source(get_data_source(args.source))
+    started = time.perf_counter()
+    table = get_param_table()
+    os.makedirs(args.out, exist_ok=True)
+    figure_dir = os.path.join(args.out, 'figures') if args.figures else None
+    metrics, curves = build_report(table, args.models, args.body_weight, args.n_doses, args.workers,
+                                   figure_dir, args.figures)
+
+    paths = write_table(metrics, os.path.join(args.out, 'metrics'), args.format)
+    if not args.no_curves:
+        paths += write_table(curves, os.path.join(args.out, 'curves'), args.format)
+    for path in paths:
+        print(path)
+    print(f"{len(metrics)}개 (약물 × 모델), {time.perf_counter() - started:.2f}s")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,124 @@
+import numpy as np
+
+from pk_metrics import oral_single_metrics, patch_metrics
+from pk_models import ORAL_SCALE, PATCH_SCALE
+from regimen import ROUTE_ORAL, ROUTE_PATCH, simulate_regimen_batch
+
+# 약물 전환(로테이션) / 교차 감량 시뮬레이션.
+# 여러 약물의 투여 일정을 같은 시간축에 겹쳐 계산하고, 약물마다 농도를 자기 약효 기준 농도로 나눈 값
+# (1 = 기준선)에 등가 진통 가중치를 곱해 더한 "합산 효과"로 공백(gap)과 과다 중첩(overlap)을 찾는다.
+# 투여 일정은 regimen.py의 1-컴파트먼트 엔진으로 계산하므로 시트 model 컬럼(2cmt, mm)은 반영하지 않는다.
+
+ORAL_MODEL = 'oral_single'
+PATCH_MODELS = ('patch_zero_order', 'patch_washout')
+GAP_LEVEL = 1.0      # 합산 효과가 이보다 낮으면 공백
+OVERLAP_LEVEL = 2.0  # 두 약물 이상이 함께 작용하면서 합산 효과가 이보다 높으면 과다 중첩
+CONTRIBUTION_LEVEL = 0.25  # 약물 하나의 효과가 이 이상이면 "작용 중"으로 봄
+
+
+def leg_events(row, model, start, stop, dose=None, tau=None, steps=()):
+    # start부터 stop 전까지 tau 간격으로 투여하는 이벤트. 패치는 늦어도 stop에 떼어냄
+    # steps: [(시각 h, 용량 mg), ...] 그 시각부터 쓰는 용량 (교차 감량의 단계적 감량·증량). 용량이 0인 회차는 건너뜀
+    dose = row['D'] if dose is None else dose
+    tau = row['tau'] if tau is None else tau
+    times = np.arange(start, stop, tau) if stop > start else np.zeros(0)
+    doses = np.full(len(times), float(dose))
+    if len(steps):
+        at, step_dose = np.array(sorted(steps), dtype=np.float64).T
+        i = np.searchsorted(at, times, side='right') - 1
+        doses = np.where(i >= 0, step_dose[np.maximum(i, 0)], doses)
+    times, doses = times[doses > 0], doses[doses > 0]
+    if model == ORAL_MODEL:
+        return [(float(t), float(d), ROUTE_ORAL) for t, d in zip(times, doses)]
+    T = row['patch_duration_hour']
+    return [(float(t), float(d), ROUTE_PATCH, float(min(T, stop - t))) for t, d in zip(times, doses)]
+
+
+def leg_onset_concentration(row, model, body_weight):
+    # 페이지 1/3/4와 같은 기준선: 시트 용량 1회 투여 시 약효 시작 시점의 농도
+    if model == ORAL_MODEL:
+        m = oral_single_metrics(row['D'], row['F'], row['V_d'], row['t_half'], row['t_max'], body_weight,
+                                row['onset_time_hour'])
+    else:
+        tau_off = row['tau_off'] if model == 'patch_washout' else None
+        m = patch_metrics(row['D'], row['F'], row['V_d'], row['t_half'], row['patch_duration_hour'], body_weight,
+                          row['onset_time_hour'], tau_off)
+    return m['onset_concentration']
+
+
+def _runs(time, mask):
+    # mask가 연속으로 True인 구간들의 (시작, 끝) 시각
+    edges = np.diff(np.r_[0, mask.astype(np.int8), 0])
+    starts = np.flatnonzero(edges == 1)
+    ends = np.flatnonzero(edges == -1) - 1
+    return [(float(time[a]), float(time[b])) for a, b in zip(starts, ends)]
+
+
+def simulate_rotation(time, legs, body_weight, gap_level=GAP_LEVEL, overlap_level=OVERLAP_LEVEL):
+    # legs: [{'row': 시트 행 dict, 'model': 모델 이름, 'events': 투여 이벤트, 'factor': 등가 진통 가중치}, ...]
+    # 모든 약물의 일정을 simulate_regimen_batch 한 번으로 (약물 수, 시점 수) 계산 (이벤트 수 + 시점 수에 비례)
+    # 약효 기준 농도가 없는 약물(onset_time_hour = 0 등)이 있으면 효과는 NaN, 공백·과다 중첩은 찾지 않음 (valid)
+    time = np.asarray(time, dtype=np.float64)
+    rows = [leg['row'] for leg in legs]
+    models = [leg['model'] for leg in legs]
+    patch = np.array([model in PATCH_MODELS for model in models], dtype=bool)
+    washout = np.array([model == 'patch_washout' for model in models], dtype=bool)
+
+    def column(name):
+        return np.array([row[name] for row in rows], dtype=np.float64)
+
+    concentration = simulate_regimen_batch(
+        time, [leg['events'] for leg in legs], column('F'), column('V_d'), column('t_half'), column('t_max'),
+        body_weight, patch_duration_hour=np.where(patch, column('patch_duration_hour'), np.nan),
+        tau_off=np.where(washout, column('tau_off'), np.nan), scale=np.where(patch, PATCH_SCALE, ORAL_SCALE))
+    onset = np.array([leg_onset_concentration(row, model, body_weight) for row, model in zip(rows, models)])
+
+    factor = np.array([leg.get('factor', 1.0) for leg in legs])
+    valid = np.isfinite(onset) & (onset > 0)
+    effect = np.full_like(concentration, np.nan)
+    effect[valid] = concentration[valid] / onset[valid, None] * factor[valid, None]
+    combined = effect.sum(axis=0)
+    gaps, overlaps = [], []
+    if valid.all():
+        # 처음 기준선에 도달하기 전(첫 투여 직후)은 공백으로 보지 않음
+        reached = np.flatnonzero(combined >= gap_level)
+        started = time >= time[reached[0]] if len(reached) else np.zeros(len(time), dtype=bool)
+        gaps = _runs(time, started & (combined < gap_level))
+        overlaps = _runs(time, (combined > overlap_level) & (np.sum(effect >= CONTRIBUTION_LEVEL, axis=0) >= 2))
+    return {
+        'time': time,
+        'concentration': concentration,
+        'onset_concentration': onset,
+        'valid': valid,
+        'effect': effect,
+        'combined': combined,
+        'gaps': gaps,
+        'overlaps': overlaps,
+    }
+
+
+def rotation_figure(result, names, switch_time=None, gap_level=GAP_LEVEL, overlap_level=OVERLAP_LEVEL):
+    # 약물별 효과와 합산 효과, 공백(빨강)·과다 중첩(주황) 구간
+    from matplotlib.figure import Figure
+
+    fig = Figure(figsize=(10, 6))
+    ax = fig.subplots()
+    time = result['time']
+    for name, effect in zip(names, result['effect']):
+        ax.plot(time, effect, lw=1.5, label=name)
+    ax.plot(time, result['combined'], color='black', lw=2, label='합산 효과')
+    ax.axhline(gap_level, color='blue', linestyle='--', label='약효 기준')
+    ax.axhline(overlap_level, color='red', linestyle=':', label='과다 중첩 기준')
+    for start, end in result['gaps']:
+        ax.axvspan(start, end, color='red', alpha=0.15)
+    for start, end in result['overlaps']:
+        ax.axvspan(start, end, color='orange', alpha=0.2)
+    if switch_time is not None:
+        ax.axvline(switch_time, color='gray', linestyle='-.', label=f'전환: {switch_time:.0f}h')
+    ax.set_xlabel("시간 (hours)")
+    ax.set_ylabel("효과 (약효 기준 농도 = 1)")
+    ax.grid(True, linestyle=':')
+    ax.legend()
+    ax.set_xlim(time[0], time[-1])
+    ax.set_ylim(0)
+    return fig
@@ -0,0 +1,57 @@
+import numpy as np
+import pandas as pd
+
+from params import DEFAULT_MODEL
+
+# 페이지 공통: 전체 약물 요약 표(해석식 지표, 곡선 계산 없음)를 먼저 보여 주고,
+# 곡선 계산·그래프는 사용자가 고른 약물만. 약물이 수백 개가 되어도 첫 화면 비용이 거의 같다.
+# 해석식이 없는 비선형 소실(mm) 약물은 요약 표에서 비워 두고 고른 뒤에 계산 (ODE)
+
+DEFAULT_SELECTED = 1  # 처음 열 때 그래프를 그릴 약물 수 (시트 순서 앞쪽부터)
+NUMERIC_NOTE = "비선형 소실(mm) 약물은 해석식이 없어 요약 표에서 비워 두었습니다. 그래프를 볼 약물로 고르면 계산합니다."
+
+# 지표 키 → 표 컬럼 이름
+SUMMARY_COLUMNS = {
+    'cmax': 'Cmax (ng/mL)',
+    'tmax': 'Tmax (h)',
+    'onset_concentration': '약효 기준 농도 (ng/mL)',
+    'effect_end': '약효 종료 (h)',
+    'effect_duration': '약효 지속 (h)',
+    'css_max': 'Css,max (ng/mL)',
+    'css_min': 'Css,min (ng/mL)',
+    'css_avg': 'Css,avg (ng/mL)',
+    't_ss_90': '정상상태 90% (h)',
+}
+
+
+def summary_frame(drugs, metrics, keys):
+    # 약물별 지표 배열 dict → 요약 표 (행별 변환 없이 컬럼 단위로)
+    df = pd.DataFrame({'약물': drugs.drug_name})
+    for key in keys:
+        df[SUMMARY_COLUMNS.get(key, key)] = np.asarray(metrics[key], dtype=np.float64)
+    return df.round(2)
+
+
+def pick_drugs(drugs, default=DEFAULT_SELECTED, label="그래프를 볼 약물 (검색 가능)"):
+    # 검색 가능한 약물 선택 → 고른 약물의 행 번호 (시트 순서)
+    import streamlit as st
+
+    options = list(range(len(drugs)))
+    picked = st.multiselect(label, options, default=options[:default], format_func=lambda i: drugs.drug_name[i])
+    return np.array(sorted(picked), dtype=int)
+
+
+def take_metrics(metrics, rows):
+    return {key: np.asarray(v)[rows] for key, v in metrics.items()}
+
+
+def one_compartment_only(drugs, elsewhere):
+    # 1-컴파트먼트 모델만 계산하는 페이지(연속복용, 워시아웃 패치): 시트 model 컬럼이 2cmt·mm인 약물은 빼고 안내
+    # elsewhere: 그 약물을 볼 수 있는 페이지 이름
+    import streamlit as st
+
+    other = drugs.kinds != DEFAULT_MODEL
+    if other.any():
+        st.info(f"{', '.join(drugs.drug_name[other])}: 이 페이지는 1-컴파트먼트 모델만 계산하므로 "
+                f"시트 model 컬럼이 2cmt·mm인 약물은 제외했습니다 ({elsewhere}에서 볼 수 있습니다).")
+    return drugs.take(~other)
@@ -0,0 +1,162 @@
+import numpy as np
+
+from params import DEFAULT_MODEL
+from pk_metrics import _finish
+from pk_models import LN2, ORAL_SCALE, PATCH_SCALE, _as_column, rate_constants
+
+# 반복 투여를 한 번씩 앞으로 시뮬레이션하지 않고 정상상태(steady state)를 바로 계산
+# 모든 함수는 약물별 파라미터 배열을 받아 약물별 값을 돌려줌 (스칼라를 넣으면 스칼라)
+
+GOLDEN = (np.sqrt(5.0) - 1.0) / 2.0
+STEADY_KEYS = ('css_max', 'css_min', 'css_avg', 'tmax_ss', 'accumulation_ratio', 't_ss_90', 't_ss_95')
+
+
+def accumulation_ratio(rate, tau):
+    # 1 / (1 - e^(-r·tau))
+    return 1.0 / -np.expm1(-np.asarray(rate, dtype=np.float64) * tau)
+
+
+def time_to_steady_state(t_half, fraction=0.9):
+    # 평균 농도가 정상상태의 fraction에 도달하는 시간: -ln(1 - f) / k  (90% ≈ 3.3 t½, 95% ≈ 4.3 t½)
+    return -np.log1p(-fraction) * np.asarray(t_half, dtype=np.float64) / LN2
+
+
+# === 경구 ===
+def oral_steady_state_curve(s, D, F, V_d, t_half, t_max, tau, body_weight):
+    # 정상상태 한 투여 구간(s = 0~tau, 마지막 투여 후 경과시간)의 농도 (ng/mL)
+    #   Css(s) = coef · (R_k·e^(-k·s) - R_ka·e^(-ka·s)),  R_r = 1 / (1 - e^(-r·tau))
+    s = np.asarray(s, dtype=np.float64)
+    D, F, V_d, t_half, t_max, tau, body_weight = (
+        _as_column(x) for x in (D, F, V_d, t_half, t_max, tau, body_weight))
+    k, ka = rate_constants(t_half, t_max)
+    coef = (ka * F * D) / (V_d * body_weight * (ka - k))
+    C = coef * (accumulation_ratio(k, tau) * np.exp(-k * s) - accumulation_ratio(ka, tau) * np.exp(-ka * s))
+    return np.maximum(C, 0.0) * ORAL_SCALE
+
+
+def oral_steady_state(D, F, V_d, t_half, t_max, tau, body_weight):
+    # Css,max / Css,min / Css,avg, 축적비, 정상상태 도달 시간 (해석식)
+    scalar = all(np.ndim(x) == 0 for x in (D, F, V_d, t_half, t_max, tau))
+    D, F, V_d, t_half, t_max, tau = np.broadcast_arrays(
+        *(np.atleast_1d(np.asarray(x, dtype=np.float64)) for x in (D, F, V_d, t_half, t_max, tau)))
+    k, ka = rate_constants(t_half, t_max)
+    R_k, R_ka = accumulation_ratio(k, tau), accumulation_ratio(ka, tau)
+
+    def curve(s):
+        return oral_steady_state_curve(s[..., None], D, F, V_d, t_half, t_max, tau, body_weight)[..., 0]
+
+    tmax_ss = np.clip(np.log(ka * R_ka / (k * R_k)) / (ka - k), 0.0, tau)
+    out = {
+        'css_max': curve(tmax_ss),
+        'css_min': curve(np.zeros_like(tau)),  # 다음 투여 직전(= 투여 직후) 최저 농도
+        'css_avg': F * D / (k * V_d * body_weight * tau) * ORAL_SCALE,
+        'tmax_ss': tmax_ss,
+        'accumulation_ratio': R_k,
+        't_ss_90': time_to_steady_state(t_half, 0.9),
+        't_ss_95': time_to_steady_state(t_half, 0.95),
+    }
+    return _finish(out, scalar)
+
+
+# === 패치 반복 교체 (tau마다 새 패치, 부착 시간 T) ===
+def patch_steady_state_curve(s, D, F, V_d, t_half, patch_duration_hour, tau, body_weight, tau_off=None):
+    # 정상상태 한 교체 구간(s = 0~tau, 새 패치 부착 후 경과시간)의 농도 (패치 페이지와 같은 단위)
+    # 제거 후 단일 패치의 농도는 지수함수의 합이므로 앞선 패치들의 기여는 등비급수로 한 번에 더함.
+    # 부착 시간이 교체 간격보다 길면(T > tau) 아직 붙어 있는 m개 패치는 직접 더함.
+    s = np.asarray(s, dtype=np.float64)
+    D, F, V_d, t_half, T, tau, body_weight = (
+        _as_column(x) for x in (D, F, V_d, t_half, patch_duration_hour, tau, body_weight))
+    k = LN2 / t_half
+    R0 = D * F / T
+    V = V_d * body_weight
+    c_T = R0 / (k * V) * -np.expm1(-k * T)
+    if tau_off is not None:
+        a = 1.0 / _as_column(tau_off)
+        a = np.where(np.abs(a - k) < 1e-9 * k, k * (1.0 + 1e-6), a)  # k = 1/tau_off 인 특이점 회피
+        B = R0 / (V * (k - a))  # 제거 후 농도 = A·e^(-k·s) + B·e^(-a·s)
+    else:
+        a = k
+        B = np.zeros_like(c_T)
+    A = c_T - B
+
+    def single_patch(t):
+        # 패치 하나를 0시에 붙였을 때 t 시점 농도
+        on = R0 / (k * V) * -np.expm1(-k * np.minimum(t, T))
+        after = np.maximum(t - T, 0.0)
+        off = A * np.exp(-k * after) + B * np.exp(-a * after)
+        return np.where(t <= T, on, off)
+
+    m = int(np.max(np.ceil(T / tau)))  # 아직 붙어 있을 수 있는 패치 수 (보통 1)
+    total = 0.0
+    for j in range(m):
+        total = total + single_patch(s + j * tau)
+    # j >= m 인 패치는 모두 제거된 상태 → 지수별 등비급수
+    t0 = s + m * tau - T
+    total = total + A * np.exp(-k * t0) * accumulation_ratio(k, tau) + B * np.exp(-a * t0) * accumulation_ratio(a, tau)
+    return np.maximum(total, 0.0) * PATCH_SCALE
+
+
+def _golden_max(f, lo, hi, iters=60):
+    # 구간 [lo, hi] 안에서 f 최댓값 위치 (약물별 동시, 황금분할 탐색)
+    for _ in range(iters):
+        x1 = hi - GOLDEN * (hi - lo)
+        x2 = lo + GOLDEN * (hi - lo)
+        left = f(x1) >= f(x2)
+        hi = np.where(left, x2, hi)
+        lo = np.where(left, lo, x1)
+    return 0.5 * (lo + hi)
+
+
+def patch_steady_state(D, F, V_d, t_half, patch_duration_hour, tau, body_weight, tau_off=None, n_grid=257):
+    # 반복 교체 패치의 Css,max / Css,min / Css,avg
+    # 한 구간을 성긴 격자로 훑어 극값 근처 칸을 찾고 황금분할로 다듬음 (투여 횟수와 무관한 고정 비용)
+    scalar = all(np.ndim(x) == 0 for x in (D, F, V_d, t_half, patch_duration_hour, tau, tau_off))
+    arrays = [np.atleast_1d(np.asarray(x, dtype=np.float64)) for x in (D, F, V_d, t_half, patch_duration_hour, tau)]
+    if tau_off is not None:
+        arrays.append(np.atleast_1d(np.asarray(tau_off, dtype=np.float64)))
+    arrays = np.broadcast_arrays(*arrays)
+    D, F, V_d, t_half, T, tau = arrays[:6]
+    tau_off = arrays[6] if tau_off is not None else None
+    k = LN2 / t_half
+
+    def curve(s):
+        return patch_steady_state_curve(s[..., None], D, F, V_d, t_half, T, tau, body_weight, tau_off)[..., 0]
+
+    u = np.linspace(0.0, 1.0, n_grid)
+    grid = np.multiply.outer(tau, u)
+    values = patch_steady_state_curve(grid, D, F, V_d, t_half, T, tau, body_weight, tau_off)
+    rows = np.arange(len(tau))
+    step = tau / (n_grid - 1)
+
+    def refine(idx, sign):
+        lo = np.maximum(grid[rows, idx] - step, 0.0)
+        hi = np.minimum(grid[rows, idx] + step, tau)
+        return _golden_max(lambda s: sign * curve(s), lo, hi)
+
+    s_max = refine(np.argmax(values, axis=1), 1.0)
+    s_min = refine(np.argmin(values, axis=1), -1.0)
+    total_input = D * F if tau_off is None else D * F / T * (T + tau_off)
+    out = {
+        'css_max': curve(s_max),
+        'css_min': curve(s_min),
+        'css_avg': total_input / (k * V_d * body_weight * tau) * PATCH_SCALE,
+        'tmax_ss': s_max,
+        'accumulation_ratio': accumulation_ratio(k, tau),
+        't_ss_90': time_to_steady_state(t_half, 0.9),
+        't_ss_95': time_to_steady_state(t_half, 0.95),
+    }
+    return _finish(out, scalar)
+
+
+def patch_steady_state_table(drugs, body_weight, model='patch_washout'):
+    # ParamTable의 패치 약물별 정상상태 (tau마다 새 패치). model: 페이지 기본 모델 ('patch_zero_order', 'patch_washout')
+    # 교체 간격(tau)이 없거나 0 이하인 약물, 시트 model 컬럼이 1cmt가 아닌 약물(2cmt, mm)은 NaN
+    out = {key: np.full(len(drugs), np.nan) for key in STEADY_KEYS}
+    rows = np.flatnonzero((drugs.tau > 0) & (drugs.kinds == DEFAULT_MODEL))
+    if len(rows):
+        steady = patch_steady_state(drugs.D[rows], drugs.F[rows], drugs.V_d[rows], drugs.t_half[rows],
+                                    drugs.patch_duration_hour[rows], drugs.tau[rows], body_weight,
+                                    drugs.tau_off[rows] if model == 'patch_washout' else None)
+        for key, v in steady.items():
+            out[key][rows] = v
+    return out
@@ -0,0 +1,141 @@
+import heapq
+
+import numpy as np
+
+from pk_models import ORAL_SCALE
+from regimen import ROUTE_ORAL, _breakpoints, advance_states, evaluate_states, regimen_rates
+
+# 수개월 장기 투여용 스트리밍 시뮬레이션.
+# 전체 시간축을 한 번에 만들지 않고 고정 크기 블록 단위로 농도를 내보내며,
+# 블록 사이에는 구획 상태(위장관, 피부 잔여, 중심구획, 흡수속도)만 넘긴다 → 메모리는 기간과 무관.
+
+BLOCK_SIZE = 8192
+DAY = 24.0
+
+
+def periodic_events(dose, tau, horizon, route=ROUTE_ORAL, start=0.0):
+    # horizon까지 tau 간격 투여 이벤트를 하나씩 생성 (리스트를 만들지 않음)
+    i = 0
+    while start + i * tau <= horizon:
+        yield (start + i * tau, dose, route)
+        i += 1
+
+
+def stream_regimen(events, F, V_d, t_half, t_max, body_weight, horizon, dt, block_size=BLOCK_SIZE,
+                   patch_duration_hour=None, tau_off=None, scale=ORAL_SCALE):
+    # events: 시각 순으로 정렬된 (시각, 용량, 경로) 반복자 (periodic_events 등, 필요한 만큼만 읽음)
+    # 0, dt, 2dt, ..., horizon 시점의 농도를 최대 block_size개씩 (time, concentration)으로 yield
+    k, ka, a = regimen_rates(t_half, t_max, tau_off)
+    Vd_total = V_d * body_weight
+    events = iter(events)
+    pending = []  # 아직 반영하지 않은 상태 변화 (패치 제거 등은 부착 이벤트보다 늦게 생김)
+    next_event = next(events, None)
+
+    state = np.zeros(4)
+    t_state = 0.0
+    n_total = int(np.floor(horizon / dt + 1e-9)) + 1
+
+    for first in range(0, n_total, block_size):
+        time = np.arange(first, min(first + block_size, n_total)) * dt
+        t_end = time[-1]
+
+        # 이번 블록 끝까지의 이벤트를 읽어 상태 변화로 바꿈
+        while next_event is not None and next_event[0] <= t_end:
+            for row in _breakpoints([next_event], F, patch_duration_hour, tau_off):
+                heapq.heappush(pending, tuple(row))
+            next_event = next(events, None)
+        rows = []
+        while pending and pending[0][0] <= t_end:
+            rows.append(heapq.heappop(pending))
+        bp = np.array(rows, dtype=np.float64).reshape(-1, 5)
+
+        # 블록 시작 상태 + 블록 안 이벤트 직후 상태로 블록 전체를 한 번에 계산
+        states = np.vstack([state[None, :], advance_states(bp, state, t_state, k, ka, a)])
+        state_times = np.concatenate([[t_state], bp[:, 0]])
+        conc = evaluate_states(time, state_times, states, k, ka, a) / Vd_total
+        yield time, np.maximum(conc, 0.0) * scale
+
+        # 다음 블록으로 넘길 상태: 마지막 이벤트 상태를 블록 끝 시각까지 진행
+        last = states[-1]
+        Ac_end = evaluate_states(np.array([t_end]), state_times[-1:], states[-1:], k, ka, a)[0]
+        s = t_end - state_times[-1]
+        state = np.array([last[0] * np.exp(-ka * s), last[1] * np.exp(-a * s), Ac_end, last[3]])
+        t_state = t_end
+
+
+class DailySummary:
+    # 스트림 블록을 받아 기간(기본 24h)별 최저/최고/평균 농도와 AUC를 누적. 블록 경계의 사다리꼴도 이어서 계산
+
+    def __init__(self, period=DAY):
+        self.period = period
+        self._min = {}
+        self._max = {}
+        self._auc = {}
+        self._span = {}  # 날짜별로 실제 계산된 시간 길이 (마지막 날은 24h보다 짧을 수 있음)
+        self._prev = None  # 직전 블록의 마지막 (time, conc)
+
+    def update(self, time, conc):
+        if self._prev is not None:
+            time = np.concatenate([[self._prev[0]], time])
+            conc = np.concatenate([[self._prev[1]], conc])
+            point_time, point_conc = time[1:], conc[1:]  # 이전 점은 이미 집계됨
+        else:
+            point_time, point_conc = time, conc
+
+        # 점별 최저/최고
+        days = np.floor(point_time / self.period).astype(np.int64)
+        starts = np.flatnonzero(np.r_[True, days[1:] != days[:-1]])
+        for d, lo, hi in zip(days[starts], np.minimum.reduceat(point_conc, starts),
+                             np.maximum.reduceat(point_conc, starts)):
+            self._min[d] = min(self._min.get(d, np.inf), lo)
+            self._max[d] = max(self._max.get(d, -np.inf), hi)
+
+        # 구간별 AUC (구간 왼쪽 끝이 속한 날짜에 더함)
+        if len(time) > 1:
+            seg_auc = 0.5 * (conc[1:] + conc[:-1]) * np.diff(time)
+            seg_day = np.floor(time[:-1] / self.period).astype(np.int64)
+            uniq, inv = np.unique(seg_day, return_inverse=True)
+            for d, v, w in zip(uniq, np.bincount(inv, weights=seg_auc), np.bincount(inv, weights=np.diff(time))):
+                self._auc[d] = self._auc.get(d, 0.0) + v
+                self._span[d] = self._span.get(d, 0.0) + w
+
+        self._prev = (time[-1], conc[-1])
+
+    def result(self):
+        days = np.array(sorted(self._min), dtype=np.int64)
+        auc = np.array([self._auc.get(d, 0.0) for d in days])
+        span = np.array([self._span.get(d, 0.0) for d in days])
+        c_min = np.array([self._min[d] for d in days])
+        return {
+            'day': days,
+            'c_min': c_min,
+            'c_max': np.array([self._max[d] for d in days]),
+            'auc': auc,
+            'c_avg': np.where(span > 0, auc / np.where(span > 0, span, 1.0), c_min),
+        }
+
+
+def summarize_stream(blocks, period=DAY):
+    # stream_regimen 결과를 끝까지 읽어 기간별 요약만 남김
+    summary = DailySummary(period)
+    for time, conc in blocks:
+        summary.update(time, conc)
+    return summary.result()
+
+
+def daily_envelope_figure(summary, title, unit='ng/mL'):
+    # 일별 최저~최고 범위(envelope)와 평균 농도 그래프
+    from matplotlib.figure import Figure
+
+    fig = Figure(figsize=(10, 4))
+    ax = fig.subplots()
+    day = summary['day']
+    ax.fill_between(day, summary['c_min'], summary['c_max'], step='mid', alpha=0.3, label='일별 최저~최고')
+    ax.plot(day, summary['c_avg'], lw=1.5, label='일 평균')
+    ax.set_title(title)
+    ax.set_xlabel("일 (day)")
+    ax.set_ylabel(f"혈중 농도 ({unit})")
+    ax.grid(True, linestyle=':')
+    ax.legend()
+    ax.set_ylim(0)
+    return fig
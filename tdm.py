@@ -0,0 +1,281 @@
+import hashlib
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+from pk_models import LN2, ORAL_SCALE, PATCH_SCALE
+from regimen import ROUTE_ORAL, ROUTE_PATCH, simulate_regimen
+
+# 측정 혈중 농도(TDM)로 환자별 1-컴파트먼트 파라미터 추정.
+# 환자마다 관측 시점·투여 이벤트를 (환자 수, 최대 개수) 배열로 채워 넣고(빈 칸은 mask),
+# 모든 환자를 한 번에 Levenberg–Marquardt로 푼다. 잔차와 야코비안은 중첩(superposition) 해석식을
+# (환자, 관측, 투여) 배열로 한 번에 계산하므로 환자별 curve_fit 반복이 없다.
+#
+# 추정 파라미터는 로그 스케일: 경구 (ln k, ln(ka - k), ln Vd), 패치 (ln k, ln Vd).
+# ka - k = ln2 / Tmax 라서 결과를 페이지의 t½, Tmax, V_d로 그대로 돌려 넣을 수 있다.
+# 오차 모델은 비례 오차 (로그 잔차 / RESIDUAL_SD). prior_sd를 주면 시트 값을 평균으로 한 로그정규 사전분포(MAP).
+
+RESIDUAL_SD = 0.2  # 측정 농도의 비례 오차 (로그 스케일 표준편차)
+PRIOR_SD = {'k': 0.4, 'ka': 0.4, 'V_d': 0.3}  # population.DEFAULT_VARIABILITY와 같은 크기 (k는 Vd·CL 합성)
+MAX_ITER = 50
+TOL = 1e-8
+MAX_STEP = 2.0  # 한 번에 바꾸는 로그 파라미터 최대 크기
+TDM_CACHE_SIZE = 4096  # 환자 수
+
+FIT_PARAMS = {ROUTE_ORAL: ('k', 'ka', 'V_d'), ROUTE_PATCH: ('k', 'V_d')}
+OBSERVATION_COLUMNS = ('patient_id', 'time', 'concentration')
+DOSE_COLUMNS = ('patient_id', 'time', 'dose')
+
+_fit_cache = OrderedDict()  # 환자 데이터 + 시트 값 + 설정의 해시 → 추정 결과 dict
+_fit_lock = threading.Lock()
+
+
+def pad_groups(codes, n_groups, *columns):
+    # 환자 번호(codes) 순서대로 값을 (환자 수, 최대 개수) 배열에 채움. 반환: 배열들 + mask
+    codes = np.asarray(codes)
+    order = np.argsort(codes, kind='stable')
+    codes = codes[order]
+    starts = np.searchsorted(codes, np.arange(n_groups))
+    pos = np.arange(len(codes)) - starts[codes]
+    width = int(pos.max()) + 1 if len(codes) else 0
+    mask = np.zeros((n_groups, width), dtype=bool)
+    mask[codes, pos] = True
+    out = []
+    for col in columns:
+        arr = np.zeros((n_groups, width))
+        arr[codes, pos] = np.asarray(col, dtype=np.float64)[order]
+        out.append(arr)
+    return (*out, mask)
+
+
+def _oral_terms(theta, s, amount, scale):
+    # 경구 1회 투여 기여분과 로그 파라미터에 대한 미분. s: 투여 후 경과시간 (n, 관측, 투여), 음수면 기여 0
+    k, d, V = (np.exp(theta[:, i])[:, None, None] for i in range(3))
+    active = s >= 0
+    s = np.where(active, s, 0.0)
+    K = np.where(active, scale * amount / V, 0.0)
+    e1, ed = np.exp(-k * s), np.exp(-d * s)
+    q = -np.expm1(-d * s)
+    g = K * (k + d) / d * e1 * q  # (e^(-k·s) - e^(-ka·s)) 형태를 ka - k = d로 안정하게
+    dg = (k * g * (1.0 / (k + d) - s),                # ∂/∂ln k (d 고정)
+          K * e1 * (-k * q / d + (k + d) * s * ed),   # ∂/∂ln d
+          -g)                                         # ∂/∂ln V
+    return g, dg
+
+
+def _patch_terms(theta, s, amount, scale, T):
+    # 제로오더 패치 (부착 시간 T 동안 amount/T 속도) 기여분과 미분
+    k, V = (np.exp(theta[:, i])[:, None, None] for i in range(2))
+    active = s >= 0
+    s = np.where(active, s, 0.0)
+    K = np.where(active, scale * amount / (T * V), 0.0)
+    u = np.minimum(s, T)
+    w = s - u
+    ew = np.exp(-k * w)
+    h = ew * -np.expm1(-k * u) / k
+    g = K * h
+    dg = (K * (-(k * w + 1.0) * h + ew * u * np.exp(-k * u)), -g)
+    return g, dg
+
+
+def predict(theta, obs_time, dose_time, dose_amount, dose_mask, route=ROUTE_ORAL, scale=None,
+            patch_duration_hour=None):
+    # 로그 파라미터 theta (환자 수, p)에서 관측 시점 농도 (n, 관측)와 야코비안 (n, 관측, p)
+    # dose_amount는 흡수되는 양 (F·D/체중, mg/kg)
+    s = obs_time[:, :, None] - dose_time[:, None, :]
+    s = np.where(dose_mask[:, None, :], s, -1.0)
+    amount = dose_amount[:, None, :]
+    if route == ROUTE_ORAL:
+        g, dg = _oral_terms(theta, s, amount, ORAL_SCALE if scale is None else scale)
+    elif route == ROUTE_PATCH:
+        T = np.asarray(patch_duration_hour, dtype=np.float64).reshape(-1, 1, 1)
+        g, dg = _patch_terms(theta, s, amount, PATCH_SCALE if scale is None else scale, T)
+    else:
+        raise ValueError(f"TDM 추정을 지원하지 않는 투여 경로: {route}")
+    return g.sum(axis=2), np.stack([d.sum(axis=2) for d in dg], axis=-1)
+
+
+def _residuals(theta, data, prior_mean, prior_sd, sigma):
+    # 로그 잔차 (관측) + 사전분포 잔차. 반환: r (n, 관측 + p), J (n, 관측 + p, p)
+    obs_time, obs_conc, obs_mask, dose_time, dose_amount, dose_mask, options = data
+    pred, J = predict(theta, obs_time, dose_time, dose_amount, dose_mask, **options)
+    pred = np.maximum(pred, 1e-12)
+    r = np.where(obs_mask, (np.log(np.where(obs_mask, obs_conc, 1.0)) - np.log(pred)) / sigma, 0.0)
+    J = np.where(obs_mask[..., None], -J / (pred[..., None] * sigma), 0.0)
+    if prior_sd is not None:
+        r = np.concatenate([r, (theta - prior_mean) / prior_sd], axis=1)
+        J = np.concatenate([J, np.broadcast_to(np.diag(1.0 / prior_sd), (len(theta),) + (len(prior_sd),) * 2)], axis=1)
+    return r, J
+
+
+def _subset(data, rows):
+    *arrays, options = data
+    options = dict(options)
+    if options.get('patch_duration_hour') is not None:
+        options['patch_duration_hour'] = np.broadcast_to(options['patch_duration_hour'], (len(arrays[0]),))[rows]
+    return (*(a[rows] for a in arrays), options)
+
+
+def fit_batch(obs_time, obs_conc, obs_mask, dose_time, dose_amount, dose_mask, prior_mean, prior_sd=None,
+              sigma=RESIDUAL_SD, max_iter=MAX_ITER, tol=TOL, **options):
+    # 모든 환자를 한 번에 Levenberg–Marquardt로. prior_mean: 로그 파라미터 시작값 겸 사전분포 평균 (n, p)
+    # 반환: theta (n, p), 목적함수, 수렴 여부, 반복 횟수, 로그 파라미터 표준오차 (n, p)
+    data = (obs_time, obs_conc, obs_mask, dose_time, dose_amount, dose_mask, options)
+    n, p = prior_mean.shape
+    sd = None if prior_sd is None else np.asarray(prior_sd, dtype=np.float64)
+    theta = prior_mean.copy()
+    r, J = _residuals(theta, data, prior_mean, sd, sigma)
+    cost = np.sum(r ** 2, axis=1)
+    lam = np.full(n, 1e-2)
+    converged = np.zeros(n, dtype=bool)
+    iterations = np.zeros(n, dtype=int)
+
+    for _ in range(max_iter):
+        rows = np.flatnonzero(~converged)
+        if len(rows) == 0:
+            break
+        iterations[rows] += 1
+        Jr, rr = J[rows], r[rows]
+        H = np.einsum('nij,nik->njk', Jr, Jr)
+        g = np.einsum('nij,ni->nj', Jr, rr)
+        damp = lam[rows, None] * np.diagonal(H, axis1=1, axis2=2) + 1e-9
+        step = -np.linalg.solve(H + damp[:, :, None] * np.eye(p), g[..., None])[..., 0]
+        step = np.clip(step, -MAX_STEP, MAX_STEP)
+
+        trial = theta[rows] + step
+        r_t, J_t = _residuals(trial, _subset(data, rows), prior_mean[rows], sd, sigma)
+        cost_t = np.sum(r_t ** 2, axis=1)
+        better = cost_t < cost[rows]
+        done = (better & (cost[rows] - cost_t <= tol * (1.0 + cost[rows]))) | (np.max(np.abs(step), axis=1) < tol)
+
+        acc = rows[better]
+        theta[acc], r[acc], J[acc], cost[acc] = trial[better], r_t[better], J_t[better], cost_t[better]
+        lam[rows] = np.where(better, lam[rows] / 3.0, lam[rows] * 4.0)
+        converged[rows[done]] = True
+
+    H = np.einsum('nij,nik->njk', J, J)
+    se = np.sqrt(np.abs(np.diagonal(np.linalg.pinv(H), axis1=1, axis2=2)))
+    return {'theta': theta, 'objective': cost, 'converged': converged, 'iterations': iterations, 'se': se}
+
+
+def _prior_theta(params, route):
+    # 시트의 전형값 → 로그 파라미터
+    k = LN2 / params['t_half']
+    if route == ROUTE_ORAL:
+        return np.log([k, LN2 / params['t_max'], params['V_d']])
+    return np.log([k, params['V_d']])
+
+
+def _theta_frame(theta, se, route):
+    # 로그 파라미터 → 페이지 파라미터 (t½, Tmax, V_d)와 상대 표준오차(%)
+    k = np.exp(theta[:, 0])
+    out = {'t_half': LN2 / k, 'V_d': np.exp(theta[:, -1])}
+    if route == ROUTE_ORAL:
+        d = np.exp(theta[:, 1])
+        out.update(t_max=LN2 / d, k=k, ka=k + d)
+    else:
+        out['k'] = k
+    for name, col in zip(FIT_PARAMS[route], se.T):
+        out[f'{name}_rse'] = col * 100.0
+    return out
+
+
+def _patient_key(route, obs_t, obs_c, dose_t, dose_d, bw, params, prior_sd, sigma):
+    h = hashlib.sha1()
+    for arr in (obs_t, obs_c, dose_t, dose_d):
+        h.update(np.ascontiguousarray(arr, dtype=np.float64).tobytes())
+        h.update(b'|')
+    h.update(repr((route, float(bw), params, prior_sd, sigma)).encode())
+    return h.hexdigest()
+
+
+def fit_patients(observations, doses, params, body_weight, route=ROUTE_ORAL, prior_sd=PRIOR_SD,
+                 sigma=RESIDUAL_SD, max_iter=MAX_ITER):
+    # observations: patient_id, time, concentration (+ body_weight 선택) DataFrame, 농도 단위는 페이지와 같음
+    # doses: patient_id, time, dose (mg) DataFrame. params: 시트 한 행 (ParamTable.row), 시작값과 사전분포 평균
+    # prior_sd=None이면 사전분포 없이 최소제곱. 결과는 환자별로 캐시해서 바뀐 환자만 다시 추정
+    # 반환: 환자별 추정 결과 DataFrame (t_half, t_max, V_d는 시트/페이지 파라미터와 같은 단위)
+    obs = observations.dropna(subset=list(OBSERVATION_COLUMNS))
+    obs = obs[obs['concentration'] > 0]  # 정량한계 미만(0 이하)은 로그 잔차에서 제외
+    dose = doses.dropna(subset=list(DOSE_COLUMNS))
+    ids = pd.Index(pd.unique(obs['patient_id']))
+    dose = dose[dose['patient_id'].isin(ids)]
+    n = len(ids)
+
+    obs_t, obs_c, obs_mask = pad_groups(ids.get_indexer(obs['patient_id']), n, obs['time'], obs['concentration'])
+    dose_t, dose_d, dose_mask = pad_groups(ids.get_indexer(dose['patient_id']), n, dose['time'], dose['dose'])
+    if 'body_weight' in obs:
+        bw = obs.groupby('patient_id', sort=False)['body_weight'].first().reindex(ids).fillna(body_weight).to_numpy()
+    else:
+        bw = np.full(n, float(body_weight))
+
+    names = FIT_PARAMS[route]
+    typical = {c: float(params[c]) for c in ('F', 'V_d', 't_half', 't_max', 'patch_duration_hour') if c in params}
+    sd = None if prior_sd is None else tuple(float(prior_sd[c]) for c in names)
+    keys = [_patient_key(route, obs_t[i][obs_mask[i]], obs_c[i][obs_mask[i]], dose_t[i][dose_mask[i]],
+                         dose_d[i][dose_mask[i]], bw[i], typical, sd, sigma) for i in range(n)]
+
+    with _fit_lock:
+        hits = [_fit_cache.get(key) for key in keys]
+        for key, hit in zip(keys, hits):
+            if hit is not None:
+                _fit_cache.move_to_end(key)
+    miss = np.array([i for i, hit in enumerate(hits) if hit is None], dtype=int)
+    if len(miss):
+        options = {'route': route}
+        if route == ROUTE_PATCH:
+            options['patch_duration_hour'] = typical['patch_duration_hour']
+        amount = dose_d[miss] * typical['F'] / bw[miss, None]
+        prior = np.tile(_prior_theta(typical, route), (len(miss), 1))
+        fit = fit_batch(obs_t[miss], obs_c[miss], obs_mask[miss], dose_t[miss], amount, dose_mask[miss], prior,
+                        prior_sd=sd, sigma=sigma, max_iter=max_iter, **options)
+        values = _theta_frame(fit['theta'], fit['se'], route)
+        values.update(objective=fit['objective'], converged=fit['converged'], iterations=fit['iterations'])
+        with _fit_lock:
+            for j, i in enumerate(miss):
+                hits[i] = {key: v[j].item() for key, v in values.items()}
+                _fit_cache[keys[i]] = hits[i]
+            while len(_fit_cache) > TDM_CACHE_SIZE:
+                _fit_cache.popitem(last=False)
+
+    out = pd.DataFrame(hits, index=range(n))
+    out.insert(0, 'patient_id', ids.to_numpy())
+    out.insert(1, 'n_obs', obs_mask.sum(axis=1))
+    out.insert(2, 'body_weight', bw)
+    return out
+
+
+def clear_fit_cache():
+    with _fit_lock:
+        _fit_cache.clear()
+
+
+def fitted_curve(time, patient_doses, params, fit_row, body_weight, route=ROUTE_ORAL):
+    # 추정한 파라미터로 페이지와 같은 모델(regimen.simulate_regimen)에 다시 넣어 곡선 계산
+    events = [(float(t), float(d), route) for t, d in zip(patient_doses['time'], patient_doses['dose'])]
+    patch = route == ROUTE_PATCH
+    return simulate_regimen(time, events, params['F'], fit_row['V_d'], fit_row['t_half'],
+                            fit_row.get('t_max', params['t_max']), body_weight,
+                            patch_duration_hour=params['patch_duration_hour'] if patch else None,
+                            scale=PATCH_SCALE if patch else ORAL_SCALE)
+
+
+def tdm_figure(time, population, fitted, obs_time, obs_conc, title, unit='ng/mL'):
+    # 시트 전형값 곡선, 추정 곡선, 측정값
+    from matplotlib.figure import Figure
+
+    fig = Figure(figsize=(10, 5))
+    ax = fig.subplots()
+    ax.plot(time, population, color='gray', linestyle='--', lw=1.5, label='시트 전형값')
+    ax.plot(time, fitted, color='blue', lw=2, label='환자 추정')
+    ax.scatter(obs_time, obs_conc, color='red', zorder=3, label='측정 농도')
+    ax.set_title(title)
+    ax.set_xlabel("시간 (hours)")
+    ax.set_ylabel(f"혈중 농도 ({unit})")
+    ax.grid(True, linestyle=':')
+    ax.legend()
+    ax.set_xlim(time[0], time[-1])
+    ax.set_ylim(0)
+    return fig